@@ -0,0 +1,186 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.render
+import gpu_uarch.nv.source
+import gpu_uarch.nv.turing as turing
+import gpu_uarch.theme
+
+from benchmarks import synthetic
+
+FORMAT_VERSION = 1
+
+
+def measure(fn, items, unit, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {'unit': unit, 'items': items, 'seconds': best,
+            'rate': items / best if best > 0 else float('inf')}
+
+
+def bench_disasm(args):
+    data = synthetic.instruction_stream(args.instructions, args.seed)
+    return measure(lambda: turing.disasm(data), args.instructions, 'instructions/s', args.repeat)
+
+
+def bench_parse(args):
+    lines = synthetic.source_lines(synthetic.instruction_stream(args.lines, args.seed))
+    source = gpu_uarch.nv.source.SourceFile(lines)
+    # the first parse builds (or loads) the grammar
+    gpu_uarch.nv.source.SourceFile(lines[:1]).parse()
+    return measure(source.parse, len(lines), 'lines/s', args.repeat)
+
+
+def _bench_render(theme, args):
+    instructions = turing.disasm(synthetic.instruction_stream(args.instructions, args.seed))
+
+    def render():
+        gpu_uarch.nv.render.Renderer(theme).render(instructions)
+
+    return measure(render, len(instructions), 'instructions/s', args.repeat)
+
+
+def bench_render_plain(args):
+    return _bench_render(gpu_uarch.theme.NoTheme(), args)
+
+
+def bench_render_solarized(args):
+    return _bench_render(gpu_uarch.theme.SolarizedTheme(), args)
+
+
+def _cubin(args):
+    return synthetic.make_cubin(args.functions, args.function_instructions, args.seed)
+
+
+# Both variants load from a file, as the tools do, so that reading the sections is measured.
+def _bench_cubin_file(load, args):
+    image = _cubin(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'bench.cubin')
+        with open(filename, 'wb') as f:
+            f.write(image)
+        return measure(lambda: load(filename), len(image), 'bytes/s', args.repeat)
+
+
+def bench_cubin_load(args):
+    return _bench_cubin_file(gpu_uarch.nv.cubin.CuBin, args)
+
+
+def bench_cubin_load_lazy(args):
+    return _bench_cubin_file(lambda filename: gpu_uarch.nv.cubin.CuBin(filename, lazy=True).close(),
+                             args)
+
+
+BENCHMARKS = {
+    'disasm': bench_disasm,
+    'parse': bench_parse,
+    'render_plain': bench_render_plain,
+    'render_solarized': bench_render_solarized,
+    'cubin_load': bench_cubin_load,
+    'cubin_load_lazy': bench_cubin_load_lazy,
+}
+
+
+def run(args, names):
+    results = {}
+    for name in names:
+        results[name] = BENCHMARKS[name](args)
+        print('{:<20} {:>14.0f} {}'.format(name, results[name]['rate'], results[name]['unit']),
+              file=sys.stderr)
+    return {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {name: getattr(args, name) for name in
+                       ('instructions', 'lines', 'functions', 'function_instructions', 'seed')},
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    rows = []
+    for (name, result) in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['rate'] / base['rate']
+        rows.append((name, base['rate'], result['rate'], ratio, ratio < 1 - threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', nargs='*',
+                        help='benchmarks to run: {} (default: all)'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('-o', '--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results stored by an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('--instructions', type=int, default=100000)
+    parser.add_argument('--lines', type=int, default=10000)
+    parser.add_argument('--functions', type=int, default=64)
+    parser.add_argument('--function-instructions', type=int, default=4096)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    for name in args.benchmark:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: {}'.format(name))
+
+    results = run(args, args.benchmark or list(BENCHMARKS))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['parameters'] != results['parameters']:
+            print('warning: baseline was measured with different parameters', file=sys.stderr)
+        regressions = 0
+        for (name, base, current, ratio, regressed) in compare(baseline, results, args.threshold):
+            print('{:<20} {:>14.0f} {:>14.0f} {:>7.2f}x{}'.format(
+                name, base, current, ratio, '  REGRESSION' if regressed else ''), file=sys.stderr)
+            regressions += regressed
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import gpu_uarch.nv.turing as turing
+from tests.synthetic import instruction_stream, make_elf
+
+
+def source_lines(data):
+    import gpu_uarch.nv.render
+    import gpu_uarch.theme
+
+    renderer = gpu_uarch.nv.render.Renderer(gpu_uarch.theme.NoTheme())
+    # drop the offset column
+    return [line.split(None, 1)[1] for line in renderer.lines(turing.disasm(data))]
+
+
+def _symbol(index):
+    name = 'kernel{}'.format(index)
+    return '_Z{}{}Pi'.format(len(name), name)
+
+
+def make_cubin(functions, instructions, seed=0):
+    return make_elf([(('.text.' + _symbol(index)).encode(),
+                      instruction_stream(instructions, seed + index))
+                     for index in range(functions)])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import sys
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.source
+import gpu_uarch.nv.turing
+
+
+def find_function(cubin, name):
+    for func in cubin.functions:
+        if name in (func.symbol, func.name):
+            return func
+    raise Exception('Unknown function: {}'.format(name))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help='SASS source file')
+    parser.add_argument('-o', '--output', required=True,
+                        help='output file: raw instruction words, or a cubin with --cubin')
+    parser.add_argument('--cubin', help='cubin whose function code is replaced')
+    parser.add_argument('--function', help='symbol or demangled name of the replaced function')
+
+    args = parser.parse_args()
+
+    instructions = gpu_uarch.nv.source.SourceFile.load(args.source).parse()
+    if args.cubin is not None:
+        cubin = gpu_uarch.nv.cubin.CuBin(args.cubin)
+        if args.function is not None:
+            func = find_function(cubin, args.function)
+        elif len(cubin.functions) == 1:
+            func = cubin.functions[0]
+        else:
+            sys.exit('{} has {} functions, use --function'.format(args.cubin, len(cubin.functions)))
+        # The original words keep the bits the decoder does not understand.
+        code = gpu_uarch.nv.turing.assemble(instructions, func.words())
+        code = cubin.splice({func.symbol: code})
+    else:
+        code = gpu_uarch.nv.turing.assemble(instructions)
+
+    with open(args.output, 'wb') as f:
+        f.write(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import collections
+import json
+import os
+
+import gpu_uarch.theme
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.diff
+import gpu_uarch.nv.render
+
+
+def cubins_by_name(path):
+    # Cubins of a directory are paired by their path relative to it.
+    if not os.path.isdir(path):
+        return {'': path}
+    return {os.path.relpath(filename, path): filename
+            for filename in gpu_uarch.nv.cubin.find_cubins([path])}
+
+
+def pair_cubins(old, new):
+    (old, new) = (cubins_by_name(old), cubins_by_name(new))
+    for name in sorted(set(old) | set(new)):
+        yield name, old.get(name), new.get(name)
+
+
+def open_functions(filename):
+    if filename is None:
+        return []
+    with gpu_uarch.nv.cubin.CuBin(filename) as cubin:
+        return cubin.functions
+
+
+def delta(old, new):
+    if old == new:
+        return str(new)
+    return '{} -> {} ({:+})'.format(old, new, new - old)
+
+
+def change(old, new):
+    return str(new) if old == new else '{} -> {}'.format(old, new)
+
+
+def barriers(summary):
+    return ','.join(str(barrier) for barrier in sorted(summary.barriers)) or '-'
+
+
+def describe(result):
+    (old, new) = (result.old, result.new)
+    if result.status == gpu_uarch.nv.diff.FUNCTION_CHANGED:
+        return ('instructions {}, {} inserted, {} deleted, {} with changed stalls, {} with changed'
+                ' barriers, stalls {}, yields {}, waits {}, barriers {}, registers {},'
+                ' uniform registers {}').format(
+            delta(old.instructions, new.instructions), result.inserted, result.deleted,
+            result.stalls_changed, result.barriers_changed,
+            delta(old.stalls, new.stalls), delta(old.yields, new.yields),
+            delta(old.waits, new.waits), change(barriers(old), barriers(new)),
+            delta(old.registers, new.registers),
+            delta(old.uniform_registers, new.uniform_registers))
+    summary = old if new is None else new
+    if summary is None:
+        return ''
+    return '{} instructions, {} stalls, {} registers'.format(summary.instructions, summary.stalls,
+                                                           summary.registers)
+
+
+def print_hunks(old, new, result):
+    renderer = gpu_uarch.nv.render.get_renderer()
+    (a, b) = (old.disasm(), new.disasm())
+    for (tag, i1, i2, j1, j2) in result.hunks:
+        if tag == 'equal':
+            continue
+        print('@@ -{:#x},{} +{:#x},{} @@'.format(i1 * 16, i2 - i1, j1 * 16, j2 - j1))
+        for line in renderer.lines(a[i1:i2]):
+            print('-' + line, end='')
+        for line in renderer.lines(b[j1:j2]):
+            print('+' + line, end='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compare the functions of two cubins')
+    parser.add_argument('old', help='cubin file or directory of cubins')
+    parser.add_argument('new', help='cubin file or directory of cubins')
+    parser.add_argument('--no-colors', action='store_true')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per function')
+    parser.add_argument('--all', action='store_true', help='also list identical functions')
+    parser.add_argument('--instructions', action='store_true',
+                        help='print the changed instructions of changed functions')
+    parser.add_argument('--max-edits', type=int, default=gpu_uarch.nv.diff.MAX_EDITS,
+                        help='align at most this many changed instructions per function')
+
+    args = parser.parse_args()
+    if not args.no_colors and not args.json:
+        gpu_uarch.theme.set_theme(gpu_uarch.theme.SolarizedTheme())
+
+    totals = collections.Counter()
+    for (filename, old, new) in pair_cubins(args.old, args.new):
+        pairs = gpu_uarch.nv.diff.pair_functions(open_functions(old), open_functions(new))
+        for (a, b) in pairs:
+            result = gpu_uarch.nv.diff.diff_functions(a, b, args.max_edits)
+            totals[result.status] += 1
+            if result.status == gpu_uarch.nv.diff.FUNCTION_IDENTICAL and not args.all:
+                continue
+            if args.json:
+                record = result.as_dict()
+                record['file'] = filename
+                print(json.dumps(record))
+                continue
+            prefix = filename + ': ' if filename else ''
+            print('{:<9} {}{}: {}'.format(result.status, prefix, result.name, describe(result)))
+            if args.instructions and result.status == gpu_uarch.nv.diff.FUNCTION_CHANGED:
+                print_hunks(a, b, result)
+
+    if not args.json:
+        print(', '.join('{} {}'.format(totals[status], status) for status in (
+            gpu_uarch.nv.diff.FUNCTION_CHANGED, gpu_uarch.nv.diff.FUNCTION_ADDED,
+            gpu_uarch.nv.diff.FUNCTION_REMOVED, gpu_uarch.nv.diff.FUNCTION_IDENTICAL)))
+
+
+if __name__ == '__main__':
+    main()
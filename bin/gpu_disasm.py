@@ -21,21 +21,323 @@
 # SOFTWARE.
 
 import argparse
+import collections
+import contextlib
+import itertools
+import json
+import os
+import sys
+import time
+
 import gpu_uarch.theme
+import gpu_uarch.nv.cache
 import gpu_uarch.nv.cubin
+import gpu_uarch.nv.export
+import gpu_uarch.nv.render
+import gpu_uarch.nv.stats
+import gpu_uarch.nv.turing
+
+
+_format = 'text'
+_cache = None
+_where = None
+
+
+def init_worker(no_colors, fmt='text', cache=None, stats=False, where=None):
+    global _format, _cache, _where
+    _format = fmt
+    _where = where
+    if stats:
+        # Forked workers inherit the parent's counters, which the parent already reports.
+        gpu_uarch.nv.stats.disable()
+        gpu_uarch.nv.stats.enable()
+    if cache is not None:
+        (directory, max_size) = cache
+        _cache = gpu_uarch.nv.cache.DisasmCache(directory, max_size)
+    if not no_colors and fmt == 'text':
+        gpu_uarch.theme.set_theme(gpu_uarch.theme.SolarizedTheme())
+
+
+_cubin = (None, None)
+
+
+# The most recently opened cubin stays open, so that counting the functions of a file and then
+# disassembling them in the same process reads its ELF headers only once.
+def open_cubin(filename):
+    global _cubin
+    if _cubin[0] != filename:
+        if _cubin[1] is not None:
+            _cubin[1].close()
+        _cubin = (filename, gpu_uarch.nv.cubin.CuBin(filename, lazy=True, cache=_cache))
+    return _cubin[1]
+
+
+def open_function(job):
+    (filename, index) = job
+    return open_cubin(filename).functions[index]
+
+
+def count_functions(filenames):
+    for filename in filenames:
+        yield filename, len(open_cubin(filename).functions)
+
+
+def format_lines(func, instructions):
+    if _format == 'jsonl':
+        return gpu_uarch.nv.export.iter_jsonl(instructions, func.name)
+    elif _format == 'csv':
+        return gpu_uarch.nv.export.iter_csv(instructions, func.name)
+    raise Exception('Unknown format: {}'.format(_format))
+
+
+def timed(name, instructions=0):
+    collector = gpu_uarch.nv.stats.current()
+    if collector is None:
+        return contextlib.nullcontext()
+    return collector.timed(name, instructions=instructions)
+
+
+def format_function(func):
+    instructions = func.disasm(_where)
+    if _format == 'text':
+        with timed('render', len(instructions)):
+            return gpu_uarch.nv.render.get_renderer().render(instructions)
+    with timed('format', len(instructions)):
+        return ''.join(format_lines(func, instructions))
+
+
+def cached_format_function(func):
+    if _cache is None or _where is not None:
+        return format_function(func)
+    # Rendered text depends on the theme and renderer, and the other formats embed the function
+    # name and follow the export layout.
+    if _format == 'text':
+        variant = 'text:{}:{}'.format(type(gpu_uarch.theme.get_theme()).__name__,
+                                      gpu_uarch.nv.render.RENDER_VERSION)
+    else:
+        variant = '{}:{}:{}'.format(_format, gpu_uarch.nv.export.EXPORT_VERSION, func.symbol)
+    key = _cache.key(func.data, variant)
+    blob = _cache.get(key)
+    if blob is not None:
+        return blob.decode()
+    text = format_function(func)
+    _cache.put(key, text.encode())
+    return text
+
+
+def take_stats():
+    collector = gpu_uarch.nv.stats.current()
+    return None if collector is None else collector.take()
+
+
+def disasm_function(job):
+    func = open_function(job)
+    count = len(func.data) // 16
+    if _format == 'columnar':
+        return (func.name, func.symbol, func.disasm_table(_where)), count, len(func.data), take_stats()
+    text = cached_format_function(func)
+    # With a filter, functions without any matching instruction are left out.
+    if _format == 'text' and (text or _where is None):
+        text = gpu_uarch.nv.render.get_renderer().function(func.name) + '\n' + text
+    return text, count, len(func.data), take_stats()
+
+
+def stream_function(job, out):
+    func = open_function(job)
+    if _format != 'text':
+        count = 0
+        with timed('write'):
+            for line in format_lines(func, func.iter_disasm(_where)):
+                out.write(line)
+                count += 1
+        out.flush()
+        return count, len(func.data)
+    instructions = func.iter_disasm(_where)
+    if _where is not None:
+        first = next(instructions, None)
+        if first is None:
+            return 0, len(func.data)
+        instructions = itertools.chain([first], instructions)
+    renderer = gpu_uarch.nv.render.get_renderer()
+    out.write(renderer.function(func.name) + '\n')
+    out.flush()
+    # Decoding is interleaved with rendering, so 'write' includes the 'decode' time.
+    with timed('write'):
+        count = renderer.write(out, instructions, chunk_size=256, flush=True)
+    return count, len(func.data)
+
+
+def ordered_map(executor, fn, iterable, window):
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class Progress:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+
+    def file_done(self, filename, functions, instructions, size):
+        now = time.perf_counter()
+        elapsed = now - self.start
+        self.start = now
+        if self.enabled:
+            print('{}: {} functions, {} instructions, {} bytes in {:.3f}s ({:.0f} instructions/s)'.format(
+                filename, functions, instructions, size, elapsed,
+                instructions / elapsed if elapsed > 0 else 0), file=sys.stderr)
+
+
+def write_results(files, results, progress, emit):
+    for (filename, count) in files:
+        instructions = 0
+        size = 0
+        for index in range(count):
+            (result, n, nbytes, stats) = results(filename, index)
+            emit(result)
+            if stats is not None:
+                gpu_uarch.nv.stats.current().merge(stats)
+            instructions += n
+            size += nbytes
+        progress.file_done(filename, count, instructions, size)
+
+
+def stream_results(files, progress, out):
+    for (filename, count) in files:
+        instructions = 0
+        size = 0
+        for index in range(count):
+            (n, nbytes) = stream_function((filename, index), out)
+            instructions += n
+            size += nbytes
+        progress.file_done(filename, count, instructions, size)
+
+
+def offset_range(text):
+    try:
+        (start, end) = text.split(':')
+        (start, end) = (int(start, 0) if start else None, int(end, 0) if end else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid offset range: {}'.format(text))
+    if (start is not None and start < 0) or (end is not None and end < 0):
+        raise argparse.ArgumentTypeError('negative offset: {}'.format(text))
+    return start, end
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('cubin', nargs='+', help='cubin files, directories or glob patterns')
+    parser.add_argument('--no-colors', action='store_true')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--progress', action='store_true',
+                        help='print per-file throughput to stderr')
+    parser.add_argument('--stream', action='store_true',
+                        help='print instructions as they are decoded (implies --jobs 1)')
+    parser.add_argument('--format', choices=('text',) + gpu_uarch.nv.export.FORMATS,
+                        default='text', help='output format')
+    parser.add_argument('-o', '--output', help='output file (required for --format columnar)')
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse disassembly of unchanged functions from an on-disk cache')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='disassembly cache directory (implies --cache, default: in the user '
+                             'cache directory)')
+    parser.add_argument('--cache-size', type=int, default=1024, metavar='MiB',
+                        help='maximum size of the disassembly cache')
+    parser.add_argument('--stats', action='store_true',
+                        help='print per-stage timings and opcode counts to stderr')
+    parser.add_argument('--stats-format', choices=('table', 'json'), default='table',
+                        help='format of the --stats output')
+    parser.add_argument('--opcode', action='append', metavar='NAME',
+                        help='only instructions with this opcode, or a variant of it (e.g. LDC for LDC.64)')
+    parser.add_argument('--has-register', action='append', type=gpu_uarch.nv.parse_register,
+                        metavar='REG',
+                        help='only instructions using this register (e.g. R2, UR4, RZ, SR_CLOCKLO)')
+    parser.add_argument('--uses-cbank', action='store_true',
+                        help='only instructions reading constant memory')
+    parser.add_argument('--cbank', type=lambda v: int(v, 0), metavar='BANK',
+                        help='only instructions reading this constant bank')
+    parser.add_argument('--offset', action='append', type=offset_range, metavar='START:END',
+                        help='only instructions overlapping [START, END) of each function')
+
+    args = parser.parse_args()
+    if args.format == 'columnar' and args.output is None:
+        parser.error('--format columnar requires --output')
+    if args.format == 'columnar' and args.stream:
+        parser.error('--format columnar cannot be streamed')
+    if (args.cache or args.cache_dir is not None) and args.stream:
+        parser.error('--cache cannot be combined with --stream')
+
+    files = count_functions(gpu_uarch.nv.cubin.find_cubins(args.cubin))
+
+    cache = None
+    if args.cache or args.cache_dir is not None:
+        cache = (args.cache_dir, args.cache_size << 20)
+
+    cbank = args.cbank if args.cbank is not None else args.uses_cbank or None
+    where = None
+    if args.opcode or args.has_register or cbank is not None or args.offset:
+        where = gpu_uarch.nv.turing.WordFilter(args.opcode, args.has_register, cbank, args.offset)
+
+    progress = Progress(args.progress)
+    init_worker(args.no_colors, args.format, cache, args.stats, where)
+
+    writer = None
+    if args.format == 'columnar':
+        writer = gpu_uarch.nv.export.ColumnarWriter()
+        out = None
+
+        def emit(result):
+            writer.add(*result)
+    else:
+        out = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+        emit = out.write
+        if args.format == 'csv':
+            out.write(gpu_uarch.nv.export.csv_header())
+
+    # A pool is only worth starting when there is more than one function to share between workers.
+    workers = 1
+    if args.jobs > 1 and not args.stream:
+        files = list(files)
+        jobs = [(filename, index) for (filename, count) in files for index in range(count)]
+        workers = min(args.jobs, len(jobs))
+
+    try:
+        if workers > 1:
+            import concurrent.futures
+
+            with concurrent.futures.ProcessPoolExecutor(
+                    workers, initializer=init_worker,
+                    initargs=(args.no_colors, args.format, cache, args.stats, where)) as executor:
+                results = ordered_map(executor, disasm_function, jobs, workers * 4)
+                write_results(files, lambda *job: next(results), progress, emit)
+        elif writer is not None or cache is not None:
+            write_results(files, lambda *job: disasm_function(job), progress, emit)
+        else:
+            stream_results(files, progress, out)
 
-parser = argparse.ArgumentParser()
-parser.add_argument('cubin')
-parser.add_argument('--no-colors', action='store_true')
+        if writer is not None:
+            with open(args.output, 'wb') as f:
+                writer.save(f)
+        elif out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. '| head'). Python flushes stdout again at exit, so point it
+        # at devnull to keep that from failing as well.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
 
-args = parser.parse_args()
+    if args.stats and args.stats_format == 'json':
+        print(json.dumps(gpu_uarch.nv.stats.current().as_dict(), sort_keys=True), file=sys.stderr)
+    elif args.stats:
+        print(gpu_uarch.nv.stats.current().format_table(), end='', file=sys.stderr)
 
-if not args.no_colors:
-    gpu_uarch.theme.set_theme(gpu_uarch.theme.SolarizedTheme())
 
-cubin = gpu_uarch.nv.cubin.CuBin(args.cubin)
-for func in cubin.functions:
-    print('{theme.function}{}{theme.rs}{theme.symbol}:'.format(
-        func.name, theme=gpu_uarch.theme.get_theme()))
-    for inst in func.disasm():
-        print(inst)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import sys
+
+import gpu_uarch.nv
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.index
+
+
+def print_matches(matches):
+    for match in matches:
+        print('{}: {}: {:#010x}'.format(match.path, match.function, match.offset))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', help='index database (default: in the user cache directory)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    update = commands.add_parser('update', help='index new and changed cubins')
+    update.add_argument('cubin', nargs='+', help='cubin files, directories or glob patterns')
+
+    commands.add_parser('prune', help='drop files that no longer exist')
+    commands.add_parser('stats', help='print the number of indexed files and instructions')
+
+    find = commands.add_parser('find', help='find instructions')
+    find.add_argument('--opcode')
+    find.add_argument('--register', type=gpu_uarch.nv.parse_register,
+                      help='e.g. R2, UR4, SR_CLOCKLO')
+    find.add_argument('--bank', type=lambda v: int(v, 0), help='constant bank')
+    find.add_argument('--min-address', type=lambda v: int(v, 0), help='lowest constant address')
+    find.add_argument('--max-address', type=lambda v: int(v, 0),
+                      help='constant addresses below this one')
+
+    sequence = commands.add_parser('sequence', help='find a sequence of opcodes')
+    sequence.add_argument('opcode', nargs='+')
+
+    args = parser.parse_args()
+
+    with gpu_uarch.nv.index.Index(args.index) as index:
+        if args.command == 'update':
+            updated = index.update(gpu_uarch.nv.cubin.find_cubins(args.cubin))
+            print('{} files updated'.format(updated), file=sys.stderr)
+        elif args.command == 'prune':
+            index.prune()
+        elif args.command == 'stats':
+            for (table, count) in index.counts().items():
+                print('{}: {}'.format(table, count))
+        elif args.command == 'find':
+            print_matches(index.find(args.opcode, args.register, args.bank, args.min_address,
+                                     args.max_address))
+        elif args.command == 'sequence':
+            print_matches(index.find_sequence(args.opcode))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description='find duplicate and near-duplicate functions')
+    parser.add_argument('cubin', nargs='+', help='cubin files, directories or glob patterns')
+    parser.add_argument('--threshold', type=float, default=0.8,
+                        help='estimated similarity above which functions are grouped')
+    parser.add_argument('--exact', action='store_true', help='only report exact duplicates')
+
+    args = parser.parse_args()
+
+    functions = []
+    fingerprints = []
+    for filename in gpu_uarch.nv.cubin.find_cubins(args.cubin):
+        with gpu_uarch.nv.cubin.CuBin(filename, lazy=True) as cubin:
+            for func in cubin.functions:
+                functions.append((filename, func.name, len(func.data)))
+                fingerprints.append(gpu_uarch.nv.fingerprint.fingerprint(func.data))
+
+    if args.exact:
+        groups = gpu_uarch.nv.fingerprint.duplicates(fingerprints)
+    else:
+        groups = gpu_uarch.nv.fingerprint.cluster(fingerprints, args.threshold)
+    # largest potential savings first
+    groups.sort(key=lambda group: -sum(functions[index][2] for index in group[1:]))
+    for group in groups:
+        print('{} functions, {} bytes:'.format(len(group), sum(functions[index][2] for index in group)))
+        first = fingerprints[group[0]]
+        for index in group:
+            (filename, name, size) = functions[index]
+            kind = 'exact' if fingerprints[index].exact == first.exact else '{:.2f}'.format(
+                first.similarity(fingerprints[index]))
+            print('  {:>6} {:>8} {}: {}'.format(kind, size, filename, name))
+
+
+if __name__ == '__main__':
+    main()
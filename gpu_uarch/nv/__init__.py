@@ -19,26 +19,82 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import gpu_uarch.theme
+import array
+import re
 
 
-class Immediate:
-    def __init__(self, value):
-        self.value = value
+def _renderer():
+    import gpu_uarch.nv.render
+    return gpu_uarch.nv.render.get_renderer()
 
-    def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{theme.immediate}{:#x}{theme.rs}'.format(self.value, theme=theme)
+
+_setattr = object.__setattr__
+
+
+class _Value:
+    __slots__ = ()
+
+    def _key(self):
+        raise NotImplementedError
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
 
     def __eq__(self, other):
-        return type(self) == type(other) and self.value == other.value
+        return self is other or (type(self) == type(other) and self._key() == other._key())
+
+    def __hash__(self):
+        return hash((type(self).__name__, self._key()))
+
+    def __reduce__(self):
+        return (type(self), self._key())
+
+
+class Immediate(_Value):
+    __slots__ = ('value',)
+
+    _CACHE_RANGE = range(-0x100, 0x1000)
+    _cache = {}
+
+    def __new__(cls, value):
+        try:
+            return cls._cache[value]
+        except KeyError:
+            pass
+        self = object.__new__(cls)
+        _setattr(self, 'value', value)
+        if value in cls._CACHE_RANGE:
+            cls._cache[value] = self
+        return self
+
+    def _key(self):
+        return (self.value,)
+
+    def __repr__(self):
+        return _renderer().operand(self)
 
 
-class Register:
-    def __init__(self, index, uniform=False, reuse=False):
-        self.index = index
-        self.uniform = uniform
-        self.reuse = reuse
+class Register(_Value):
+    __slots__ = ('index', 'uniform', 'reuse')
+
+    _cache = {}
+
+    def __new__(cls, index, uniform=False, reuse=False):
+        key = (index, uniform, reuse)
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        self = object.__new__(cls)
+        _setattr(self, 'index', index)
+        _setattr(self, 'uniform', uniform)
+        _setattr(self, 'reuse', reuse)
+        if 0 <= index <= 255:
+            cls._cache[key] = self
+        return self
 
     @staticmethod
     def parse(index, uniform):
@@ -48,121 +104,157 @@ class Register:
             index = int(index)
         return Register(index, uniform)
 
+    def with_reuse(self, reuse=True):
+        return Register(self.index, self.uniform, reuse)
+
+    def _key(self):
+        return (self.index, self.uniform, self.reuse)
+
     def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{theme.register}{}R{}{theme.rs}'.format('U' if self.uniform else '', str(
-            self.index) if not self.index == (255 if not self.uniform else 63) else 'Z',
-            theme=theme)
+        return _renderer().operand(self)
 
-    def __eq__(self, other):
-        return (type(self) == type(other)
-                and self.index == other.index
-                and self.uniform == other.uniform
-                and self.reuse == other.reuse)
 
+class SpecialRegister(_Value):
+    __slots__ = ('index',)
 
-class SpecialRegister:
     NAMES = {0x2100: 'SR_TID.X', 0x2500: 'SR_CTAID.X', 0x5000: 'SR_CLOCKLO'}
 
-    def __init__(self, index):
-        self.index = index
+    _cache = {}
 
-    def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
+    def __new__(cls, index):
         try:
-            return '{theme.special_register}{}{theme.rs}'.format(self.NAMES[self.index],
-                                                                 theme=theme)
-        except Exception:
-            return '{theme.error}<unknown special register {:#x}>{theme.rs}'.format(
-                self.index, theme=theme)
+            return cls._cache[index]
+        except KeyError:
+            pass
+        self = object.__new__(cls)
+        _setattr(self, 'index', index)
+        if 0 <= index <= 0xffff:
+            cls._cache[index] = self
+        return self
 
-    def __eq__(self, other):
-        return type(self) == type(other) and self.index == other.index
+    @staticmethod
+    def parse(name):
+        # Also accepts the form the renderer uses for indices without a name.
+        match = re.fullmatch(r'<unknown special register (0x[\da-fA-F]+)>', name)
+        if match is not None:
+            return SpecialRegister(int(match.group(1), 16))
+        for (index, known) in SpecialRegister.NAMES.items():
+            if known == name:
+                return SpecialRegister(index)
+        raise Exception('Unknown special register: {}'.format(name))
+
+    def _key(self):
+        return (self.index,)
+
+    def __repr__(self):
+        return _renderer().operand(self)
 
 
-class ConstantMemory:
+def parse_register(name):
+    if name in SpecialRegister.NAMES.values():
+        return SpecialRegister.parse(name)
+    match = re.fullmatch(r'(U?)R(Z|\d+)', name)
+    if match is None:
+        raise ValueError('invalid register: {}'.format(name))
+    return Register.parse(match.group(2), match.group(1) == 'U')
+
+
+class ConstantMemory(_Value):
+    __slots__ = ('bank', 'address')
+
     def __init__(self, bank, address):
-        self.bank = bank
-        self.address = address
+        _setattr(self, 'bank', bank)
+        _setattr(self, 'address', address)
+
+    def _key(self):
+        return (self.bank, self.address)
 
     def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{theme.constant}c{theme.symbol}[{}{theme.symbol}][{}{theme.symbol}]{theme.rs}'.format(
-            self.bank, self.address, theme=theme)
+        return _renderer().operand(self)
 
-    def __eq__(self, other):
-        return (type(self) == type(other)
-                and self.bank == other.bank
-                and self.address == other.address)
 
+class Memory(_Value):
+    __slots__ = ('address', 'offset')
 
-class Memory:
     def __init__(self, address, offset):
-        self.address = address
-        self.offset = offset
+        _setattr(self, 'address', address)
+        _setattr(self, 'offset', offset)
+
+    def _key(self):
+        return (self.address, self.offset)
 
     def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        if self.offset.value == 0:
-            return '{theme.symbol}[{}{theme.symbol}]{theme.rs}'.format(self.address, theme=theme)
-        else:
-            return '{theme.symbol}[{}{theme.symbol}+{}{theme.symbol}]{theme.rs}'.format(
-                self.address, self.offset, theme=theme)
+        return _renderer().operand(self)
 
-    def __eq__(self, other):
-        return (type(self) == type(other)
-                and self.address == other.address
-                and self.offset == other.offset)
 
+class Control(_Value):
+    __slots__ = ('stall', 'yield_hint', 'wr_barrier', 'rd_barrier', 'wait_mask', 'reuse_flags',
+                 '_ctrl')
+
+    _CACHE_SIZE = 4096
+    _cache = {}
 
-class Control:
-    def __init__(self, hi):
-        ctrl = hi >> 41
+    def __new__(cls, hi):
+        ctrl = (hi >> 41) & 0x1fffff
+        try:
+            return cls._cache[ctrl]
+        except KeyError:
+            pass
+        self = object.__new__(cls)
+        _setattr(self, '_ctrl', ctrl)
+        _setattr(self, 'stall', ctrl & 0xf)
+        _setattr(self, 'yield_hint', not ctrl & 0x10 == 0)
+        _setattr(self, 'wr_barrier', (ctrl >> 5) & 0x7)
+        _setattr(self, 'rd_barrier', (ctrl >> 8) & 0x7)
+        _setattr(self, 'wait_mask', (ctrl >> 11) & 0x3f)
+        _setattr(self, 'reuse_flags', (ctrl >> 17) & 0xf)
+        if len(cls._cache) < cls._CACHE_SIZE:
+            cls._cache[ctrl] = self
+        return self
 
-        self.stall = ctrl & 0xf
-        self.yield_hint = not ctrl & 0x10 == 0
-        self.wr_barrier = (ctrl >> 5) & 0x7
-        self.rd_barrier = (ctrl >> 8) & 0x7
-        self.wait_mask = (ctrl >> 11) & 0x3f
-        self.reuse_flags = (ctrl >> 17) & 0xf
+    @staticmethod
+    def from_fields(stall, yield_hint, wr_barrier, rd_barrier, wait_mask, reuse_flags=0):
+        ctrl = (stall | (0x10 if yield_hint else 0) | wr_barrier << 5 | rd_barrier << 8
+                | wait_mask << 11 | reuse_flags << 17)
+        return Control(ctrl << 41)
 
     @staticmethod
     def parse(elements):
         assert len(elements) == 5
-        ctrl = Control(0)
-        ctrl.wait_mask = 0 if elements[0] == '--' else int(elements[0])
-        ctrl.rd_barrier = 7 if elements[1] == '-' else int(elements[1])
-        ctrl.wr_barrier = 7 if elements[2] == '-' else int(elements[2])
-        ctrl.yield_hint = elements[3] == 'Y'
-        ctrl.stall = int(elements[4], base=16)
-        return ctrl
+        return Control.from_fields(
+            stall=int(elements[4], base=16),
+            yield_hint=elements[3] == 'Y',
+            wr_barrier=7 if elements[2] == '-' else int(elements[2]),
+            rd_barrier=7 if elements[1] == '-' else int(elements[1]),
+            wait_mask=0 if elements[0] == '--' else int(elements[0], base=16))
+
+    def encode(self):
+        return self._ctrl << 41
+
+    def _key(self):
+        return (self._ctrl << 41,)
 
     def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{}{theme.symbol}:{}{theme.symbol}:{}{theme.symbol}:{}{theme.symbol}:{theme.control_active}{:x}{theme.rs}'.format(
-            theme.control_inactive + '--' if self.wait_mask == 0 else theme.control_active +
-            '{:02x}'.format(self.wait_mask),
-            theme.control_inactive + '-' if self.rd_barrier == 7 else theme.control_active + str(
-                self.rd_barrier),
-            theme.control_inactive + '-' if self.wr_barrier == 7 else theme.control_active + str(
-                self.wr_barrier),
-            theme.control_active + 'Y' if self.yield_hint else theme.control_inactive + '-',
-            self.stall, theme=theme)
+        return _renderer().control(self)
 
-    def __eq__(self, other):
-        return (type(self) == type(other)
-                and self.stall == other.stall
-                and self.yield_hint == other.yield_hint
-                and self.wr_barrier == other.wr_barrier
-                and self.rd_barrier == other.rd_barrier
-                and self.wait_mask == other.wait_mask
-                and self.reuse_flags == other.reuse_flags)
 
+class Predicate(_Value):
+    __slots__ = ('index', 'negated')
 
-class Predicate:
-    def __init__(self, index, negated=False):
-        self.index = index
-        self.negated = negated
+    _cache = {}
+
+    def __new__(cls, index, negated=False):
+        key = (index, negated)
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        self = object.__new__(cls)
+        _setattr(self, 'index', index)
+        _setattr(self, 'negated', negated)
+        if 0 <= index <= 7:
+            cls._cache[key] = self
+        return self
 
     @staticmethod
     def parse(index, negated):
@@ -172,13 +264,11 @@ class Predicate:
             index = int(index)
         return Predicate(index, negated)
 
-    def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{theme.predicate}{}P{}{theme.rs}'.format('!' if self.negated else '',
-                                                         self.index, theme=theme)
+    def _key(self):
+        return (self.index, self.negated)
 
-    def __eq__(self, other):
-        return type(self) == type(other) and self.index == other.index and self.negated == other.negated
+    def __repr__(self):
+        return _renderer().predicate(self)
 
 
 class Instruction:
@@ -190,13 +280,7 @@ class Instruction:
         self.operands = operands
 
     def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{theme.offset}{:#010x}{theme.rs}  {}  {} {theme.opcode}{}{theme.rs} {}'.format(
-            self.offset, self.control, '   ' if not self.predicate else (
-                ('' if self.predicate.negated else ' ') + str(self.predicate)), self.opcode,
-            '{theme.symbol},{theme.rs} '.format(theme=theme).join(
-                ['{}'.format(op) for op in self.operands]) if self.operands else '',
-            theme=theme)
+        return _renderer().instruction(self)
 
     def __eq__(self, other):
         return (type(self) == type(other)
@@ -214,6 +298,275 @@ class UnknownInstruction:
         self.error = error
 
     def __repr__(self):
-        theme = gpu_uarch.theme.get_theme()
-        return '{theme.offset}{:#010x}{theme.rs}  {}      {theme.error}<unknown instruction: {}>{theme.rs}'.format(
-            self.offset, self.control, self.error, theme=theme)
+        return _renderer().instruction(self)
+
+
+# Operand kinds stored in the operand slots of an InstructionTable.
+OPERAND_NONE = 0
+OPERAND_REGISTER = 1
+OPERAND_IMMEDIATE = 2
+OPERAND_SPECIAL_REGISTER = 3
+OPERAND_CONSTANT = 4
+OPERAND_CONSTANT_REGISTER = 5
+OPERAND_MEMORY = 6
+OPERAND_MEMORY_IMMEDIATE = 7
+
+_FLAG_UNIFORM = 0x1
+_FLAG_REUSE = 0x2
+
+
+def _register_flags(register):
+    return (_FLAG_UNIFORM if register.uniform else 0) | (_FLAG_REUSE if register.reuse else 0)
+
+
+def encode_operand(op):
+    if isinstance(op, Register):
+        return OPERAND_REGISTER, _register_flags(op), op.index, 0
+    elif isinstance(op, Immediate):
+        return OPERAND_IMMEDIATE, 0, op.value, 0
+    elif isinstance(op, SpecialRegister):
+        return OPERAND_SPECIAL_REGISTER, 0, op.index, 0
+    elif isinstance(op, ConstantMemory):
+        if isinstance(op.address, Register):
+            return (OPERAND_CONSTANT_REGISTER, _register_flags(op.address), op.bank.value,
+                    op.address.index)
+        return OPERAND_CONSTANT, 0, op.bank.value, op.address.value
+    elif isinstance(op, Memory):
+        if isinstance(op.address, Register):
+            return OPERAND_MEMORY, _register_flags(op.address), op.address.index, op.offset.value
+        return OPERAND_MEMORY_IMMEDIATE, 0, op.address.value, op.offset.value
+    raise Exception('Unsupported operand: {!r}'.format(op))
+
+
+def _decode_register(index, flags):
+    return Register(index, uniform=flags & _FLAG_UNIFORM != 0, reuse=flags & _FLAG_REUSE != 0)
+
+
+def _decode_operand(kind, flags, a, b):
+    if kind == OPERAND_REGISTER:
+        return _decode_register(a, flags)
+    elif kind == OPERAND_IMMEDIATE:
+        return Immediate(a)
+    elif kind == OPERAND_SPECIAL_REGISTER:
+        return SpecialRegister(a)
+    elif kind == OPERAND_CONSTANT:
+        return ConstantMemory(Immediate(a), Immediate(b))
+    elif kind == OPERAND_CONSTANT_REGISTER:
+        return ConstantMemory(Immediate(a), _decode_register(b, flags))
+    elif kind == OPERAND_MEMORY:
+        return Memory(_decode_register(a, flags), Immediate(b))
+    elif kind == OPERAND_MEMORY_IMMEDIATE:
+        return Memory(Immediate(a), Immediate(b))
+    raise Exception('Unknown operand kind: {}'.format(kind))
+
+
+_NO_OPERAND = (OPERAND_NONE, 0, 0, 0)
+
+
+def _copy_column(column, idx):
+    part = column[idx]
+    if isinstance(part, array.array):
+        return part
+    with part:
+        copy = array.array(part.format)
+        copy.frombytes(part.tobytes())
+    return copy
+
+
+class InstructionView:
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def _get(self, name):
+        return self.table.columns[name][self.row]
+
+    @property
+    def offset(self):
+        return self._get('offset')
+
+    @property
+    def known(self):
+        return self._get('opcode_id') != InstructionTable.UNKNOWN_OPCODE
+
+    @property
+    def opcode(self):
+        opcode_id = self._get('opcode_id')
+        if opcode_id == InstructionTable.UNKNOWN_OPCODE:
+            return None
+        return self.table.opcode_names[opcode_id]
+
+    @property
+    def control(self):
+        return Control.from_fields(*[self._get(name) for name in InstructionTable.CONTROL_COLUMNS])
+
+    @property
+    def predicate(self):
+        index = self._get('predicate')
+        if index < 0:
+            return None
+        return Predicate(index, self._get('predicate_negated') != 0)
+
+    @property
+    def operands(self):
+        return self.table._operands(self.row)
+
+    def instruction(self):
+        return self.table._instruction(self.row)
+
+    def __repr__(self):
+        return repr(self.instruction())
+
+
+class InstructionTable:
+    OPERAND_SLOTS = 4
+    UNKNOWN_OPCODE = 0xffff
+
+    CONTROL_COLUMNS = ('stall', 'yield_hint', 'wr_barrier', 'rd_barrier', 'wait_mask',
+                       'reuse_flags')
+    COLUMNS = (
+        [('offset', 'I')]
+        + [(name, 'B') for name in CONTROL_COLUMNS]
+        + [('predicate', 'b'), ('predicate_negated', 'B'), ('opcode_id', 'H'), ('error_id', 'H')]
+        + [(column.format(slot), typecode) for slot in range(OPERAND_SLOTS)
+           for (column, typecode) in (('operand{}_kind', 'B'), ('operand{}_flags', 'B'),
+                                      ('operand{}_a', 'q'), ('operand{}_b', 'q'))]
+    )
+    OPERAND_COLUMNS = [tuple(column.format(slot) for column in ('operand{}_kind', 'operand{}_flags',
+                                                                 'operand{}_a', 'operand{}_b'))
+                       for slot in range(OPERAND_SLOTS)]
+    # Everything but the offset, opcode and error, in the order _encode_row() produces it.
+    ROW_COLUMNS = (list(CONTROL_COLUMNS) + ['predicate', 'predicate_negated']
+                   + [name for names in OPERAND_COLUMNS for name in names])
+
+    def __init__(self, columns=None, opcode_names=None, error_messages=None):
+        if columns is None:
+            columns = {name: array.array(typecode) for (name, typecode) in self.COLUMNS}
+        self.columns = columns
+        self.opcode_names = opcode_names if opcode_names is not None else []
+        self._opcode_ids = {name: idx for (idx, name) in enumerate(self.opcode_names)}
+        # Unknown rows store an index into error_messages. There are only a few distinct
+        # messages, so the Exceptions are built on demand and shared.
+        self.error_messages = error_messages if error_messages is not None else []
+        self._error_ids = {message: idx for (idx, message) in enumerate(self.error_messages)}
+        self._errors = {}
+        self._row_columns = [columns[name] for name in self.ROW_COLUMNS]
+        self._operand_columns = [tuple(columns[name] for name in names)
+                                 for names in self.OPERAND_COLUMNS]
+
+    @staticmethod
+    def from_instructions(instructions):
+        table = InstructionTable()
+        for inst in instructions:
+            table.append(inst)
+        return table
+
+    def _opcode_id(self, name):
+        try:
+            return self._opcode_ids[name]
+        except KeyError:
+            self._opcode_ids[name] = len(self.opcode_names)
+            self.opcode_names.append(name)
+            return self._opcode_ids[name]
+
+    def _error_id(self, message):
+        try:
+            return self._error_ids[message]
+        except KeyError:
+            self._error_ids[message] = len(self.error_messages)
+            self.error_messages.append(message)
+            return self._error_ids[message]
+
+    def error(self, error_id):
+        try:
+            return self._errors[error_id]
+        except KeyError:
+            err = self._errors[error_id] = Exception(self.error_messages[error_id])
+            return err
+
+    @staticmethod
+    def _encode_row(ctrl, pred, operands):
+        if len(operands) > InstructionTable.OPERAND_SLOTS:
+            raise Exception('Too many operands: {}'.format(len(operands)))
+        row = [ctrl.stall, 1 if ctrl.yield_hint else 0, ctrl.wr_barrier, ctrl.rd_barrier,
+               ctrl.wait_mask, ctrl.reuse_flags,
+               -1 if pred is None else pred.index, 1 if pred is not None and pred.negated else 0]
+        for op in operands:
+            row.extend(encode_operand(op))
+        row.extend(_NO_OPERAND * (InstructionTable.OPERAND_SLOTS - len(operands)))
+        return row
+
+    # Rows are added column by column: transposing them and extending each array is much cheaper
+    # than appending value by value.
+    def _append_rows(self, offsets, opcode_ids, error_ids, rows):
+        columns = self.columns
+        columns['offset'].extend(offsets)
+        columns['opcode_id'].extend(opcode_ids)
+        columns['error_id'].extend(error_ids)
+        for (column, values) in zip(self._row_columns, zip(*rows)):
+            column.extend(values)
+
+    def append(self, inst):
+        if isinstance(inst, UnknownInstruction):
+            self._append_rows([inst.offset], [self.UNKNOWN_OPCODE], [self._error_id(str(inst.error))],
+                              [self._encode_row(inst.control, None, ())])
+        else:
+            self._append_rows([inst.offset], [self._opcode_id(inst.opcode)], [0],
+                              [self._encode_row(inst.control, inst.predicate, inst.operands)])
+
+    def extend(self, other):
+        remap = [self._opcode_id(name) for name in other.opcode_names]
+        remap_errors = [self._error_id(message) for message in other.error_messages]
+        for (name, column) in self.columns.items():
+            if name == 'opcode_id':
+                column.extend(self.UNKNOWN_OPCODE if i == self.UNKNOWN_OPCODE else remap[i]
+                              for i in other.columns[name])
+            elif name == 'error_id' and remap_errors != list(range(len(remap_errors))):
+                column.extend(remap_errors[i] if i < len(remap_errors) else 0
+                              for i in other.columns[name])
+            else:
+                column.extend(other.columns[name])
+
+    def __len__(self):
+        return len(self.columns['offset'])
+
+    def _operands(self, row):
+        operands = []
+        for (kind, flags, a, b) in self._operand_columns:
+            if kind[row] == OPERAND_NONE:
+                break
+            operands.append(_decode_operand(kind[row], flags[row], a[row], b[row]))
+        return operands
+
+    def _instruction(self, row):
+        columns = self.columns
+        ctrl = Control.from_fields(*[columns[name][row] for name in self.CONTROL_COLUMNS])
+        opcode_id = columns['opcode_id'][row]
+        if opcode_id == self.UNKNOWN_OPCODE:
+            return UnknownInstruction(columns['offset'][row], ctrl,
+                                      self.error(columns['error_id'][row]))
+        index = columns['predicate'][row]
+        pred = None if index < 0 else Predicate(index, columns['predicate_negated'][row] != 0)
+        return Instruction(columns['offset'][row], ctrl, pred, self.opcode_names[opcode_id],
+                           self._operands(row))
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            # Slices own their rows: views would pin the parent's arrays, which then could not
+            # grow, and keep a mapped file from being closed.
+            columns = {name: _copy_column(column, idx) for (name, column) in self.columns.items()}
+            return InstructionTable(columns, self.opcode_names, self.error_messages)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('instruction index out of range')
+        return InstructionView(self, idx)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield InstructionView(self, row)
+
+    def instructions(self):
+        return [self._instruction(row) for row in range(len(self))]
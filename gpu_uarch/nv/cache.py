@@ -0,0 +1,146 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import os
+
+import gpu_uarch.nv.export as export
+import gpu_uarch.nv.turing as turing
+
+
+def cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                        'gpu_uarch')
+
+
+# Content-addressed store for disassembly results. Entries are keyed by a hash of the section
+# bytes, the decoder version and a variant naming what was stored (e.g. an output format and its
+# version), so a changed decoder, format or code never hits a stale entry. Recency is tracked with
+# the file mtime and the least recently used entries are evicted once the cache outgrows max_size.
+# The total size is kept in a file next to the entries, so storing an entry does not need to walk
+# the whole cache; concurrent writers can make it drift, and each eviction recomputes it.
+class DisasmCache:
+    DEFAULT_MAX_SIZE = 1 << 30
+    SIZE_FILE = 'size'
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory if directory is not None else os.path.join(cache_dir(),
+                                                                              'disasm')
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, data, variant=''):
+        h = hashlib.sha256('{}\0{}\0'.format(turing.DECODER_VERSION, variant).encode())
+        h.update(data)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return blob
+
+    def _read_size(self):
+        try:
+            with open(os.path.join(self.directory, self.SIZE_FILE)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return sum(size for (_, _, size) in self._entries())
+
+    def _write_size(self, size):
+        path = os.path.join(self.directory, self.SIZE_FILE)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = '{}.{}'.format(path, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(str(size))
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def put(self, key, blob):
+        path = self._path(key)
+        size = self._read_size()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '{}.{}'.format(path, os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        size += len(blob)
+        if size > self.max_size:
+            self.evict()
+        else:
+            self._write_size(size)
+
+    def _entries(self):
+        for (root, _, files) in os.walk(self.directory):
+            if root == self.directory:
+                # the size file
+                continue
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def evict(self, max_size=None):
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(entry[2] for entry in entries)
+        for (path, _, entry_size) in entries:
+            if size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._write_size(size)
+
+    def clear(self):
+        self.evict(0)
+
+    def disasm_table(self, data):
+        key = self.key(data, 'table:{}'.format(export.COLUMNAR_VERSION))
+        blob = self.get(key)
+        if blob is not None:
+            try:
+                return export.loads_columnar(blob)[0]
+            except Exception:
+                pass
+        table = turing.disasm_table(data)
+        self.put(key, export.dumps_columnar(table))
+        return table
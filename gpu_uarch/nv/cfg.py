@@ -0,0 +1,331 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import gpu_uarch.nv.render
+import gpu_uarch.theme
+from gpu_uarch.nv import Immediate, UnknownInstruction, InstructionTable
+
+BRANCH_OPCODES = frozenset(['BRA'])
+EXIT_OPCODES = frozenset(['EXIT'])
+
+EDGE_FALLTHROUGH = 'fallthrough'
+EDGE_BRANCH = 'branch'
+
+
+def is_unconditional(inst):
+    pred = inst.predicate
+    return pred is None or (pred.index == 7 and not pred.negated)
+
+
+def _branch_target(inst):
+    for op in inst.operands:
+        if isinstance(op, Immediate):
+            return op.value
+    return None
+
+
+class BasicBlock:
+    def __init__(self, index, start, end, instructions):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.instructions = instructions
+        # (block, kind) pairs
+        self.successors = []
+        self.predecessors = []
+        self.idom = None
+
+    @property
+    def offset(self):
+        return self.instructions[0].offset
+
+    @property
+    def terminator(self):
+        return self.instructions[-1]
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __repr__(self):
+        return 'BasicBlock({}, {:#x}, {} instructions)'.format(self.index, self.offset, len(self))
+
+
+# Analyses accept a list of instructions, a basic block or an instruction table.
+def instruction_list(instructions):
+    if isinstance(instructions, BasicBlock):
+        return list(instructions.instructions)
+    if isinstance(instructions, InstructionTable):
+        return instructions.instructions()
+    return list(instructions)
+
+
+class Loop:
+    def __init__(self, header, blocks, back_edges):
+        self.header = header
+        self.blocks = blocks
+        self.back_edges = back_edges
+        self.parent = None
+        self.children = []
+
+    @property
+    def depth(self):
+        depth = 1
+        loop = self.parent
+        while loop is not None:
+            depth += 1
+            loop = loop.parent
+        return depth
+
+    def instruction_count(self, cfg):
+        return sum(len(cfg.blocks[block]) for block in self.blocks)
+
+    def __repr__(self):
+        return 'Loop(header={}, {} blocks)'.format(self.header, len(self.blocks))
+
+
+class ControlFlowGraph:
+    def __init__(self, instructions):
+        self.instructions = list(instructions)
+        self.blocks = []
+        # Branch instructions whose target is not the start of an instruction in this function.
+        self.external_branches = []
+        self._rows = {inst.offset: row for (row, inst) in enumerate(self.instructions)}
+        self._build_blocks()
+        self._build_edges()
+        self._order = self._reverse_postorder()
+        self._compute_dominators()
+        self.loops = self._find_loops()
+
+    @staticmethod
+    def from_function(func):
+        return ControlFlowGraph(func.disasm())
+
+    def _target_row(self, inst):
+        target = _branch_target(inst)
+        return self._rows.get(target)
+
+    def _build_blocks(self):
+        instructions = self.instructions
+        if not instructions:
+            return
+        leaders = bytearray(len(instructions) + 1)
+        leaders[0] = 1
+        for (row, inst) in enumerate(instructions):
+            if isinstance(inst, UnknownInstruction):
+                continue
+            if inst.opcode in BRANCH_OPCODES:
+                target = self._target_row(inst)
+                if target is None:
+                    self.external_branches.append(row)
+                else:
+                    leaders[target] = 1
+                leaders[row + 1] = 1
+            elif inst.opcode in EXIT_OPCODES:
+                leaders[row + 1] = 1
+
+        self._block_of_row = [0] * len(instructions)
+        start = 0
+        for row in range(1, len(instructions) + 1):
+            if leaders[row] or row == len(instructions):
+                index = len(self.blocks)
+                self.blocks.append(BasicBlock(index, start, row, instructions[start:row]))
+                self._block_of_row[start:row] = [index] * (row - start)
+                start = row
+
+    def _add_edge(self, src, dst, kind):
+        src.successors.append((dst, kind))
+        dst.predecessors.append((src, kind))
+
+    def _build_edges(self):
+        for block in self.blocks:
+            inst = block.terminator
+            falls_through = True
+            if not isinstance(inst, UnknownInstruction):
+                if inst.opcode in BRANCH_OPCODES:
+                    target = self._target_row(inst)
+                    if target is not None:
+                        self._add_edge(block, self.blocks[self._block_of_row[target]],
+                                       EDGE_BRANCH)
+                    falls_through = not is_unconditional(inst)
+                elif inst.opcode in EXIT_OPCODES:
+                    falls_through = not is_unconditional(inst)
+            if falls_through and block.index + 1 < len(self.blocks):
+                self._add_edge(block, self.blocks[block.index + 1], EDGE_FALLTHROUGH)
+
+    def block_at(self, offset):
+        return self.blocks[self._block_of_row[self._rows[offset]]]
+
+    @property
+    def entry(self):
+        return self.blocks[0] if self.blocks else None
+
+    def _reverse_postorder(self):
+        if not self.blocks:
+            return []
+        order = []
+        visited = bytearray(len(self.blocks))
+        visited[0] = 1
+        stack = [(self.blocks[0], iter(self.blocks[0].successors))]
+        while stack:
+            (block, successors) = stack[-1]
+            for (succ, _) in successors:
+                if not visited[succ.index]:
+                    visited[succ.index] = 1
+                    stack.append((succ, iter(succ.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def reachable(self):
+        return list(self._order)
+
+    # Cooper, Harvey, Kennedy: "A Simple, Fast Dominance Algorithm".
+    def _compute_dominators(self):
+        if not self._order:
+            return
+        rpo = [-1] * len(self.blocks)
+        for (number, block) in enumerate(self._order):
+            rpo[block.index] = number
+        idom = [-1] * len(self.blocks)
+        entry = self._order[0].index
+        idom[entry] = entry
+
+        def intersect(a, b):
+            while a != b:
+                while rpo[a] > rpo[b]:
+                    a = idom[a]
+                while rpo[b] > rpo[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for block in self._order[1:]:
+                new_idom = -1
+                for (pred, _) in block.predecessors:
+                    if idom[pred.index] == -1:
+                        continue
+                    new_idom = pred.index if new_idom == -1 else intersect(pred.index, new_idom)
+                if idom[block.index] != new_idom:
+                    idom[block.index] = new_idom
+                    changed = True
+
+        for block in self._order[1:]:
+            block.idom = self.blocks[idom[block.index]]
+
+        # Pre- and post-order numbering of the dominator tree gives constant time dominance
+        # queries.
+        children = [[] for _ in self.blocks]
+        for block in self._order[1:]:
+            children[block.idom.index].append(block.index)
+        self._dom_pre = [-1] * len(self.blocks)
+        self._dom_post = [-1] * len(self.blocks)
+        counter = 0
+        stack = [(entry, iter(children[entry]))]
+        self._dom_pre[entry] = counter
+        while stack:
+            (node, it) = stack[-1]
+            child = next(it, None)
+            if child is None:
+                stack.pop()
+                counter += 1
+                self._dom_post[node] = counter
+            else:
+                counter += 1
+                self._dom_pre[child] = counter
+                stack.append((child, iter(children[child])))
+
+    def dominates(self, a, b):
+        if self._dom_pre[a.index] == -1 or self._dom_pre[b.index] == -1:
+            return False
+        return (self._dom_pre[a.index] <= self._dom_pre[b.index]
+                and self._dom_post[b.index] <= self._dom_post[a.index])
+
+    def dominators(self, block):
+        result = []
+        while block is not None:
+            result.append(block)
+            block = block.idom
+        return result
+
+    def _find_loops(self):
+        back_edges = {}
+        for block in self._order:
+            for (succ, _) in block.successors:
+                if self.dominates(succ, block):
+                    back_edges.setdefault(succ.index, []).append(block.index)
+
+        loops = []
+        for block in self._order:
+            if block.index not in back_edges:
+                continue
+            header = block.index
+            body = {header}
+            stack = [tail for tail in back_edges[header] if tail != header]
+            body.update(stack)
+            while stack:
+                for (pred, _) in self.blocks[stack.pop()].predecessors:
+                    if pred.index not in body and self._dom_pre[pred.index] != -1:
+                        body.add(pred.index)
+                        stack.append(pred.index)
+            loops.append(Loop(header, frozenset(body), back_edges[header]))
+
+        # Headers are visited in reverse postorder, so an enclosing loop always comes first.
+        for (i, loop) in enumerate(loops):
+            for outer in reversed(loops[:i]):
+                if loop.header in outer.blocks and loop.blocks <= outer.blocks:
+                    loop.parent = outer
+                    outer.children.append(loop)
+                    break
+        return loops
+
+    def loop_of(self, block):
+        innermost = None
+        for loop in self.loops:
+            if block.index in loop.blocks:
+                if innermost is None or loop.depth > innermost.depth:
+                    innermost = loop
+        return innermost
+
+    def to_dot(self, name='cfg'):
+        renderer = gpu_uarch.nv.render.Renderer(gpu_uarch.theme.NoTheme())
+        headers = {loop.header for loop in self.loops}
+        lines = ['digraph "{}" {{'.format(_dot_escape(name)),
+                 '  node [shape=box, fontname="monospace"];']
+        for block in self.blocks:
+            label = ''.join(_dot_escape(renderer.instruction(inst)) + '\\l'
+                            for inst in block.instructions)
+            style = ', style=bold' if block.index in headers else ''
+            lines.append('  b{} [label="{}"{}];'.format(block.index, label, style))
+        for block in self.blocks:
+            for (succ, kind) in block.successors:
+                style = ' [style=dashed]' if kind == EDGE_FALLTHROUGH else ''
+                lines.append('  b{} -> b{}{};'.format(block.index, succ.index, style))
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+
+def _dot_escape(s):
+    return s.replace('\\', '\\\\').replace('"', '\\"')
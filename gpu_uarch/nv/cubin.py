@@ -19,29 +19,157 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import cxxfilt
-from elftools.elf.elffile import ELFFile
+import glob
+import io
+import mmap
+import os
+import struct
+import time
 
+import gpu_uarch.nv.stats as stats
 import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import Control, Instruction
 
 
 class Function:
-    def __init__(self, symbol, data):
+    def __init__(self, symbol, data, cache=None, file_offset=None):
         self.symbol = symbol
-        self.name = cxxfilt.demangle(symbol)
         self.data = data
+        self.cache = cache
+        # offset of the function's .text section in the ELF image
+        self.file_offset = file_offset
+        self._name = None
 
-    def disasm(self):
+    @property
+    def name(self):
+        if self._name is None:
+            import cxxfilt
+            collector = stats.current()
+            if collector is None:
+                self._name = cxxfilt.demangle(self.symbol)
+            else:
+                with collector.timed('demangle'):
+                    self._name = cxxfilt.demangle(self.symbol)
+        return self._name
+
+    def words(self):
+        return list(struct.iter_unpack('<QQ', self.data))
+
+    def disasm(self, where=None):
         # FIXME: verify sm_75
-        return turing.disasm(self.data)
+        if self.cache is not None and where is None:
+            return self.cache.disasm_table(self.data).instructions()
+        return turing.disasm(self.data, where)
+
+    def iter_disasm(self, where=None):
+        # FIXME: verify sm_75
+        if self.cache is not None and where is None:
+            return iter(self.cache.disasm_table(self.data).instructions())
+        return turing.iter_disasm(self.data, where)
+
+    def disasm_table(self, where=None):
+        # FIXME: verify sm_75
+        if self.cache is not None and where is None:
+            return self.cache.disasm_table(self.data)
+        return turing.disasm_table(self.data, where)
+
+
+_PADDING = Instruction(0, Control.from_fields(0, False, 7, 7, 0), None, 'NOP', [])
+
+
+def find_cubins(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for (root, dirs, files) in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith('.cubin'):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(path):
+            yield from sorted(glob.glob(path, recursive=True))
+        else:
+            yield path
 
 
 class CuBin:
-    def __init__(self, filename):
+    def __init__(self, source, lazy=False, cache=None):
+        if cache is True:
+            from gpu_uarch.nv.cache import DisasmCache
+            cache = DisasmCache()
         self.functions = []
-        with open(filename, 'rb') as f:
-            e = ELFFile(f)
-            for section in e.iter_sections():
-                if section.name.startswith('.text.'):
-                    self.functions.append(
-                        Function(section.name[6:], section.data()))
+        self.cache = cache
+        self._source = source
+        self._file = None
+        self._mmap = None
+        collector = stats.current()
+        start = time.perf_counter()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            self._read_functions(io.BytesIO(view), view)
+        elif lazy:
+            self._file = open(source, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._mmap)
+            self._read_functions(self._file, view)
+            view.release()
+        else:
+            with open(source, 'rb') as f:
+                self._read_functions(f, None)
+        if collector is not None:
+            collector.record('elf', time.perf_counter() - start,
+                             sum(len(func.data) for func in self.functions))
+
+    def _read_functions(self, stream, view):
+        from elftools.elf.elffile import ELFFile
+
+        for section in ELFFile(stream).iter_sections():
+            if section.name.startswith('.text.'):
+                start = section['sh_offset']
+                if view is None:
+                    data = section.data()
+                else:
+                    data = view[start:start + section['sh_size']]
+                self.functions.append(Function(section.name[6:], data, self.cache, start))
+
+    def image(self):
+        if isinstance(self._source, (bytes, bytearray, memoryview)):
+            return bytes(self._source)
+        with open(self._source, 'rb') as f:
+            return f.read()
+
+    def splice(self, code):
+        image = bytearray(self.image())
+        code = dict(code)
+        for func in self.functions:
+            if func.symbol not in code:
+                continue
+            data = code.pop(func.symbol)
+            size = len(func.data)
+            if len(data) % 16 != 0:
+                raise Exception('Code for {} is not a whole number of instructions'.format(
+                    func.symbol))
+            if len(data) > size:
+                raise Exception('Code for {} does not fit in its section: {} > {} bytes'.format(
+                    func.symbol, len(data), size))
+            data = bytes(data) + turing.assemble([_PADDING] * ((size - len(data)) // 16))
+            image[func.file_offset:func.file_offset + size] = data
+        if code:
+            raise Exception('Unknown function: {}'.format(', '.join(sorted(code))))
+        return bytes(image)
+
+    def close(self):
+        if self._mmap is None:
+            return
+        for func in self.functions:
+            if isinstance(func.data, memoryview):
+                func.data.release()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
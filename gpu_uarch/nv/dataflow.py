@@ -0,0 +1,106 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from gpu_uarch.nv import Register, ConstantMemory, Memory, UnknownInstruction
+
+# Registers are numbered in a single space so that sets of them fit in one int bitset: regular
+# registers R0-R254 are 0-254, uniform registers UR0-UR62 are UNIFORM_BASE + 0-62. RZ and URZ are
+# never tracked.
+ZERO_REGISTER = 255
+UNIFORM_ZERO_REGISTER = 63
+UNIFORM_BASE = 256
+
+# Instructions whose first operand is not a destination.
+NO_DESTINATION_OPCODES = frozenset(['STG', 'BRA', 'EXIT', 'NOP'])
+
+
+def register_slot(register):
+    if register.uniform:
+        if register.index == UNIFORM_ZERO_REGISTER:
+            return None
+        return UNIFORM_BASE + register.index
+    if register.index == ZERO_REGISTER:
+        return None
+    return register.index
+
+
+def slot_name(slot):
+    if slot >= UNIFORM_BASE:
+        return 'UR{}'.format(slot - UNIFORM_BASE)
+    return 'R{}'.format(slot)
+
+
+def _base_opcode(opcode):
+    return opcode.split('.', 1)[0]
+
+
+def _slots(register, width):
+    slot = register_slot(register)
+    if slot is None:
+        return []
+    return list(range(slot, slot + width))
+
+
+def _operand_uses(op, data_width, address_width):
+    if isinstance(op, Register):
+        return _slots(op, data_width)
+    elif isinstance(op, ConstantMemory):
+        return _operand_uses(op.address, 1, 1)
+    elif isinstance(op, Memory):
+        return _operand_uses(op.address, address_width, address_width)
+    return []
+
+
+def _widths(opcode):
+    suffixes = opcode.split('.')[1:]
+    # '.64' widens the data registers, '.E' makes memory addresses 64-bit register pairs.
+    return 2 if '64' in suffixes else 1, 2 if 'E' in suffixes else 1
+
+
+def defs(inst):
+    if isinstance(inst, UnknownInstruction) or not inst.operands:
+        return []
+    if _base_opcode(inst.opcode) in NO_DESTINATION_OPCODES:
+        return []
+    dst = inst.operands[0]
+    if not isinstance(dst, Register):
+        return []
+    return _slots(dst, _widths(inst.opcode)[0])
+
+
+def sources(inst):
+    if isinstance(inst, UnknownInstruction):
+        return []
+    operands = inst.operands
+    if _base_opcode(inst.opcode) not in NO_DESTINATION_OPCODES and operands and isinstance(
+            operands[0], Register):
+        return operands[1:]
+    return operands
+
+
+def uses(inst):
+    if isinstance(inst, UnknownInstruction):
+        return []
+    (data_width, address_width) = _widths(inst.opcode)
+    result = []
+    for op in sources(inst):
+        result.extend(_operand_uses(op, data_width, address_width))
+    return result
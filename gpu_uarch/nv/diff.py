@@ -0,0 +1,283 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import struct
+
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import UnknownInstruction
+from gpu_uarch.nv.dataflow import UNIFORM_BASE, defs, uses
+
+# Kernel-level comparison of two cubins. Functions are paired by demangled name; byte-identical
+# sections are recognized by their hash and never decoded. Changed functions are aligned with
+# Myers' diff over the decoded instructions without their control bits. Decoding keeps branch
+# targets relative to the instruction, so code that merely moved compares equal, and a change of
+# scheduling alone is reported as changed stalls or barriers rather than as a replacement.
+
+FUNCTION_ADDED = 'added'
+FUNCTION_REMOVED = 'removed'
+FUNCTION_CHANGED = 'changed'
+FUNCTION_IDENTICAL = 'identical'
+
+NO_BARRIER = 7
+
+# Above this many inserted and deleted instructions the remaining middle part is reported as a
+# single replacement instead of being aligned. Aligning takes O((N+M)D) time.
+MAX_EDITS = 512
+
+_CONTROL_MASK = ~(0x1fffff << 41)
+
+
+def _middle_snake(a, a0, a1, b, b0, b1, max_edits=None):
+    # Myers' linear space refinement: extends the furthest reaching paths from both corners until
+    # they overlap. Returns the number of edits and the middle snake (x, y, u, v), a diagonal run
+    # from (x, y) to (u, v) that lies on an optimal path, or None once more than max_edits edits
+    # would be needed.
+    (n, m) = (a1 - a0, b1 - b0)
+    delta = n - m
+    odd = delta & 1
+    forward = {1: 0}
+    backward = {1: 0}
+    for d in range((n + m + 1) // 2 + 1):
+        if max_edits is not None and 2 * d - 1 > max_edits:
+            return None
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[k - 1] < forward[k + 1]):
+                x = forward[k + 1]
+            else:
+                x = forward[k - 1] + 1
+            (start, y) = (x, x - k)
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            forward[k] = x
+            if odd and delta - d < k < delta + d and x + backward[delta - k] >= n:
+                return 2 * d - 1, (start, start - k, x, y)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[k - 1] < backward[k + 1]):
+                x = backward[k + 1]
+            else:
+                x = backward[k - 1] + 1
+            (start, y) = (x, x - k)
+            while x < n and y < m and a[a1 - 1 - x] == b[b1 - 1 - y]:
+                x += 1
+                y += 1
+            backward[k] = x
+            if not odd and -d <= delta - k <= d and x + forward[delta - k] >= n:
+                return 2 * d, (n - x, m - y, n - start, m - (start - k))
+
+
+def _align(hunks, a, a0, a1, b, b0, b1, max_edits=None):
+    # Appends the hunks turning a[a0:a1] into b[b0:b1]. Returns False, without appending anything,
+    # if that takes more than max_edits edits.
+    prefix = 0
+    while a0 + prefix < a1 and b0 + prefix < b1 and a[a0 + prefix] == b[b0 + prefix]:
+        prefix += 1
+    suffix = 0
+    while (a0 + prefix < a1 - suffix and b0 + prefix < b1 - suffix
+           and a[a1 - 1 - suffix] == b[b1 - 1 - suffix]):
+        suffix += 1
+    (c0, c1, d0, d1) = (a0 + prefix, a1 - suffix, b0 + prefix, b1 - suffix)
+
+    snake = None
+    if c0 == c1 or d0 == d1:
+        if max_edits is not None and c1 - c0 + d1 - d0 > max_edits:
+            return False
+    else:
+        # Both sides are non-empty and differ at the ends, so at least two edits are needed and
+        # both halves around the middle snake are smaller than the whole.
+        snake = _middle_snake(a, c0, c1, b, d0, d1, max_edits)
+        if snake is None or (max_edits is not None and snake[0] > max_edits):
+            return False
+
+    _append(hunks, 'equal', a0, c0, b0, d0)
+    if snake is None:
+        _append(hunks, 'delete', c0, c1, d0, d0)
+        _append(hunks, 'insert', c1, c1, d0, d1)
+    else:
+        (x, y, u, v) = snake[1]
+        _align(hunks, a, c0, c0 + x, b, d0, d0 + y)
+        _append(hunks, 'equal', c0 + x, c0 + u, d0 + y, d0 + v)
+        _align(hunks, a, c0 + u, c1, b, d0 + v, d1)
+    _append(hunks, 'equal', c1, a1, d1, b1)
+    return True
+
+
+def _append(hunks, tag, i1, i2, j1, j2):
+    if i1 == i2 and j1 == j2:
+        return
+    if hunks:
+        (last, a1, a2, b1, b2) = hunks[-1]
+        if last == tag or (last != 'equal' and tag != 'equal'):
+            hunks[-1] = (tag if last == tag else 'replace', a1, i2, b1, j2)
+            return
+    hunks.append((tag, i1, i2, j1, j2))
+
+
+def myers(a, b, max_edits=MAX_EDITS):
+    # Returns difflib-style opcodes: (tag, i1, i2, j1, j2) with tag one of 'equal', 'delete',
+    # 'insert' and 'replace'. Memory use is linear in the length of the inputs.
+    (n, m) = (len(a), len(b))
+    prefix = 0
+    while prefix < min(n, m) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < min(n, m) - prefix and a[n - 1 - suffix] == b[m - 1 - suffix]:
+        suffix += 1
+
+    hunks = []
+    _append(hunks, 'equal', 0, prefix, 0, prefix)
+    if not _align(hunks, a, prefix, n - suffix, b, prefix, m - suffix, max_edits):
+        _append(hunks, 'replace', prefix, n - suffix, prefix, m - suffix)
+    _append(hunks, 'equal', n - suffix, n, m - suffix, m)
+    return hunks
+
+
+class Summary:
+    def __init__(self, instructions):
+        self.instructions = len(instructions)
+        self.stalls = 0
+        self.yields = 0
+        self.waits = 0
+        barriers = set()
+        registers = set()
+        for inst in instructions:
+            ctrl = inst.control
+            self.stalls += ctrl.stall
+            self.yields += ctrl.yield_hint
+            self.waits += ctrl.wait_mask != 0
+            barriers.update(barrier for barrier in (ctrl.wr_barrier, ctrl.rd_barrier)
+                            if barrier != NO_BARRIER)
+            if not isinstance(inst, UnknownInstruction):
+                registers.update(defs(inst))
+                registers.update(uses(inst))
+        self.barriers = frozenset(barriers)
+        # highest register used + 1, as it determines the register allocation
+        self.registers = max((slot + 1 for slot in registers if slot < UNIFORM_BASE), default=0)
+        self.uniform_registers = max((slot + 1 - UNIFORM_BASE for slot in registers
+                                      if slot >= UNIFORM_BASE), default=0)
+
+    def as_dict(self):
+        return {
+            'instructions': self.instructions,
+            'stalls': self.stalls,
+            'yields': self.yields,
+            'waits': self.waits,
+            'barriers': sorted(self.barriers),
+            'registers': self.registers,
+            'uniform_registers': self.uniform_registers,
+        }
+
+
+class FunctionDiff:
+    def __init__(self, name, status, old=None, new=None, hunks=None, stalls_changed=0,
+                 barriers_changed=0):
+        self.name = name
+        self.status = status
+        # Summary of each side, None for a missing function and for identical functions
+        self.old = old
+        self.new = new
+        self.hunks = hunks if hunks is not None else []
+        # aligned instructions whose stall count, or whose barriers and wait mask, changed
+        self.stalls_changed = stalls_changed
+        self.barriers_changed = barriers_changed
+
+    @property
+    def inserted(self):
+        return sum(j2 - j1 for (tag, i1, i2, j1, j2) in self.hunks if tag != 'equal')
+
+    @property
+    def deleted(self):
+        return sum(i2 - i1 for (tag, i1, i2, j1, j2) in self.hunks if tag != 'equal')
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'status': self.status,
+            'old': None if self.old is None else self.old.as_dict(),
+            'new': None if self.new is None else self.new.as_dict(),
+            'inserted': self.inserted,
+            'deleted': self.deleted,
+            'stalls_changed': self.stalls_changed,
+            'barriers_changed': self.barriers_changed,
+        }
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _decode(data, ids):
+    # Numbers each instruction by its decoded form without the control bits, so that comparing
+    # two of them is cheap; unknown words are numbered by their raw bits instead.
+    keys = []
+    controls = []
+    for (lo, hi) in struct.iter_unpack('<QQ', data):
+        (ctrl, pred, name, operands) = turing.decode_word(lo, hi)
+        key = (pred, name, operands) if name is not None else (lo, hi & _CONTROL_MASK)
+        keys.append(ids.setdefault(key, len(ids)))
+        controls.append(ctrl)
+    return keys, controls
+
+
+def _control_changes(hunks, old, new):
+    stalls = 0
+    barriers = 0
+    for (tag, i1, i2, j1, j2) in hunks:
+        if tag != 'equal':
+            continue
+        for (a, b) in zip(old[i1:i2], new[j1:j2]):
+            stalls += a.stall != b.stall
+            barriers += ((a.wr_barrier, a.rd_barrier, a.wait_mask)
+                         != (b.wr_barrier, b.rd_barrier, b.wait_mask))
+    return stalls, barriers
+
+
+def diff_functions(old, new, max_edits=MAX_EDITS):
+    if old is None:
+        return FunctionDiff(new.name, FUNCTION_ADDED, new=Summary(new.disasm()))
+    if new is None:
+        return FunctionDiff(old.name, FUNCTION_REMOVED, old=Summary(old.disasm()))
+    if _digest(old.data) == _digest(new.data):
+        return FunctionDiff(new.name, FUNCTION_IDENTICAL)
+    ids = {}
+    (a, old_controls) = _decode(old.data, ids)
+    (b, new_controls) = _decode(new.data, ids)
+    hunks = myers(a, b, max_edits)
+    return FunctionDiff(new.name, FUNCTION_CHANGED, Summary(old.disasm()), Summary(new.disasm()),
+                        hunks, *_control_changes(hunks, old_controls, new_controls))
+
+
+def pair_functions(old_functions, new_functions):
+    # Pairs by demangled name; functions sharing a name are paired in order.
+    old_by_name = {}
+    for func in old_functions:
+        old_by_name.setdefault(func.name, []).append(func)
+    pairs = []
+    for func in new_functions:
+        candidates = old_by_name.get(func.name)
+        pairs.append((candidates.pop(0) if candidates else None, func))
+    pairs.extend((func, None) for funcs in old_by_name.values() for func in funcs)
+    return pairs
+
+
+def diff_cubins(old, new, max_edits=MAX_EDITS):
+    return [diff_functions(a, b, max_edits) for (a, b) in pair_functions(old.functions,
+                                                                          new.functions)]
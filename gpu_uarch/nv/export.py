@@ -0,0 +1,263 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import array
+import csv
+import io
+import json
+import mmap
+import struct
+import sys
+
+from gpu_uarch.nv import (Immediate, Register, SpecialRegister, ConstantMemory, Memory, Predicate,
+                          UnknownInstruction, InstructionTable)
+from gpu_uarch.nv import (OPERAND_NONE, OPERAND_REGISTER, OPERAND_IMMEDIATE,
+                          OPERAND_SPECIAL_REGISTER, OPERAND_CONSTANT, OPERAND_CONSTANT_REGISTER,
+                          OPERAND_MEMORY, OPERAND_MEMORY_IMMEDIATE, _FLAG_UNIFORM, _FLAG_REUSE,
+                          encode_operand)
+
+
+FORMATS = ('jsonl', 'csv', 'columnar')
+# Bump whenever the jsonl or csv records change so that cached output is not reused.
+EXPORT_VERSION = 1
+
+
+def operand_record(op):
+    if isinstance(op, Register):
+        return {'type': 'register', 'index': op.index, 'uniform': op.uniform, 'reuse': op.reuse}
+    elif isinstance(op, Immediate):
+        return {'type': 'immediate', 'value': op.value}
+    elif isinstance(op, SpecialRegister):
+        return {'type': 'special_register', 'index': op.index,
+                'name': SpecialRegister.NAMES.get(op.index)}
+    elif isinstance(op, ConstantMemory):
+        return {'type': 'constant', 'bank': op.bank.value, 'address': operand_record(op.address)}
+    elif isinstance(op, Memory):
+        return {'type': 'memory', 'address': operand_record(op.address),
+                'offset': op.offset.value}
+    elif isinstance(op, Predicate):
+        return {'type': 'predicate', 'index': op.index, 'negated': op.negated}
+    raise Exception('Unsupported operand: {!r}'.format(op))
+
+
+def instruction_record(inst, function=None):
+    ctrl = inst.control
+    record = {
+        'function': function,
+        'offset': inst.offset,
+        'stall': ctrl.stall,
+        'yield_hint': ctrl.yield_hint,
+        'wr_barrier': ctrl.wr_barrier,
+        'rd_barrier': ctrl.rd_barrier,
+        'wait_mask': ctrl.wait_mask,
+        'reuse_flags': ctrl.reuse_flags,
+    }
+    if isinstance(inst, UnknownInstruction):
+        record.update(predicate=None, opcode=None, operands=[], error=str(inst.error))
+        return record
+    pred = inst.predicate
+    record.update(predicate=None if pred is None else {'index': pred.index, 'negated': pred.negated},
+                  opcode=inst.opcode, operands=[operand_record(op) for op in inst.operands],
+                  error=None)
+    return record
+
+
+def iter_jsonl(instructions, function=None):
+    for inst in instructions:
+        yield json.dumps(instruction_record(inst, function), separators=(',', ':')) + '\n'
+
+
+_OPERAND_KIND_NAMES = {
+    OPERAND_NONE: '',
+    OPERAND_REGISTER: 'register',
+    OPERAND_IMMEDIATE: 'immediate',
+    OPERAND_SPECIAL_REGISTER: 'special_register',
+    OPERAND_CONSTANT: 'constant',
+    OPERAND_CONSTANT_REGISTER: 'constant_register',
+    OPERAND_MEMORY: 'memory',
+    OPERAND_MEMORY_IMMEDIATE: 'memory_immediate',
+}
+
+# Operand slots use the InstructionTable encoding: 'a' is the register index, immediate value,
+# special register index or constant bank; 'b' is the constant address (or its register index)
+# or the memory offset.
+CSV_COLUMNS = (['function', 'offset', 'stall', 'yield_hint', 'wr_barrier', 'rd_barrier',
+                'wait_mask', 'reuse_flags', 'predicate', 'predicate_negated', 'opcode', 'error']
+               + [column.format(slot) for slot in range(InstructionTable.OPERAND_SLOTS)
+                  for column in ('operand{}_type', 'operand{}_a', 'operand{}_b',
+                                 'operand{}_uniform', 'operand{}_reuse')])
+
+
+def csv_row(inst, function=None):
+    ctrl = inst.control
+    row = [function, inst.offset, ctrl.stall, int(ctrl.yield_hint), ctrl.wr_barrier,
+           ctrl.rd_barrier, ctrl.wait_mask, ctrl.reuse_flags]
+    operands = []
+    if isinstance(inst, UnknownInstruction):
+        row += ['', '', '', str(inst.error)]
+    else:
+        pred = inst.predicate
+        row += ['' if pred is None else pred.index, '' if pred is None else int(pred.negated),
+                inst.opcode, '']
+        operands = inst.operands
+    for slot in range(InstructionTable.OPERAND_SLOTS):
+        if slot < len(operands):
+            (kind, flags, a, b) = encode_operand(operands[slot])
+            row += [_OPERAND_KIND_NAMES[kind], a, b, int(bool(flags & _FLAG_UNIFORM)),
+                    int(bool(flags & _FLAG_REUSE))]
+        else:
+            row += ['', '', '', '', '']
+    return row
+
+
+def csv_header():
+    out = io.StringIO()
+    csv.writer(out).writerow(CSV_COLUMNS)
+    return out.getvalue()
+
+
+def iter_csv(instructions, function=None):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for inst in instructions:
+        writer.writerow(csv_row(inst, function))
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+# Columnar files hold one InstructionTable. Every column, including the error ids of unknown
+# instructions, is stored as a raw, 8-byte aligned native array, so loading only parses the small
+# JSON header and maps the rest of the file.
+
+COLUMNAR_MAGIC = b'GPUUARCH'
+COLUMNAR_VERSION = 2
+
+_columnar_header = struct.Struct('<8sII')
+
+
+def save_columnar(f, table, functions=()):
+    columns = []
+    offset = 0
+    for (name, typecode) in InstructionTable.COLUMNS:
+        nbytes = len(table.columns[name]) * array.array(typecode).itemsize
+        columns.append([name, typecode, offset, nbytes])
+        offset += (nbytes + 7) & ~7
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'rows': len(table),
+        'opcode_names': table.opcode_names,
+        'error_messages': table.error_messages,
+        'functions': [list(func) for func in functions],
+        'columns': columns,
+    }).encode()
+    header += b' ' * (-(_columnar_header.size + len(header)) % 8)
+    f.write(_columnar_header.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(header)))
+    f.write(header)
+    for (name, _, _, nbytes) in columns:
+        f.write(memoryview(table.columns[name]).cast('B'))
+        f.write(b'\0' * (-nbytes % 8))
+
+
+def _column(view, typecode, copy):
+    if not copy:
+        return view.cast(typecode)
+    column = array.array(typecode)
+    column.frombytes(view)
+    return column
+
+
+def _parse_columnar(view, source, copy=False):
+    (magic, version, header_size) = _columnar_header.unpack_from(view)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise Exception('Not a columnar instruction file: {}'.format(source))
+    start = _columnar_header.size + header_size
+    header = json.loads(bytes(view[_columnar_header.size:start]))
+    if header['byteorder'] != sys.byteorder:
+        raise Exception('Columnar file byte order mismatch: {}'.format(header['byteorder']))
+
+    columns = {name: _column(view[start + offset:start + offset + nbytes], typecode, copy)
+               for (name, typecode, offset, nbytes) in header['columns']}
+    # functions are (name, symbol, first row, row count)
+    return (InstructionTable(columns, header['opcode_names'],
+                             header['error_messages']),
+            [tuple(func) for func in header['functions']])
+
+
+def dumps_columnar(table, functions=()):
+    out = io.BytesIO()
+    save_columnar(out, table, functions)
+    return out.getvalue()
+
+
+def loads_columnar(data):
+    return _parse_columnar(memoryview(data), '<buffer>', copy=True)
+
+
+class ColumnarFile:
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        (self.table, self.functions) = _parse_columnar(self._view, filename)
+
+    # Functions are copied out of the mapping, so they stay usable after close().
+    def function(self, idx):
+        (_, _, start, count) = self.functions[idx]
+        return self.table[start:start + count]
+
+    def close(self):
+        if self._mmap is None:
+            return
+        for column in self.table.columns.values():
+            column.release()
+        self._view.release()
+        self._mmap.close()
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_columnar(filename):
+    return ColumnarFile(filename)
+
+
+class ColumnarWriter:
+    def __init__(self):
+        self.table = InstructionTable()
+        self.functions = []
+
+    def add(self, name, symbol, instructions):
+        start = len(self.table)
+        if isinstance(instructions, InstructionTable):
+            self.table.extend(instructions)
+        else:
+            for inst in instructions:
+                self.table.append(inst)
+        self.functions.append((name, symbol, start, len(self.table) - start))
+
+    def save(self, f):
+        save_columnar(f, self.table, self.functions)
@@ -0,0 +1,171 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import mmap
+import struct
+
+from gpu_uarch.nv.cubin import CuBin
+
+# The fatbinary layout is not documented. The header layouts below follow the structures used by
+# the CUDA runtime and the publicly reverse-engineered entry header.
+
+FATBIN_MAGIC = 0xba55ed50
+ELF_MAGIC = b'\x7fELF'
+
+SECTIONS = ('.nv_fatbin', '__nv_relfatbin')
+
+KIND_PTX = 1
+KIND_ELF = 2
+
+FLAG_64BIT = 0x1
+FLAG_DEBUG = 0x2
+FLAG_COMPRESSED = 0x2000
+
+_header = struct.Struct('<IHHQ')
+# kind, unknown, header size, padded payload size, compressed size, unknown, minor, major, arch,
+# name offset, name length, flags, unknown, uncompressed size
+_entry_header = struct.Struct('<HHIQIIHHIIIQQQ')
+
+
+def _lz4_decompress(src, size):
+    try:
+        import lz4.block
+        return lz4.block.decompress(bytes(src), uncompressed_size=size)
+    except ImportError:
+        pass
+
+    out = bytearray()
+    pos = 0
+    end = len(src)
+    while pos < end:
+        token = src[pos]
+        pos += 1
+        literals = token >> 4
+        if literals == 0xf:
+            while True:
+                b = src[pos]
+                pos += 1
+                literals += b
+                if b != 0xff:
+                    break
+        out += src[pos:pos + literals]
+        pos += literals
+        if pos >= end or len(out) >= size:
+            break
+        distance = src[pos] | src[pos + 1] << 8
+        pos += 2
+        length = (token & 0xf) + 4
+        if length == 0xf + 4:
+            while True:
+                b = src[pos]
+                pos += 1
+                length += b
+                if b != 0xff:
+                    break
+        if distance == 0 or distance > len(out):
+            raise Exception('Invalid LZ4 match offset: {}'.format(distance))
+        start = len(out) - distance
+        if length <= distance:
+            out += out[start:start + length]
+        else:
+            for i in range(length):
+                out.append(out[start + i])
+    if len(out) != size:
+        raise Exception('Decompressed size mismatch: expected {}, got {}'.format(size, len(out)))
+    return bytes(out)
+
+
+class Entry:
+    def __init__(self, view, offset):
+        (self.kind, _, self.header_size, self.padded_size, self.compressed_size, _,
+         self.minor, self.major, self.arch, _, _, self.flags, _,
+         self.uncompressed_size) = _entry_header.unpack_from(view, offset)
+        self._view = view
+        self._offset = offset
+
+    @property
+    def compressed(self):
+        return self.flags & FLAG_COMPRESSED != 0
+
+    @property
+    def size(self):
+        return self.header_size + self.padded_size
+
+    def data(self):
+        start = self._offset + self.header_size
+        if self.compressed:
+            return _lz4_decompress(self._view[start:start + self.compressed_size],
+                                   self.uncompressed_size)
+        return bytes(self._view[start:start + self.padded_size])
+
+
+class FatBin:
+    def __init__(self, view, offset=0):
+        view = memoryview(view)
+        (magic, self.version, header_size, fat_size) = _header.unpack_from(view, offset)
+        if magic != FATBIN_MAGIC:
+            raise Exception('Invalid fatbin magic: {:#x}'.format(magic))
+        self.size = header_size + fat_size
+        self.entries = []
+        pos = offset + header_size
+        end = offset + self.size
+        while pos + _entry_header.size <= end:
+            entry = Entry(view, pos)
+            self.entries.append(entry)
+            pos += entry.size
+
+    def cubins(self, arch=75):
+        for entry in self.entries:
+            if entry.kind == KIND_ELF and entry.arch == arch:
+                yield CuBin(entry.data())
+
+
+def _iter_blobs(view):
+    pos = 0
+    while pos + _header.size <= len(view):
+        if _header.unpack_from(view, pos)[0] != FATBIN_MAGIC:
+            pos += 8
+            continue
+        fatbin = FatBin(view, pos)
+        yield fatbin
+        pos += (fatbin.size + 7) & ~7
+
+
+def iter_fatbins(filename):
+    # The mapping stays alive for as long as any entry refers to it.
+    with open(filename, 'rb') as f:
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if view[:4] == ELF_MAGIC:
+            from elftools.elf.elffile import ELFFile
+
+            sections = [(section['sh_offset'], section['sh_size'])
+                        for section in ELFFile(f).iter_sections()
+                        if section.name in SECTIONS and section['sh_type'] != 'SHT_NOBITS']
+        else:
+            sections = [(0, len(view))]
+    for (start, size) in sections:
+        yield from _iter_blobs(view[start:start + size])
+
+
+def iter_cubins(filename, arch=75):
+    for fatbin in iter_fatbins(filename):
+        yield from fatbin.cubins(arch)
@@ -0,0 +1,160 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import functools
+import hashlib
+import random
+import struct
+import zlib
+
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import encode_operand
+
+# Structural fingerprints of functions. The exact hash covers the whole normalized instruction
+# stream, so functions with equal hashes are duplicates. The MinHash signature estimates the Jaccard
+# similarity of the opcode and operand-shape n-grams of two functions. LSH buckets signatures by
+# bands, so clustering only compares functions that share a bucket instead of all pairs.
+
+NGRAM = 3
+PERMUTATIONS = 64
+BANDS = 16
+
+# (a * x + b) % _PRIME over 32-bit shingles stays within 64 bits.
+_PRIME = (1 << 32) + 15
+_rng = random.Random(0x5eed)
+_PERMUTATIONS = [(_rng.randrange(1, 1 << 31), _rng.randrange(1 << 32)) for _ in range(PERMUTATIONS)]
+_EMPTY = (_PRIME,) * PERMUTATIONS
+
+_OPERAND_SHAPES = 'xRISCCMM'
+
+
+@functools.lru_cache(maxsize=4096)
+def _word(lo, hi):
+    (ctrl, pred, name, operands) = turing.decode_word(lo, hi)
+    if name is None:
+        return '?{:x}:{:x}'.format(lo, hi), zlib.crc32(b'?'), zlib.crc32(b'?'), False
+    pred = None if pred is None else (pred.index, pred.negated)
+    operands = [encode_operand(op) for op in operands]
+    shape = '{} {}'.format(name, ''.join(_OPERAND_SHAPES[op[0]] for op in operands))
+    return (repr((name, pred, ctrl.encode(), operands)), zlib.crc32(shape.encode()),
+            zlib.crc32(name.encode()), name == 'NOP')
+
+
+def _ngrams(values, seed):
+    if not values:
+        return set()
+    # Hashes of tuples of ints do not depend on PYTHONHASHSEED.
+    return {hash((seed,) + window) & 0xffffffff
+            for window in zip(*(values[index:] for index in range(min(NGRAM, len(values)))))}
+
+
+def _signature(shingles):
+    if not shingles:
+        return _EMPTY
+    try:
+        import numpy as np
+    except ImportError:
+        return tuple(min((a * x + b) % _PRIME for x in shingles) for (a, b) in _PERMUTATIONS)
+    x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    return tuple(int(((np.uint64(a) * x + np.uint64(b)) % np.uint64(_PRIME)).min())
+                 for (a, b) in _PERMUTATIONS)
+
+
+class Fingerprint:
+    def __init__(self, exact, signature, instructions):
+        self.exact = exact
+        self.signature = signature
+        self.instructions = instructions
+
+    def similarity(self, other):
+        return sum(a == b for (a, b) in zip(self.signature, other.signature)) / PERMUTATIONS
+
+    def bands(self):
+        rows = PERMUTATIONS // BANDS
+        return [(band,) + self.signature[band * rows:(band + 1) * rows] for band in range(BANDS)]
+
+
+def fingerprint(data):
+    words = [_word(lo, hi) for (lo, hi) in struct.iter_unpack('<QQ', data)]
+    # Sections are padded with NOPs, which are not part of the function.
+    while words and words[-1][3]:
+        words.pop()
+    exact = hashlib.blake2b('\n'.join(word[0] for word in words).encode(), digest_size=16)
+    shingles = (_ngrams([word[1] for word in words], 1)
+                | _ngrams([word[2] for word in words], 2))
+    return Fingerprint(exact.hexdigest(), _signature(shingles), len(words))
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            (self.parent[x], x) = (root, self.parent[x])
+        return root
+
+    def union(self, x, y):
+        (x, y) = (self.find(x), self.find(y))
+        if x != y:
+            self.parent[max(x, y)] = min(x, y)
+
+
+def _groups(uf, size):
+    groups = {}
+    for index in range(size):
+        groups.setdefault(uf.find(index), []).append(index)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def duplicates(fingerprints):
+    uf = _UnionFind(len(fingerprints))
+    first = {}
+    for (index, fp) in enumerate(fingerprints):
+        uf.union(first.setdefault(fp.exact, index), index)
+    return _groups(uf, len(fingerprints))
+
+
+def cluster(fingerprints, threshold=0.8):
+    uf = _UnionFind(len(fingerprints))
+    first = {}
+    buckets = {}
+    for (index, fp) in enumerate(fingerprints):
+        uf.union(first.setdefault(fp.exact, index), index)
+        if first[fp.exact] != index:
+            continue
+        for band in fp.bands():
+            buckets.setdefault(band, []).append(index)
+    for bucket in buckets.values():
+        # Each function joins the first cluster in the bucket it is similar enough to.
+        representatives = []
+        for index in bucket:
+            for other in representatives:
+                if uf.find(index) == uf.find(other):
+                    break
+                if fingerprints[index].similarity(fingerprints[other]) >= threshold:
+                    uf.union(index, other)
+                    break
+            else:
+                representatives.append(index)
+    return _groups(uf, len(fingerprints))
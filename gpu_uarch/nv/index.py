@@ -0,0 +1,332 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import os
+import sqlite3
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import (Register, Immediate, SpecialRegister, ConstantMemory, Memory,
+                          UnknownInstruction, OPERAND_REGISTER, OPERAND_IMMEDIATE,
+                          OPERAND_SPECIAL_REGISTER, OPERAND_CONSTANT, OPERAND_CONSTANT_REGISTER,
+                          OPERAND_MEMORY, OPERAND_MEMORY_IMMEDIATE)
+from gpu_uarch.nv.cache import cache_dir
+
+# SQLite index of decoded instructions. Function code is stored once per distinct .text section
+# (keyed by a hash of its bytes), so identical kernels in different files share the rows. Files
+# are reindexed only when their mtime or size changes.
+
+SCHEMA_VERSION = 1
+
+# Length of the opcode n-grams used for sequence search. Opcode ids are packed into a single
+# integer key, NGRAM_BITS per opcode.
+NGRAM = 4
+NGRAM_BITS = 15
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY, hash BLOB UNIQUE NOT NULL, instructions INTEGER);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY, file INTEGER NOT NULL, symbol TEXT, name TEXT, section INTEGER);
+CREATE INDEX IF NOT EXISTS functions_file ON functions (file);
+CREATE INDEX IF NOT EXISTS functions_name ON functions (name);
+CREATE INDEX IF NOT EXISTS functions_section ON functions (section);
+CREATE TABLE IF NOT EXISTS opcodes (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS instructions (
+    section INTEGER, row INTEGER, opcode INTEGER, predicate INTEGER, stall INTEGER,
+    yield_hint INTEGER, wr_barrier INTEGER, rd_barrier INTEGER, wait_mask INTEGER,
+    reuse_flags INTEGER, error TEXT, PRIMARY KEY (section, row)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS instructions_opcode ON instructions (opcode);
+CREATE TABLE IF NOT EXISTS operands (
+    section INTEGER, row INTEGER, position INTEGER, kind INTEGER, uniform INTEGER,
+    reg INTEGER, bank INTEGER, address INTEGER, value INTEGER,
+    PRIMARY KEY (section, row, position)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS operands_reg ON operands (reg, uniform) WHERE reg IS NOT NULL;
+CREATE INDEX IF NOT EXISTS operands_constant ON operands (bank, address) WHERE bank IS NOT NULL;
+CREATE TABLE IF NOT EXISTS ngrams (
+    key INTEGER, section INTEGER, row INTEGER, PRIMARY KEY (key, section, row)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ngrams_section ON ngrams (section, row);
+'''
+
+
+def default_path():
+    return os.path.join(cache_dir(), 'index.sqlite')
+
+
+def section_hash(data):
+    h = hashlib.sha256('{}\0'.format(turing.DECODER_VERSION).encode())
+    h.update(data)
+    return h.digest()
+
+
+def operand_row(op):
+    # kind, uniform, reg, bank, address, value
+    if isinstance(op, Register):
+        return OPERAND_REGISTER, op.uniform, op.index, None, None, None
+    elif isinstance(op, Immediate):
+        return OPERAND_IMMEDIATE, None, None, None, None, op.value
+    elif isinstance(op, SpecialRegister):
+        return OPERAND_SPECIAL_REGISTER, None, None, None, None, op.index
+    elif isinstance(op, ConstantMemory):
+        if isinstance(op.address, Register):
+            return (OPERAND_CONSTANT_REGISTER, op.address.uniform, op.address.index, op.bank.value,
+                    None, None)
+        return OPERAND_CONSTANT, None, None, op.bank.value, op.address.value, None
+    elif isinstance(op, Memory):
+        if isinstance(op.address, Register):
+            return (OPERAND_MEMORY, op.address.uniform, op.address.index, None, op.offset.value,
+                    None)
+        return OPERAND_MEMORY_IMMEDIATE, None, None, None, op.offset.value, op.address.value
+    raise Exception('Unsupported operand: {!r}'.format(op))
+
+
+def ngram_key(opcode_ids):
+    key = 0
+    for opcode in opcode_ids:
+        key = key << NGRAM_BITS | opcode
+    return key
+
+
+class Match:
+    def __init__(self, path, function, offset):
+        self.path = path
+        self.function = function
+        self.offset = offset
+
+    def __eq__(self, other):
+        return (isinstance(other, Match)
+                and (self.path, self.function, self.offset)
+                == (other.path, other.function, other.offset))
+
+    def __hash__(self):
+        return hash((self.path, self.function, self.offset))
+
+    def __repr__(self):
+        return 'Match({}, {}, {:#x})'.format(self.path, self.function, self.offset)
+
+
+class Index:
+    def __init__(self, filename=None):
+        self.filename = default_path() if filename is None else filename
+        if self.filename != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        self.db = sqlite3.connect(self.filename)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.executescript(_SCHEMA)
+        self._check_version()
+        self._opcodes = dict(self.db.execute('SELECT name, id FROM opcodes'))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _check_version(self):
+        versions = dict(self.db.execute('SELECT key, value FROM meta'))
+        expected = {'schema': SCHEMA_VERSION, 'decoder': turing.DECODER_VERSION}
+        if versions == expected:
+            return
+        # Rows written by a different decoder are stale: start over.
+        with self.db:
+            for table in ('files', 'sections', 'functions', 'instructions', 'operands', 'ngrams'):
+                self.db.execute('DELETE FROM {}'.format(table))
+            self.db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', expected.items())
+
+    def _opcode_id(self, name):
+        try:
+            return self._opcodes[name]
+        except KeyError:
+            pass
+        opcode = self.db.execute('INSERT INTO opcodes (name) VALUES (?)', (name,)).lastrowid
+        assert opcode < 1 << NGRAM_BITS
+        self._opcodes[name] = opcode
+        return opcode
+
+    def _add_section(self, data):
+        key = section_hash(data)
+        row = self.db.execute('SELECT id FROM sections WHERE hash = ?', (key,)).fetchone()
+        if row is not None:
+            return row[0]
+        instructions = turing.disasm(data)
+        section = self.db.execute('INSERT INTO sections (hash, instructions) VALUES (?, ?)',
+                                  (key, len(instructions))).lastrowid
+        rows = []
+        operands = []
+        opcodes = []
+        for (index, inst) in enumerate(instructions):
+            ctrl = inst.control
+            if isinstance(inst, UnknownInstruction):
+                (opcode, predicate, error) = (None, None, str(inst.error))
+            else:
+                opcode = self._opcode_id(inst.opcode)
+                pred = inst.predicate
+                predicate = None if pred is None else pred.index | (0x8 if pred.negated else 0)
+                error = None
+                operands.extend((section, index, position) + operand_row(op)
+                                for (position, op) in enumerate(inst.operands))
+            opcodes.append(opcode)
+            rows.append((section, index, opcode, predicate, ctrl.stall, ctrl.yield_hint,
+                         ctrl.wr_barrier, ctrl.rd_barrier, ctrl.wait_mask, ctrl.reuse_flags, error))
+        self.db.executemany('INSERT INTO instructions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            rows)
+        self.db.executemany('INSERT INTO operands VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', operands)
+        self.db.executemany('INSERT OR IGNORE INTO ngrams VALUES (?, ?, ?)', (
+            (ngram_key(opcodes[index:index + NGRAM]), section, index)
+            for index in range(len(opcodes) - NGRAM + 1)
+            if None not in opcodes[index:index + NGRAM]))
+        return section
+
+    def update_file(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.db.execute('SELECT id, mtime, size FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[1:] == (st.st_mtime_ns, st.st_size):
+            return False
+        try:
+            self._update_file(path, st, row)
+        except BaseException:
+            # opcode ids inserted by the rolled back transaction are gone
+            self._opcodes = dict(self.db.execute('SELECT name, id FROM opcodes'))
+            raise
+        return True
+
+    def _update_file(self, path, st, row):
+        with self.db:
+            if row is None:
+                file = self.db.execute('INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)',
+                                       (path, st.st_mtime_ns, st.st_size)).lastrowid
+            else:
+                file = row[0]
+                self.db.execute('UPDATE files SET mtime = ?, size = ? WHERE id = ?',
+                                (st.st_mtime_ns, st.st_size, file))
+                self.db.execute('DELETE FROM functions WHERE file = ?', (file,))
+            with gpu_uarch.nv.cubin.CuBin(path, lazy=True) as cubin:
+                self.db.executemany(
+                    'INSERT INTO functions (file, symbol, name, section) VALUES (?, ?, ?, ?)',
+                    [(file, func.symbol, func.name, self._add_section(func.data))
+                     for func in cubin.functions])
+
+    def update(self, paths):
+        updated = 0
+        for path in paths:
+            updated += self.update_file(path)
+        if updated:
+            self.prune()
+        return updated
+
+    def remove(self, path):
+        with self.db:
+            self.db.execute('DELETE FROM functions WHERE file IN (SELECT id FROM files WHERE path = ?)',
+                            (os.path.abspath(path),))
+            self.db.execute('DELETE FROM files WHERE path = ?', (os.path.abspath(path),))
+
+    def prune(self):
+        for (path,) in self.db.execute('SELECT path FROM files').fetchall():
+            if not os.path.exists(path):
+                self.remove(path)
+        with self.db:
+            orphans = [(section,) for (section,) in self.db.execute(
+                'SELECT id FROM sections WHERE id NOT IN (SELECT section FROM functions)')]
+            for table in ('instructions', 'operands', 'ngrams'):
+                self.db.executemany('DELETE FROM {} WHERE section = ?'.format(table), orphans)
+            self.db.executemany('DELETE FROM sections WHERE id = ?', orphans)
+
+    def _matches(self, query, params):
+        # query selects (section, row) pairs named s and r
+        return [Match(path, name, row * 16) for (path, name, row) in self.db.execute(
+            'SELECT files.path, functions.name, m.r FROM ({}) AS m'
+            ' JOIN functions ON functions.section = m.s'
+            ' JOIN files ON files.id = functions.file'
+            ' ORDER BY files.path, functions.id, m.r'.format(query), params)]
+
+    def find(self, opcode=None, register=None, bank=None, min_address=None, max_address=None):
+        tables = ['instructions AS i']
+        conditions = []
+        params = []
+        if opcode is not None:
+            if opcode not in self._opcodes:
+                return []
+            conditions.append('i.opcode = ?')
+            params.append(self._opcodes[opcode])
+        if register is not None:
+            tables.append('JOIN operands AS r ON r.section = i.section AND r.row = i.row')
+            if isinstance(register, SpecialRegister):
+                conditions.append('r.kind = ? AND r.value = ?')
+                params += [OPERAND_SPECIAL_REGISTER, register.index]
+            else:
+                conditions.append('r.reg = ? AND r.uniform = ?')
+                params += [register.index, register.uniform]
+        if bank is not None or min_address is not None or max_address is not None:
+            tables.append('JOIN operands AS c ON c.section = i.section AND c.row = i.row')
+            conditions.append('c.bank IS NOT NULL')
+            if bank is not None:
+                conditions.append('c.bank = ?')
+                params.append(bank)
+            if min_address is not None:
+                conditions.append('c.address >= ?')
+                params.append(min_address)
+            if max_address is not None:
+                conditions.append('c.address < ?')
+                params.append(max_address)
+        query = 'SELECT DISTINCT i.section AS s, i.row AS r FROM {}'.format(' '.join(tables))
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return self._matches(query, params)
+
+    def find_sequence(self, opcodes):
+        try:
+            ids = [self._opcodes[name] for name in opcodes]
+        except KeyError:
+            return []
+        assert ids
+        if len(ids) < NGRAM:
+            tables = ['instructions AS i0']
+            conditions = ['i0.opcode = ?']
+            for k in range(1, len(ids)):
+                tables.append('JOIN instructions AS i{0} ON i{0}.section = i0.section'
+                              ' AND i{0}.row = i0.row + {0}'.format(k))
+                conditions.append('i{}.opcode = ?'.format(k))
+            query = 'SELECT i0.section AS s, i0.row AS r FROM {} WHERE {}'.format(
+                ' '.join(tables), ' AND '.join(conditions))
+            return self._matches(query, ids)
+        # Windows at every NGRAM opcodes, plus one ending at the last opcode, cover the sequence.
+        starts = sorted(set(range(0, len(ids) - NGRAM + 1, NGRAM)) | {len(ids) - NGRAM})
+        tables = ['ngrams AS n0']
+        conditions = ['n0.key = ?']
+        for (k, start) in enumerate(starts[1:], 1):
+            tables.append('JOIN ngrams AS n{0} ON n{0}.section = n0.section'
+                          ' AND n{0}.row = n0.row + {1}'.format(k, start))
+            conditions.append('n{}.key = ?'.format(k))
+        query = 'SELECT n0.section AS s, n0.row AS r FROM {} WHERE {}'.format(
+            ' '.join(tables), ' AND '.join(conditions))
+        return self._matches(query, [ngram_key(ids[start:start + NGRAM]) for start in starts])
+
+    def counts(self):
+        return {table: self.db.execute('SELECT COUNT(*) FROM {}'.format(table)).fetchone()[0]
+                for table in ('files', 'functions', 'sections', 'instructions')}
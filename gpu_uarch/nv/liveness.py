@@ -0,0 +1,209 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from gpu_uarch.nv import Register, UnknownInstruction
+from gpu_uarch.nv.cfg import ControlFlowGraph, instruction_list, is_unconditional
+from gpu_uarch.nv.dataflow import defs, uses, sources, register_slot, UNIFORM_BASE
+
+_REGULAR_MASK = (1 << UNIFORM_BASE) - 1
+
+
+def _bitset(slots):
+    bits = 0
+    for slot in slots:
+        bits |= 1 << slot
+    return bits
+
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+
+def _slots_of(bits):
+    slot = 0
+    while bits:
+        if bits & 1:
+            yield slot
+        bits >>= 1
+        slot += 1
+
+
+def pressure(bits):
+    return _popcount(bits & _REGULAR_MASK), _popcount(bits >> UNIFORM_BASE)
+
+
+class LiveRange:
+    def __init__(self, slot, start, end):
+        self.slot = slot
+        # first and last row (inclusive) in layout order
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def __eq__(self, other):
+        return (isinstance(other, LiveRange)
+                and (self.slot, self.start, self.end) == (other.slot, other.start, other.end))
+
+    def __hash__(self):
+        return hash((self.slot, self.start, self.end))
+
+    def __repr__(self):
+        return 'LiveRange({}, {}, {})'.format(self.slot, self.start, self.end)
+
+
+class ReuseEvent:
+    def __init__(self, row, slot, register):
+        self.row = row
+        # source operand position the reuse flag refers to
+        self.slot = slot
+        self.register = register
+
+    def __repr__(self):
+        return 'ReuseEvent({}, {}, {!r})'.format(self.row, self.slot, self.register)
+
+
+class Liveness:
+    def __init__(self, cfg):
+        if not isinstance(cfg, ControlFlowGraph):
+            cfg = ControlFlowGraph(cfg)
+        self.cfg = cfg
+        instructions = cfg.instructions
+        self._defs = [_bitset(defs(inst)) for inst in instructions]
+        self._uses = [_bitset(uses(inst)) for inst in instructions]
+        # A predicated write may not happen, so it does not end the previous live range.
+        self._kills = [bits if is_unconditional(inst) else 0
+                       for (inst, bits) in zip(instructions, self._defs)]
+
+        self.live_in = [0] * len(cfg.blocks)
+        self.live_out = [0] * len(cfg.blocks)
+        self._solve()
+
+        self.live_before = [0] * len(instructions)
+        self.live_after = [0] * len(instructions)
+        for block in cfg.blocks:
+            live = self.live_out[block.index]
+            for row in range(block.end - 1, block.start - 1, -1):
+                self.live_after[row] = live
+                live = (live & ~self._kills[row]) | self._uses[row]
+                self.live_before[row] = live
+
+        # Registers occupied while an instruction executes: its inputs, its outputs and
+        # everything that stays live across it.
+        self.occupied = [before | after | d for (before, after, d)
+                         in zip(self.live_before, self.live_after, self._defs)]
+
+    def _transfer(self, block, live):
+        for row in range(block.end - 1, block.start - 1, -1):
+            live = (live & ~self._kills[row]) | self._uses[row]
+        return live
+
+    def _solve(self):
+        blocks = self.cfg.blocks
+        # Backward problem: visiting in postorder converges in few passes on reducible graphs.
+        order = list(reversed(self.cfg.reachable()))
+        reachable = {block.index for block in order}
+        order += [block for block in blocks if block.index not in reachable]
+        changed = True
+        while changed:
+            changed = False
+            for block in order:
+                live_out = 0
+                for (succ, _) in block.successors:
+                    live_out |= self.live_in[succ.index]
+                self.live_out[block.index] = live_out
+                live_in = self._transfer(block, live_out)
+                if live_in != self.live_in[block.index]:
+                    self.live_in[block.index] = live_in
+                    changed = True
+
+    def pressure_at(self, row):
+        return pressure(self.occupied[row])
+
+    def _peak(self, rows):
+        regular = uniform = 0
+        for row in rows:
+            (r, u) = pressure(self.occupied[row])
+            regular = max(regular, r)
+            uniform = max(uniform, u)
+        return regular, uniform
+
+    @property
+    def peak(self):
+        return self._peak(range(len(self.occupied)))
+
+    def peak_row(self):
+        if not self.occupied:
+            return None
+        return max(range(len(self.occupied)), key=lambda row: pressure(self.occupied[row])[0])
+
+    def loop_peaks(self):
+        peaks = []
+        for loop in self.cfg.loops:
+            rows = [row for block in sorted(loop.blocks)
+                    for row in range(self.cfg.blocks[block].start, self.cfg.blocks[block].end)]
+            peaks.append((loop, self._peak(rows)))
+        return peaks
+
+    def live_ranges(self):
+        ranges = {}
+        open_ranges = {}
+        for (row, bits) in enumerate(self.occupied):
+            for slot in list(open_ranges):
+                if not bits >> slot & 1:
+                    ranges.setdefault(slot, []).append(LiveRange(slot, open_ranges.pop(slot),
+                                                                 row - 1))
+            for slot in _slots_of(bits):
+                if slot not in open_ranges:
+                    open_ranges[slot] = row
+        for (slot, start) in open_ranges.items():
+            ranges.setdefault(slot, []).append(LiveRange(slot, start, len(self.occupied) - 1))
+        return ranges
+
+
+def _source_registers(inst):
+    return [(slot, op) for (slot, op) in enumerate(sources(inst))
+            if isinstance(op, Register) and register_slot(op) is not None and not op.uniform]
+
+
+# Each reuse flag bit keeps one source operand slot of an instruction in the operand reuse cache
+# for the next instruction. A hit is a flagged operand read again from the same slot by the next
+# instruction; an opportunity is the same pattern without the flag.
+class ReuseAnalysis:
+    def __init__(self, instructions):
+        instructions = instruction_list(instructions)
+        self.hits = []
+        self.opportunities = []
+        self.wasted = []
+        for (row, (inst, next_inst)) in enumerate(zip(instructions, instructions[1:] + [None])):
+            if isinstance(inst, UnknownInstruction):
+                continue
+            flags = inst.control.reuse_flags
+            following = {}
+            if next_inst is not None and not isinstance(next_inst, UnknownInstruction):
+                following = dict(_source_registers(next_inst))
+            for (slot, register) in _source_registers(inst):
+                reused = following.get(slot) is not None and following[slot].index == register.index
+                if flags & (1 << slot):
+                    (self.hits if reused else self.wasted).append(ReuseEvent(row, slot, register))
+                elif reused:
+                    self.opportunities.append(ReuseEvent(row, slot, register))
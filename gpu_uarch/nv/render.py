@@ -0,0 +1,179 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import gpu_uarch.theme
+from gpu_uarch.nv import (Immediate, Register, SpecialRegister, ConstantMemory, Memory, Predicate,
+                          UnknownInstruction, InstructionView)
+
+# Bump whenever the rendered text changes so that cached output is not reused.
+RENDER_VERSION = 1
+
+
+def _escape(s):
+    return s.replace('{', '{{').replace('}', '}}')
+
+
+class Renderer:
+    CACHE_SIZE = 65536
+
+    def __init__(self, theme):
+        self.theme = theme
+        t = {name: _escape(value) for (name, value) in vars(theme).items()}
+
+        self._immediate = '{immediate}{{:#x}}{rs}'.format(**t)
+        self._register = '{register}{{}}R{{}}{rs}'.format(**t)
+        self._special_register = '{special_register}{{}}{rs}'.format(**t)
+        self._unknown_special_register = '{error}<unknown special register {{:#x}}>{rs}'.format(
+            **t)
+        self._constant = '{constant}c{symbol}[{{}}{symbol}][{{}}{symbol}]{rs}'.format(**t)
+        self._memory = '{symbol}[{{}}{symbol}]{rs}'.format(**t)
+        self._memory_offset = '{symbol}[{{}}{symbol}+{{}}{symbol}]{rs}'.format(**t)
+        self._predicate = '{predicate}{{}}P{{}}{rs}'.format(**t)
+        self._instruction = '{offset}{{:#010x}}{rs}  {{}}  {{}} {opcode}{{}}{rs} {{}}'.format(**t)
+        self._unknown = '{offset}{{:#010x}}{rs}  {{}}      {error}<unknown instruction: {{}}>{rs}'.format(
+            **t)
+        self._function = '{function}{{}}{rs}{symbol}:'.format(**t)
+        self._separator = '{symbol},{rs} '.format(**t)
+
+        active = theme.control_active
+        inactive = theme.control_inactive
+        self._control = '{{}}{symbol}:{{}}{symbol}:{{}}{symbol}:{{}}{symbol}:{control_active}{{:x}}{rs}'.format(
+            **t)
+        self._wait_mask = [inactive + '--'] + [active + '{:02x}'.format(m) for m in range(1, 64)]
+        self._barrier = [active + str(b) for b in range(7)] + [inactive + '-']
+        self._yield = [inactive + '-', active + 'Y']
+
+        self._operand_renderers = {
+            Immediate: self._render_immediate,
+            Register: self._render_register,
+            SpecialRegister: self._render_special_register,
+            ConstantMemory: self._render_constant,
+            Memory: self._render_memory,
+            Predicate: self.predicate,
+        }
+        self._cache = {}
+        self._instruction_predicates = {}
+
+    def _render_immediate(self, op):
+        return self._immediate.format(op.value)
+
+    def _render_register(self, op):
+        zero = 63 if op.uniform else 255
+        return self._register.format('U' if op.uniform else '',
+                                     'Z' if op.index == zero else op.index)
+
+    def _render_special_register(self, op):
+        try:
+            return self._special_register.format(SpecialRegister.NAMES[op.index])
+        except KeyError:
+            return self._unknown_special_register.format(op.index)
+
+    def _render_constant(self, op):
+        return self._constant.format(self.operand(op.bank), self.operand(op.address))
+
+    def _render_memory(self, op):
+        if op.offset.value == 0:
+            return self._memory.format(self.operand(op.address))
+        return self._memory_offset.format(self.operand(op.address), self.operand(op.offset))
+
+    def _cached(self, key, render):
+        cache = self._cache
+        try:
+            return cache[key]
+        except KeyError:
+            s = render(key)
+            if len(cache) < self.CACHE_SIZE:
+                cache[key] = s
+            return s
+
+    def operand(self, op):
+        return self._cached(op, self._operand_renderers[type(op)])
+
+    def predicate(self, pred):
+        return self._predicate.format('!' if pred.negated else '', pred.index)
+
+    def _render_control(self, ctrl):
+        return self._control.format(self._wait_mask[ctrl.wait_mask], self._barrier[ctrl.rd_barrier],
+                                    self._barrier[ctrl.wr_barrier], self._yield[ctrl.yield_hint],
+                                    ctrl.stall)
+
+    def control(self, ctrl):
+        return self._cached(ctrl, self._render_control)
+
+    def _instruction_predicate(self, pred):
+        try:
+            return self._instruction_predicates[pred]
+        except KeyError:
+            s = ('' if pred.negated else ' ') + self.predicate(pred)
+            self._instruction_predicates[pred] = s
+            return s
+
+    def instruction(self, inst):
+        if isinstance(inst, InstructionView):
+            inst = inst.instruction()
+        if isinstance(inst, UnknownInstruction):
+            return self._unknown.format(inst.offset, self.control(inst.control), inst.error)
+        pred = inst.predicate
+        return self._instruction.format(
+            inst.offset, self.control(inst.control),
+            '   ' if pred is None else self._instruction_predicate(pred),
+            inst.opcode, self._separator.join([self.operand(op) for op in inst.operands]))
+
+    def function(self, name):
+        return self._function.format(name)
+
+    def lines(self, instructions):
+        instruction = self.instruction
+        for inst in instructions:
+            yield instruction(inst) + '\n'
+
+    def render(self, instructions):
+        return ''.join(self.lines(instructions))
+
+    def write(self, out, instructions, chunk_size=1024, flush=False):
+        instruction = self.instruction
+        chunk = []
+        count = 0
+        for inst in instructions:
+            chunk.append(instruction(inst))
+            count += 1
+            if len(chunk) == chunk_size:
+                chunk.append('')
+                out.write('\n'.join(chunk))
+                if flush:
+                    out.flush()
+                chunk = []
+        if chunk:
+            chunk.append('')
+            out.write('\n'.join(chunk))
+        return count
+
+
+_renderer = None
+
+
+def get_renderer():
+    global _renderer
+    theme = gpu_uarch.theme.get_theme()
+    if _renderer is None or _renderer.theme is not theme:
+        _renderer = Renderer(theme)
+    return _renderer
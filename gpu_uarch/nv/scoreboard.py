@@ -0,0 +1,177 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from gpu_uarch.nv.cfg import instruction_list
+from gpu_uarch.nv.dataflow import defs, uses, slot_name
+
+BARRIERS = 6
+NO_BARRIER = 7
+
+# Dependency kinds
+DEP_BARRIER = 'barrier'
+DEP_RAW = 'raw'
+DEP_WAR = 'war'
+DEP_WAW = 'waw'
+
+# Issue kinds
+ISSUE_UNWAITED_BARRIER = 'unwaited_barrier'
+ISSUE_UNNEEDED_WAIT = 'unneeded_wait'
+ISSUE_EARLY_WAIT = 'early_wait'
+ISSUE_MISSING_WAIT = 'missing_wait'
+
+
+class Dependency:
+    def __init__(self, src, dst, kind, detail):
+        self.src = src
+        self.dst = dst
+        self.kind = kind
+        # barrier index for DEP_BARRIER, register slot otherwise
+        self.detail = detail
+
+    def __eq__(self, other):
+        return (isinstance(other, Dependency) and (self.src, self.dst, self.kind, self.detail)
+                == (other.src, other.dst, other.kind, other.detail))
+
+    def __hash__(self):
+        return hash((self.src, self.dst, self.kind, self.detail))
+
+    def __repr__(self):
+        detail = self.detail if self.kind == DEP_BARRIER else slot_name(self.detail)
+        return 'Dependency({} -> {}, {}, {})'.format(self.src, self.dst, self.kind, detail)
+
+
+class Issue:
+    def __init__(self, kind, row, barrier, related=None):
+        self.kind = kind
+        self.row = row
+        self.barrier = barrier
+        # ISSUE_UNWAITED_BARRIER: None
+        # ISSUE_UNNEEDED_WAIT: None
+        # ISSUE_EARLY_WAIT: first row that needs the barrier, or None if nothing does
+        # ISSUE_MISSING_WAIT: row of the instruction that set the barrier
+        self.related = related
+
+    def __repr__(self):
+        return 'Issue({}, row={}, barrier={}, related={})'.format(self.kind, self.row,
+                                                                  self.barrier, self.related)
+
+
+class _Producer:
+    def __init__(self, row, barrier, written, read):
+        self.row = row
+        self.barrier = barrier
+        # registers the producer writes (write barrier) or reads (read barrier) asynchronously
+        self.written = written
+        self.read = read
+
+    def conflicts(self, inst_defs, inst_uses):
+        return bool(self.written & (inst_uses | inst_defs) or self.read & inst_defs)
+
+
+# Instructions are processed in layout order, which is the order in which the hardware
+# scoreboard sees them along fallthrough paths.
+class ScoreboardAnalysis:
+    def __init__(self, instructions):
+        self.instructions = instruction_list(instructions)
+        self.dependencies = []
+        self.issues = []
+        # producer row -> rows that waited on its barrier
+        self.waiters = {}
+        self._analyze()
+
+    def _analyze(self):
+        pending = [[] for _ in range(BARRIERS)]
+        # early waits whose producers have not been needed yet: (waiter row, barrier, producers)
+        deferred = []
+        last_def = {}
+        last_uses = {}
+
+        for (row, inst) in enumerate(self.instructions):
+            ctrl = inst.control
+            inst_defs = set(defs(inst))
+            inst_uses = set(uses(inst))
+
+            still_deferred = []
+            for (waiter, barrier, producers) in deferred:
+                if any(producer.conflicts(inst_defs, inst_uses) for producer in producers):
+                    self.issues.append(Issue(ISSUE_EARLY_WAIT, waiter, barrier, row))
+                else:
+                    still_deferred.append((waiter, barrier, producers))
+            deferred = still_deferred
+
+            for barrier in range(BARRIERS):
+                if not ctrl.wait_mask & (1 << barrier):
+                    continue
+                producers = pending[barrier]
+                if not producers:
+                    self.issues.append(Issue(ISSUE_UNNEEDED_WAIT, row, barrier))
+                    continue
+                for producer in producers:
+                    self.dependencies.append(Dependency(producer.row, row, DEP_BARRIER, barrier))
+                    self.waiters.setdefault(producer.row, []).append(row)
+                if not any(producer.conflicts(inst_defs, inst_uses) for producer in producers):
+                    deferred.append((row, barrier, producers))
+                pending[barrier] = []
+
+            for producers in pending:
+                for producer in producers:
+                    if producer.conflicts(inst_defs, inst_uses):
+                        self.issues.append(Issue(ISSUE_MISSING_WAIT, row, producer.barrier,
+                                                 producer.row))
+
+            for slot in sorted(inst_uses):
+                if slot in last_def:
+                    self.dependencies.append(Dependency(last_def[slot], row, DEP_RAW, slot))
+            for slot in sorted(inst_defs):
+                for use in last_uses.get(slot, ()):
+                    if use != row:
+                        self.dependencies.append(Dependency(use, row, DEP_WAR, slot))
+                if slot in last_def:
+                    self.dependencies.append(Dependency(last_def[slot], row, DEP_WAW, slot))
+            for slot in inst_uses:
+                last_uses.setdefault(slot, []).append(row)
+            for slot in inst_defs:
+                last_def[slot] = row
+                last_uses[slot] = []
+
+            if ctrl.wr_barrier != NO_BARRIER:
+                pending[ctrl.wr_barrier].append(
+                    _Producer(row, ctrl.wr_barrier, frozenset(inst_defs), frozenset()))
+            if ctrl.rd_barrier != NO_BARRIER:
+                pending[ctrl.rd_barrier].append(
+                    _Producer(row, ctrl.rd_barrier, frozenset(), frozenset(inst_uses)))
+
+        for (waiter, barrier, _) in deferred:
+            self.issues.append(Issue(ISSUE_EARLY_WAIT, waiter, barrier, None))
+        for producers in pending:
+            for producer in producers:
+                self.issues.append(Issue(ISSUE_UNWAITED_BARRIER, producer.row, producer.barrier))
+        self.issues.sort(key=lambda issue: issue.row)
+
+    def issues_of_kind(self, kind):
+        return [issue for issue in self.issues if issue.kind == kind]
+
+    def dependencies_of(self, row):
+        return [dep for dep in self.dependencies if dep.dst == row]
+
+
+def analyze(instructions):
+    return ScoreboardAnalysis(instructions)
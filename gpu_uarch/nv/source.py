@@ -19,102 +19,137 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from gpu_uarch.nv import Control, Register, Instruction, Immediate, ConstantMemory, Memory, Predicate
-from lark import Lark, Visitor
+import hashlib
 import importlib.resources as pkg_resources
+import os
+import pickle
 
-_grammar = Lark(pkg_resources.read_text(
-    'gpu_uarch.nv', 'asm.lark'), start='instruction')
+from gpu_uarch.nv import (Control, Register, SpecialRegister, Instruction, Immediate, ConstantMemory,
+                          Memory, Predicate)
+from gpu_uarch.nv.cache import cache_dir
+
+
+# Used as an inline LALR transformer: lark looks up one method per rule, so no lark base class
+# (and no lark import) is needed here.
+class _InstructionTransformer:
+    def instruction(self, children):
+        control = Control.parse(children[0].split(':'))
+        predicate = None
+        idx = 1
+        if isinstance(children[idx], Predicate):
+            predicate = children[idx]
+            idx += 1
+        return control, predicate, str(children[idx]), children[idx + 1:]
+
+    def predicate(self, children):
+        return Predicate.parse(children[0][1:], False)
+
+    def predicate_negated(self, children):
+        return Predicate.parse(children[0][1:], True)
+
+    def register(self, children):
+        token = children[0]
+        uniform = token.startswith('U')
+        return Register.parse(token[2:] if uniform else token[1:], uniform)
+
+    def special_register(self, children):
+        return SpecialRegister.parse(str(children[0]))
+
+    def immediate(self, children):
+        token = children[0]
+        return Immediate(int(token, base=16) if token.startswith('0x') else int(token))
+
+    def memory(self, children):
+        return Memory(children[0], children[1] if len(children) > 1 else Immediate(0))
+
+    def constant_memory(self, children):
+        return ConstantMemory(children[0], children[1])
+
+
+def _deserialize_parser(data, memo):
+    from lark import Lark
+    from lark.grammar import Rule
+    from lark.lexer import TerminalDef
+
+    return Lark.deserialize(data, {'Rule': Rule, 'TerminalDef': TerminalDef}, memo,
+                            transformer=_InstructionTransformer())
+
+
+def _build_parser():
+    import lark
+    from lark import Lark
+    from lark.grammar import Rule
+    from lark.lexer import TerminalDef
+
+    grammar = pkg_resources.read_text('gpu_uarch.nv', 'asm.lark')
+    key = hashlib.sha256('{}\0{}'.format(lark.__version__, grammar).encode()).hexdigest()
+    path = os.path.join(cache_dir(), 'asm-{}.pickle'.format(key[:16]))
+
+    try:
+        with open(path, 'rb') as f:
+            return _deserialize_parser(*pickle.load(f))
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, KeyError, TypeError):
+        pass
+
+    serialized = Lark(grammar, parser='lalr', start='instruction').memo_serialize(
+        [TerminalDef, Rule])
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(serialized, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return _deserialize_parser(*serialized)
+
+
+_parser = None
+
+
+def _get_parser():
+    global _parser
+    if _parser is None:
+        _parser = _build_parser()
+    return _parser
+
+
+class _FileLines:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __iter__(self):
+        with open(self.filename, 'r') as f:
+            yield from f
 
 
 class SourceFile:
     def __init__(self, source):
-        self.lines = []
-        for line in source.split('\n'):
+        self._source = source.split('\n') if isinstance(source, str) else source
+
+    @staticmethod
+    def load(filename):
+        return SourceFile(_FileLines(filename))
+
+    def iter_lines(self):
+        for line in self._source:
             line = line.strip()
             if line.startswith('#') or len(line) == 0:
                 continue
-            self.lines.append(line)
+            yield line
 
-    @staticmethod
-    def load(filename):
-        with open(filename, 'r') as f:
-            return SourceFile(f.read())
-
-    class _InstructionBuilder(Visitor):
-        def __init__(self):
-            self.operands = []
-            self.predicate_object = None
-
-        def control(self, tree):
-            self.control_object = Control.parse(
-                [str(value) for value in tree.children])
-
-        def _register(self, tree):
-            assert tree.data == 'register'
-            assert len(tree.children) == 1
-            tree = tree.children[0]
-            uniform = tree.data == 'uniform_register'
-            idx = str(tree.children[0])
-            return Register.parse(idx, uniform)
-
-        def _immediate(self, tree):
-            assert tree.data == 'immediate'
-            token = tree.children[0]
-            return Immediate(int(str(token), base=10 if token.type == 'DECIMAL' else 16))
-
-        def _register_or_immediate(self, tree):
-            if tree.data == 'register':
-                return self._register(tree)
-            else:
-                return self._immediate(tree)
-
-        def _predicate(self, tree, negated=False):
-            idx = str(tree.children[0])
-            return Predicate.parse(idx, negated)
-
-        def predicate_neg_opt(self, tree):
-            tree = tree.children[0]
-            negated = False
-            if tree.data == 'predicate_negated':
-                tree = tree.children[0]
-                negated = True
-            self.predicate_object = self._predicate(tree, negated)
-
-        def operand(self, tree):
-            for op in tree.children:
-                if op.data == 'register':
-                    self.operands.append(self._register(op))
-                elif op.data == 'immediate':
-                    self.operands.append(self._immediate(op))
-                elif op.data == 'constant_memory':
-                    cbank = self._immediate(op.children[0])
-                    caddr = self._register_or_immediate(op.children[1])
-                    self.operands.append(ConstantMemory(cbank, caddr))
-                elif op.data == 'memory':
-                    base = self._register_or_immediate(op.children[0])
-                    offset = Immediate(0)
-                    if len(op.children) > 1:
-                        offset = self._immediate(op.children[1])
-                    self.operands.append(Memory(base, offset))
-                else:
-                    raise Exception('invalid subtree: {}'.format(tree))
-
-        def opcode(self, tree):
-            self.opcode_str = str(tree.children[0])
-
-        def build(self, offset):
-            return Instruction(offset, self.control_object, self.predicate_object, self.opcode_str, self.operands)
+    @property
+    def lines(self):
+        return list(self.iter_lines())
 
-    def parse(self):
+    def iter_parse(self):
         # FIXME: verify sm_75
+        parser = _get_parser()
         offset = 0
-        instructions = []
-        for line in self.lines:
-            tree = _grammar.parse(line)
-
-            builder = self._InstructionBuilder()
-            builder.visit(tree)
-            instructions.append(builder.build(offset))
+        for line in self.iter_lines():
+            (control, predicate, opcode, operands) = parser.parse(line)
+            yield Instruction(offset, control, predicate, opcode, operands)
             offset += 16
-        return instructions
+
+    def parse(self):
+        return list(self.iter_parse())
@@ -0,0 +1,156 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import collections
+import time
+
+from gpu_uarch.nv import UnknownInstruction
+
+# Pipeline instrumentation. Instrumented code fetches current() once per call and takes its usual
+# path when it is None, so collection costs nothing unless enabled.
+
+
+class Stage:
+    __slots__ = ('calls', 'seconds', 'bytes', 'instructions')
+
+    def __init__(self, calls=0, seconds=0.0, bytes=0, instructions=0):
+        self.calls = calls
+        self.seconds = seconds
+        self.bytes = bytes
+        self.instructions = instructions
+
+    def as_dict(self):
+        return {'calls': self.calls, 'seconds': self.seconds, 'bytes': self.bytes,
+                'instructions': self.instructions}
+
+
+class _Timer:
+    def __init__(self, stats, name, nbytes, instructions):
+        self.stats = stats
+        self.name = name
+        self.bytes = nbytes
+        self.instructions = instructions
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.name, time.perf_counter() - self.start, self.bytes,
+                          self.instructions)
+
+
+class Stats:
+    def __init__(self):
+        self.stages = {}
+        self.opcodes = collections.Counter()
+        self.unknown = collections.Counter()
+
+    def record(self, name, seconds, nbytes=0, instructions=0):
+        try:
+            stage = self.stages[name]
+        except KeyError:
+            stage = self.stages[name] = Stage()
+        stage.calls += 1
+        stage.seconds += seconds
+        stage.bytes += nbytes
+        stage.instructions += instructions
+
+    def timed(self, name, nbytes=0, instructions=0):
+        return _Timer(self, name, nbytes, instructions)
+
+    def count(self, inst):
+        if isinstance(inst, UnknownInstruction):
+            self.unknown[str(inst.error)] += 1
+        else:
+            self.opcodes[inst.opcode] += 1
+
+    def count_all(self, instructions):
+        for inst in instructions:
+            self.count(inst)
+
+    def merge(self, other):
+        if isinstance(other, dict):
+            other = Stats.from_dict(other)
+        for (name, stage) in other.stages.items():
+            mine = self.stages.setdefault(name, Stage())
+            mine.calls += stage.calls
+            mine.seconds += stage.seconds
+            mine.bytes += stage.bytes
+            mine.instructions += stage.instructions
+        self.opcodes.update(other.opcodes)
+        self.unknown.update(other.unknown)
+
+    def take(self):
+        result = self.as_dict()
+        self.__init__()
+        return result
+
+    def as_dict(self):
+        return {
+            'stages': {name: stage.as_dict() for (name, stage) in self.stages.items()},
+            'opcodes': dict(self.opcodes.most_common()),
+            'unknown': dict(self.unknown.most_common()),
+        }
+
+    @staticmethod
+    def from_dict(d):
+        stats = Stats()
+        stats.stages = {name: Stage(**stage) for (name, stage) in d['stages'].items()}
+        stats.opcodes.update(d['opcodes'])
+        stats.unknown.update(d['unknown'])
+        return stats
+
+    def format_table(self):
+        lines = ['{:<12} {:>8} {:>10} {:>12} {:>12} {:>14}'.format(
+            'stage', 'calls', 'seconds', 'bytes', 'instructions', 'instructions/s')]
+        for (name, stage) in self.stages.items():
+            rate = stage.instructions / stage.seconds if stage.seconds > 0 else 0
+            lines.append('{:<12} {:>8} {:>10.4f} {:>12} {:>12} {:>14.0f}'.format(
+                name, stage.calls, stage.seconds, stage.bytes, stage.instructions, rate))
+        for (title, counter) in (('opcode', self.opcodes), ('unknown', self.unknown)):
+            if counter:
+                lines.append('')
+                lines.append('{:<40} {:>12}'.format(title, 'count'))
+                lines.extend('{:<40} {:>12}'.format(key, count)
+                             for (key, count) in counter.most_common())
+        return '\n'.join(lines) + '\n'
+
+
+_current = None
+
+
+def enable():
+    global _current
+    if _current is None:
+        _current = Stats()
+    return _current
+
+
+def disable():
+    global _current
+    stats = _current
+    _current = None
+    return stats
+
+
+def current():
+    return _current
@@ -0,0 +1,169 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from gpu_uarch.nv import UnknownInstruction
+from gpu_uarch.nv.cfg import instruction_list
+
+BARRIERS = 6
+NO_BARRIER = 7
+
+CAUSE_STALL = 'stall'
+CAUSE_YIELD = 'yield'
+
+
+def barrier_cause(barrier):
+    return 'barrier{}'.format(barrier)
+
+
+class Latency:
+    def __init__(self, write, read):
+        self.write = write
+        self.read = read
+
+    def __repr__(self):
+        return 'Latency(write={}, read={})'.format(self.write, self.read)
+
+
+# Cycles until a variable latency instruction releases the barrier it sets. write is when the
+# result is available, read is when the source registers may be overwritten. These are rough
+# Turing numbers and are meant to be overridden with measurements.
+DEFAULT_LATENCIES = {
+    'LDC': Latency(26, 4),
+    'ULDC': Latency(26, 4),
+    'S2R': Latency(23, 4),
+    'S2UR': Latency(23, 4),
+    'STG': Latency(4, 4),
+    'LDG': Latency(400, 4),
+}
+
+DEFAULT_LATENCY = Latency(20, 4)
+
+
+class Latencies:
+    def __init__(self, table=None, default=DEFAULT_LATENCY):
+        self.table = dict(DEFAULT_LATENCIES if table is None else table)
+        self.default = default
+
+    def __getitem__(self, opcode):
+        if opcode is None:
+            return self.default
+        try:
+            return self.table[opcode]
+        except KeyError:
+            pass
+        # 'LDC.64' and 'STG.E.SYS' fall back to 'LDC' and 'STG'.
+        return self.table.get(opcode.split('.', 1)[0], self.default)
+
+
+class IssueEvent:
+    def __init__(self, row, instruction, cycle, cause, cause_row):
+        self.row = row
+        self.instruction = instruction
+        self.cycle = cycle
+        self.cause = cause
+        self.cause_row = cause_row
+
+    def __repr__(self):
+        return 'IssueEvent({}, cycle={}, cause={})'.format(self.row, self.cycle, self.cause)
+
+
+class Timeline:
+    def __init__(self, events, cycles, stalls, critical_path):
+        self.events = events
+        self.cycles = cycles
+        self.stalls = stalls
+        self.critical_path = critical_path
+
+    def as_dict(self):
+        return {
+            'cycles': self.cycles,
+            'instructions': len(self.events),
+            'stalls': dict(self.stalls),
+            'critical_path': [self.events[row].instruction.offset for row in self.critical_path],
+        }
+
+
+def simulate(instructions, latencies=None, yield_penalty=0):
+    if latencies is None:
+        latencies = Latencies()
+    instructions = instruction_list(instructions)
+
+    events = []
+    stalls = {}
+    # cycle at which each barrier is released and the row that set it last
+    barriers = [(0, None)] * BARRIERS
+    ready = 0
+    prev = None
+
+    for (row, inst) in enumerate(instructions):
+        ctrl = inst.control
+        cycle = ready
+        cause = CAUSE_STALL
+        cause_row = prev
+        for barrier in range(BARRIERS):
+            if ctrl.wait_mask & (1 << barrier):
+                (release, producer) = barriers[barrier]
+                if release > cycle:
+                    cycle = release
+                    cause = barrier_cause(barrier)
+                    cause_row = producer
+        if cycle > ready:
+            stalls[cause] = stalls.get(cause, 0) + cycle - ready
+        events.append(IssueEvent(row, inst, cycle, cause, cause_row))
+
+        opcode = None if isinstance(inst, UnknownInstruction) else inst.opcode
+        latency = latencies[opcode]
+        for (barrier, release) in ((ctrl.wr_barrier, cycle + latency.write),
+                                   (ctrl.rd_barrier, cycle + latency.read)):
+            if barrier != NO_BARRIER and release >= barriers[barrier][0]:
+                barriers[barrier] = (release, row)
+
+        # The next instruction issues no earlier than the stall count says; a stall of 0 still
+        # takes the issue slot.
+        stall = max(ctrl.stall, 1)
+        stalls[CAUSE_STALL] = stalls.get(CAUSE_STALL, 0) + stall
+        ready = cycle + stall
+        if ctrl.yield_hint and yield_penalty:
+            stalls[CAUSE_YIELD] = stalls.get(CAUSE_YIELD, 0) + yield_penalty
+            ready += yield_penalty
+        prev = row
+
+    # Outstanding barriers still have to drain before the sequence is complete.
+    cycles = ready
+    last = prev
+    drained = None
+    for (barrier, (release, producer)) in enumerate(barriers):
+        if release > cycles:
+            cycles = release
+            last = producer
+            drained = barrier
+    if drained is not None:
+        cause = barrier_cause(drained)
+        stalls[cause] = stalls.get(cause, 0) + cycles - ready
+
+    critical_path = []
+    row = last
+    while row is not None:
+        critical_path.append(row)
+        row = events[row].cause_row
+    critical_path.reverse()
+
+    return Timeline(events, cycles, stalls, critical_path)
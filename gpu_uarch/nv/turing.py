@@ -19,145 +19,724 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import functools
 import struct
+import time
 
+import gpu_uarch.nv.stats as stats
 from gpu_uarch.nv import (Immediate, Register, SpecialRegister, ConstantMemory,
-                          Memory, Control, Predicate, Instruction, UnknownInstruction)
+                          Memory, Control, Predicate, Instruction, UnknownInstruction,
+                          InstructionTable)
+
+
+# Bump whenever the decoded output of any instruction word changes, so that cached disassembly
+# produced by an older decoder is not reused.
+DECODER_VERSION = 1
 
 
 def _as_signed32(v):
     return struct.unpack('=l', struct.pack('=L', v))[0]
 
 
-def _parse_instruction(offset, lo, hi):
+# Operands that repeat constantly are shared instead of being rebuilt for every instruction word.
+
+_REGISTERS = [Register(index) for index in range(256)]
+_UNIFORM_REGISTERS = [Register(index, uniform=True) for index in range(256)]
+_PREDICATES = [Predicate(index & 0x7, index & 0x8 != 0) if index & 0x7 != 7 else None
+               for index in range(16)]
+
+_OPERAND_CACHE_SIZE = 4096
+
+
+def _cached(make):
+    cache = {}
+
+    def get(key):
+        try:
+            return cache[key]
+        except KeyError:
+            operand = make(key)
+            if len(cache) < _OPERAND_CACHE_SIZE:
+                cache[key] = operand
+            return operand
+    return get
+
+
+# Operand fields. Each one extracts a single operand from the instruction word. field.encode(offset,
+# op) is the inverse: it returns the (lo, hi) bits for op, or None if op does not fit the field.
+# field.mask is the (lo, hi) bits the field occupies.
+
+def _field(decode, encode, lo_mask=0, hi_mask=0):
+    decode.encode = encode
+    decode.mask = (lo_mask, hi_mask)
+    return decode
+
+
+def _encodes(encode, lo_mask=0, hi_mask=0):
+    return lambda decode: _field(decode, encode, lo_mask, hi_mask)
+
+
+def _register(word, shift, uniform=False):
+    registers = _UNIFORM_REGISTERS if uniform else _REGISTERS
+
+    def encode(offset, op):
+        if not isinstance(op, Register) or op.uniform != uniform or not 0 <= op.index < 256:
+            return None
+        return (op.index << shift, 0) if word == 'lo' else (0, op.index << shift)
+
+    if word == 'lo':
+        return _field(lambda offset, lo, hi: registers[(lo >> shift) & 0xff], encode,
+                      lo_mask=0xff << shift)
+    return _field(lambda offset, lo, hi: registers[(hi >> shift) & 0xff], encode,
+                  hi_mask=0xff << shift)
+
+
+def _dst(uniform=False):
+    return _register('lo', 16, uniform)
+
+
+def _src0(uniform=False):
+    return _register('lo', 24, uniform)
+
+
+def _src1(uniform=False):
+    return _register('lo', 32, uniform)
+
+
+def _src2(uniform=False):
+    return _register('hi', 0, uniform)
+
+
+def _encode_immediate(offset, op):
+    if not isinstance(op, Immediate) or not -0x80000000 <= op.value <= 0xffffffff:
+        return None
+    return (op.value & 0xffffffff) << 32, 0
+
+
+@_encodes(_encode_immediate, lo_mask=0xffffffff << 32)
+def _immediate(offset, lo, hi):
+    return Immediate(lo >> 32)
+
+
+_get_constant = _cached(
+    lambda imm: ConstantMemory(Immediate(imm & 0xff), Immediate((imm >> 8) << 2)))
+
+
+def _encode_constant(offset, op):
+    if not isinstance(op, ConstantMemory) or not isinstance(op.address, Immediate):
+        return None
+    (bank, address) = (op.bank.value, op.address.value)
+    if not 0 <= bank <= 0xff or not 0 <= address < 1 << 26 or address & 0x3:
+        return None
+    return (bank | (address >> 2) << 8) << 32, 0
+
+
+@_encodes(_encode_constant, lo_mask=0xffffffff << 32)
+def _constant(offset, lo, hi):
+    return _get_constant(lo >> 32)
+
+
+_get_constant_register = _cached(
+    lambda key: ConstantMemory(Immediate(key & 0xff), _REGISTERS[key >> 8]))
+
+
+def _encode_constant_register(offset, op):
+    if not isinstance(op, ConstantMemory) or not isinstance(op.address, Register):
+        return None
+    (bank, address) = (op.bank.value, op.address)
+    if not 0 <= bank <= 0xff or address.uniform or not 0 <= address.index < 256:
+        return None
+    return address.index << 24 | bank << 32, 0
+
+
+@_encodes(_encode_constant_register, lo_mask=0xff << 24 | 0xff << 32)
+def _constant_register(offset, lo, hi):
+    return _get_constant_register(((lo >> 16) & 0xff00) | ((lo >> 32) & 0xff))
+
+
+def _memory(base):
+    get = _cached(lambda key: Memory(key[0], Immediate(key[1])))
+
+    def encode(offset, op):
+        if not isinstance(op, Memory) or not 0 <= op.offset.value < 1 << 24:
+            return None
+        bits = base.encode(offset, op.address)
+        if bits is None:
+            return None
+        return bits[0] | op.offset.value << 40, bits[1]
+
+    return _field(lambda offset, lo, hi: get((base(offset, lo, hi), lo >> 40)), encode,
+                  base.mask[0] | 0xffffff << 40, base.mask[1])
+
+
+def _encode_special_register(offset, op):
+    if not isinstance(op, SpecialRegister) or not 0 <= op.index <= 0xffff:
+        return None
+    return 0, op.index
+
+
+@_encodes(_encode_special_register, hi_mask=0xffff)
+def _special_register(offset, lo, hi):
+    return SpecialRegister(hi & 0xffff)
+
+
+def _encode_branch_target(offset, op):
+    if not isinstance(op, Immediate):
+        return None
+    delta = op.value - offset - 16
+    if not -0x80000000 <= delta <= 0x7fffffff:
+        return None
+    # The upper bits of the branch offset continue in hi.
+    return (delta & 0xffffffff) << 32, 0x3ffff if delta < 0 else 0
+
+
+@_encodes(_encode_branch_target, lo_mask=0xffffffff << 32, hi_mask=0x3ffff)
+def _branch_target(offset, lo, hi):
+    return Immediate(offset + 16 + _as_signed32(lo >> 32))
+
+
+# Relative fields depend on the offset of the instruction. The decode memo stores them as decoded at
+# offset 0 and adds the offset back on lookup.
+_branch_target.relative = True
+
+
+# Operand patterns, selected by lo & 0xf00.
+
+_ANY_PATTERN = None
+
+
+def _operands4(uniform=False):
+    return {
+        0x200: (_dst(uniform), _src0(uniform), _src1(uniform), _src2(uniform)),
+        0x600: (_dst(uniform), _src0(uniform), _src2(uniform), _constant),
+        0x800: (_dst(uniform), _src0(uniform), _immediate, _src2(uniform)),
+        0xa00: (_dst(uniform), _src0(uniform), _constant, _src2(uniform)),
+    }
+
+
+def _operands2(uniform_dst=False):
+    return {
+        0x200: (_dst(uniform_dst), _src1()),
+        0x300: (_memory(_src0()), _src1()),
+        0x800: (_dst(uniform_dst), _immediate),
+        0x900: (_memory(_src2(uniform=True)), _src1()),
+        0xa00: (_dst(uniform_dst), _constant),
+        0xb00: (_dst(uniform_dst), _constant_register),
+    }
+
+
+def _without(patterns, *excluded):
+    return {k: v for k, v in patterns.items() if k not in excluded}
+
+
+_WIDE = 0x200
+
+# Decoders are looked up by the opcode (lo & 0xff), the operand pattern (lo & 0xf00) and the wide
+# bit of hi, moved to bit 12. Wide rows decode to a '.64' name when that bit is set; for the other
+# rows both halves of the table hold the same decoder. No other bit of hi is known to change the
+# opcode or the operand pattern of the instructions below, so none is part of the key.
+_KEY_WIDE = 0x1000
+_KEYS = 0x2000
+
+_INSTRUCTIONS = [
+    # opcode, operand patterns, name, wide
+    (0x02, _operands2(), 'MOV', False),
+    (0x05, {_ANY_PATTERN: (_dst(), _special_register)}, 'CS2R', False),
+    (0x10, _operands4(), 'IADD3', False),
+    (0x18, {_ANY_PATTERN: ()}, 'NOP', False),
+    (0x19, {_ANY_PATTERN: (_dst(), _special_register)}, 'S2R', False),
+    # FIXME: variants of IMAD: IMAD.MOV, IMAD.IADD, etc
+    (0x24, _operands4(), 'IMAD', False),
+    (0x47, {_ANY_PATTERN: (_branch_target,)}, 'BRA', False),
+    (0x4d, {_ANY_PATTERN: ()}, 'EXIT', False),
+    (0x82, {0x800: (_dst(uniform=True), _immediate)}, 'UMOV', False),
+    (0x82, _without(_operands2(), 0x800), 'LDC', True),
+    (0x86, _operands2(), 'STG.E.SYS', False),
+    (0x90, _operands4(uniform=True), 'UIADD3', False),
+    (0xb9, _operands2(uniform_dst=True), 'ULDC', True),
+    (0xc3, {_ANY_PATTERN: (_dst(uniform=True), _special_register)}, 'S2UR', False),
+]
+
+
+# Bits the decoder does not look at, as seen in nvcc output. The encoder starts from these so that
+# the emitted words match what the compiler produces. Rows matched with _ANY_PATTERN also take
+# their operand pattern from here.
+# FIXME: only the encodings observed so far are covered; other bits are emitted as zero.
+_ENCODING_DEFAULTS = {
+    # (opcode, operand pattern): (lo, hi)
+    (0x02, _ANY_PATTERN): (0, 0xf00),
+    (0x05, _ANY_PATTERN): (0x800, 0),
+    (0x10, _ANY_PATTERN): (0, 0x7ffe000),
+    (0x18, _ANY_PATTERN): (0x900, 0),
+    (0x19, _ANY_PATTERN): (0x900, 0),
+    (0x24, _ANY_PATTERN): (0, 0x78e0000),
+    (0x47, _ANY_PATTERN): (0x900, 0x3800000),
+    (0x4d, _ANY_PATTERN): (0x900, 0x3800000),
+    (0x82, 0xb00): (0, 0x800),
+    (0x86, 0x300): (0, 0x10e900),
+    (0x86, 0x900): (0xff << 24, 0xc10e900),
+    (0xb9, 0xa00): (0, 0x800),
+    (0xc3, _ANY_PATTERN): (0x900, 0),
+}
+
+
+def _build_decoders(instructions):
+    decoders = [None] * _KEYS
+    opcodes = set()
+    for (opcode, patterns, name, wide) in instructions:
+        opcodes.add(opcode)
+        for (pattern, fields) in patterns.items():
+            keys = range(opcode, 0x1000, 0x100) if pattern is _ANY_PATTERN else [opcode | pattern]
+            relative = tuple(index for (index, field) in enumerate(fields)
+                             if getattr(field, 'relative', False))
+            for key in keys:
+                assert decoders[key] is None, 'duplicate decoder for {:#x}'.format(key)
+                decoders[key] = (name, fields, relative)
+                decoders[key | _KEY_WIDE] = (name + '.64' if wide else name, fields, relative)
+    return decoders, frozenset(opcodes)
+
+
+_decoders, _known_opcodes = _build_decoders(_INSTRUCTIONS)
+
+
+# Yields (key, wide) for every opcode and operand pattern with a decoder: key holds the bits of lo
+# the decoder is selected by (lo & 0xfff) and wide whether the wide bit of hi is set.
+def decoder_keys():
+    for (key, decoder) in enumerate(_decoders):
+        if decoder is not None:
+            yield key & ~_KEY_WIDE, bool(key & _KEY_WIDE)
+
+
+def _build_encoders(instructions):
+    encoders = {}
+    for (opcode, patterns, name, wide) in instructions:
+        for (pattern, fields) in patterns.items():
+            (lo, hi) = _ENCODING_DEFAULTS.get((opcode, pattern),
+                                              _ENCODING_DEFAULTS.get((opcode, _ANY_PATTERN), (0, 0)))
+            if pattern is not _ANY_PATTERN:
+                lo = (lo & ~0xf00) | pattern
+            # Rows that match any operand pattern keep the one from a template word.
+            key_mask = 0xff if pattern is _ANY_PATTERN else 0xfff
+            lo_mask = 0xf000 | key_mask
+            hi_mask = 0x1fffff << 41 | (_WIDE if wide else 0)
+            for field in fields:
+                lo_mask |= field.mask[0]
+                hi_mask |= field.mask[1]
+            row = (opcode | (lo & 0xf00), key_mask, fields, lo & ~0xfff, hi, lo_mask, hi_mask)
+            encoders.setdefault(name, []).append((row, False))
+            if wide:
+                encoders.setdefault(name + '.64', []).append((row, True))
+    return encoders
+
+
+_encoders = _build_encoders(_INSTRUCTIONS)
+
+
+def _unknown_error(lo):
+    if lo & 0xff in _known_opcodes:
+        return Exception('Unknown operand pattern: {:#x}'.format(lo & 0xf00))
+    return Exception('Unknown opcode: {:#x}'.format(lo & 0xff))
+
+
+# The same instruction words repeat a lot, both within a function and across a library (EXIT, NOP
+# padding, BRA self-loops, common MOV and IMAD forms), so decoded words are memoized process-wide.
+# Offset-dependent operands are stored as decoded at offset 0 and rebased on lookup.
+_DECODE_CACHE_SIZE = 4096
+
+# Entries kept alive by the memo are expensive for the garbage collector when nothing repeats, so
+# a stream whose first _DECODE_PROBE words mostly miss is decoded without it.
+_DECODE_PROBE = 256
+_DECODE_PROBE_MIN_HITS = _DECODE_PROBE // 4
+
+
+def _decode(lo, hi):
     ctrl = Control(hi)
 
-    predicate_idx = (lo >> 12) & 0x7
-    predicate_neg = (lo >> 15) & 0x1
-    predicate = None if predicate_idx == 7 else Predicate(
-        predicate_idx, predicate_neg == 1)
+    decoder = _decoders[(lo & 0xfff) | (hi & _WIDE) << 3]
+    if decoder is None:
+        # Unknown words have no name and carry the error in place of the operands.
+        return ctrl, None, None, _unknown_error(lo), ()
+    (name, fields, relative) = decoder
 
-    imm = lo >> 32
-    imm_s32 = _as_signed32(imm)
-    imm_hi = imm >> 8
+    return (ctrl, _PREDICATES[(lo >> 12) & 0xf], name, [field(0, lo, hi) for field in fields],
+            relative)
 
-    cbank = imm & 0xff
-    cval = imm_hi << 2
 
-    dst = (lo >> 16) & 0xff
+_decode_word = functools.lru_cache(maxsize=_DECODE_CACHE_SIZE)(_decode)
 
-    src0 = (lo >> 24) & 0xff
-    src1 = (lo >> 32) & 0xff
-    src2 = hi & 0xff
 
-    special_src = hi & 0xffff
+def decode_cache_info():
+    return _decode_word.cache_info()
 
-    is64 = hi & 0x200
 
-    def get_operands4(all_uniform=False):
-        operand_pattern = lo & 0xf00
+def clear_decode_cache():
+    _decode_word.cache_clear()
+    _table_word.cache_clear()
 
-        if operand_pattern == 0x200:
-            return [Register(dst, uniform=all_uniform), Register(
-                src0, uniform=all_uniform), Register(src1, uniform=all_uniform), Register(src2, uniform=all_uniform)]
-        elif operand_pattern == 0x600:
-            return [Register(dst, uniform=all_uniform), Register(src0, uniform=all_uniform), Register(
-                src2, uniform=all_uniform), ConstantMemory(Immediate(cbank), Immediate(cval))]
-        elif operand_pattern == 0x800:
-            return [Register(dst, uniform=all_uniform), Register(
-                src0, uniform=all_uniform), Immediate(imm), Register(src2, uniform=all_uniform)]
-        elif operand_pattern == 0xa00:
-            return [Register(dst, uniform=all_uniform), Register(src0, uniform=all_uniform), ConstantMemory(
-                Immediate(cbank), Immediate(cval)), Register(src2, uniform=all_uniform)]
-        else:
-            raise Exception(
-                'Unknown operand pattern: {:#x}'.format(operand_pattern))
-
-    def get_operands2():
-        operand_pattern = lo & 0xf00
-        if operand_pattern == 0x200:
-            return [Register(dst), Register(src1)]
-        elif operand_pattern == 0x300:
-            return [Memory(Register(src0), Immediate(imm_hi)), Register(src1)]
-        elif operand_pattern == 0x800:
-            return [Register(dst), Immediate(imm)]
-        elif operand_pattern == 0x900:
-            return [Memory(Register(src2, uniform=True), Immediate(imm_hi)), Register(src1)]
-        elif operand_pattern == 0xa00:
-            return [Register(dst), ConstantMemory(Immediate(cbank), Immediate(cval))]
-        elif operand_pattern == 0xb00:
-            return [Register(dst), ConstantMemory(Immediate(cbank), Register(src0))]
-        else:
-            raise Exception(
-                'Unknown operand pattern: {:#x}'.format(operand_pattern))
 
-    # FIXME: This is actually not enough to identify an opcode. Looks like some bits in hi are also needed.
-    opcode = lo & 0xff
-    # FIXME: This is not enough to identify the operand pattern. Some bits from hi are also needed.
-    operand_pattern = lo & 0xf00
+# Decodes a single word as if it were at offset 0, so branch targets stay relative. Returns
+# (control, predicate, opcode, operands); opcode is None and operands are empty for unknown words.
+def decode_word(lo, hi):
+    (ctrl, pred, name, operands, _) = _decode_word(lo, hi)
+    return ctrl, pred, name, tuple(operands) if name is not None else ()
+
+
+def _parse_instruction(offset, lo, hi, decode=_decode_word):
+    (ctrl, pred, name, operands, relative) = decode(lo, hi)
+    if name is None:
+        return UnknownInstruction(offset, ctrl, operands)
+
+    # The memoized list is shared, so each instruction gets its own copy.
+    operands = operands[:]
+    if relative:
+        for index in relative:
+            operands[index] = Immediate(operands[index].value + offset)
+    return Instruction(offset, ctrl, pred, name, operands)
+
+
+# Table rows are memoized per word like decoded instructions, with relative operands rebased by
+# adding the offset to their first value.
+def _encode_word(lo, hi, decode=_decode):
+    (ctrl, pred, name, operands, relative) = decode(lo, hi)
+    if name is None:
+        return None, str(operands), tuple(InstructionTable._encode_row(ctrl, None, ())), ()
+    return (name, None, tuple(InstructionTable._encode_row(ctrl, pred, operands)),
+            tuple(InstructionTable.ROW_COLUMNS.index('operand{}_a'.format(index))
+                  for index in relative))
 
-    opcode_name = ''
-    operands = []
-    try:
-        if opcode == 0x02:
-            opcode_name = 'MOV'
-            operands = get_operands2()
-        elif opcode == 0x05:
-            opcode_name = 'CS2R'
-            operands = [Register(dst), SpecialRegister(special_src)]
-        elif opcode == 0x10:
-            opcode_name = 'IADD3'
-            operands = get_operands4()
-        elif opcode == 0x18:
-            opcode_name = 'NOP'
-        elif opcode == 0x19:
-            opcode_name = 'S2R'
-            operands = [Register(dst), SpecialRegister(special_src)]
-        elif opcode == 0x24:
-            opcode_name = 'IMAD'  # FIXME: variants of IMAD: IMAD.MOV, IMAD.IADD, etc
-            operands = get_operands4()
-        elif opcode == 0x47:
-            opcode_name = 'BRA'
-            operands = [Immediate(offset + 16 + imm_s32)]
-        elif opcode == 0x4d:
-            opcode_name = 'EXIT'
-        elif opcode == 0x82:
-            operands = get_operands2()
-            if operand_pattern == 0x800:
-                opcode_name = 'UMOV'
-                operands[0].uniform = True
-            else:
-                opcode_name = 'LDC{}'.format('.64' if is64 else '')
-        elif opcode == 0x86:
-            opcode_name = 'STG.E.SYS'
-            operands = get_operands2()
-        elif opcode == 0x90:
-            opcode_name = 'UIADD3'
-            operands = get_operands4(all_uniform=True)
-        elif opcode == 0xb9:
-            opcode_name = 'ULDC{}'.format('.64' if is64 else '')
-            operands = get_operands2()
-            operands[0].uniform = True
-        elif opcode == 0xc3:
-            opcode_name = 'S2UR'
-            operands = [Register(dst, uniform=True),
-                        SpecialRegister(special_src)]
-        else:
-            raise Exception('Unknown opcode: {:#x}'.format(opcode))
-    except Exception as err:
-        return UnknownInstruction(offset, ctrl, err)
 
-    return Instruction(offset, ctrl, predicate, opcode_name, operands)
+_table_word = functools.lru_cache(maxsize=_DECODE_CACHE_SIZE)(_encode_word)
 
 
-def disasm(data):
+def _iter_words(data, where):
     assert len(data) % 16 == 0
 
-    instructions = []
+    if where is None:
+        yield from zip(range(0, len(data), 16), *zip(*struct.iter_unpack('<QQ', data)))
+        return
+    view = memoryview(data)
+    match = where.match
+    for (start, end) in where.spans(len(data)):
+        offset = start
+        for (lo, hi) in struct.iter_unpack('<QQ', view[start:end]):
+            if match(lo, hi):
+                yield offset, lo, hi
+            offset += 16
 
+
+def _build_table(data, where):
+    table = InstructionTable()
+    opcode_id = table._opcode_id
+    offsets = []
+    opcode_ids = []
+    error_ids = []
+    rows = []
+    encode = _table_word
+    hits = _table_word.cache_info().hits
+    for (offset, lo, hi) in _iter_words(data, where):
+        (name, message, row, relative) = encode(lo, hi)
+        if relative:
+            row = list(row)
+            for index in relative:
+                row[index] += offset
+        offsets.append(offset)
+        if name is None:
+            opcode_ids.append(InstructionTable.UNKNOWN_OPCODE)
+            error_ids.append(table._error_id(message))
+        else:
+            opcode_ids.append(opcode_id(name))
+            error_ids.append(0)
+        rows.append(row)
+        if (len(rows) == _DECODE_PROBE
+                and _table_word.cache_info().hits - hits < _DECODE_PROBE_MIN_HITS):
+            encode = _encode_word
+    table._append_rows(offsets, opcode_ids, error_ids, rows)
+    return table
+
+
+def _iter_disasm(data):
+    assert len(data) % 16 == 0
+
+    decode = _decode_word
+    hits = _decode_word.cache_info().hits
     offset = 0
     for (lo, hi) in struct.iter_unpack('<QQ', data):
-        instructions.append(_parse_instruction(offset, lo, hi))
+        yield _parse_instruction(offset, lo, hi, decode)
         offset += 16
+        if offset == _DECODE_PROBE * 16 and _decode_word.cache_info().hits - hits < _DECODE_PROBE_MIN_HITS:
+            decode = _decode
+
+
+# Selects instruction words before they are decoded. The opcode and operand pattern are checked
+# first with a lookup table, operands are only looked at if needed and Instructions are built only
+# for the words that match. All the given criteria must match:
+#  - opcodes: instruction names, each also matches its variants, e.g. LDC matches LDC.64
+#  - registers: Register or SpecialRegister operands, also matched as memory and constant addresses
+#  - cbank: True for any constant bank, or a bank number
+#  - offsets: (start, end) ranges of non-negative offsets, either end may be None; instructions
+#    overlapping a range match
+class WordFilter:
+    def __init__(self, opcodes=None, registers=None, cbank=None, offsets=None):
+        self.opcodes = None if opcodes is None else frozenset(opcodes)
+        self.registers = None if registers is None else frozenset(
+            Register(op.index, op.uniform) if isinstance(op, Register) else op for op in registers)
+        self.cbank = cbank
+        # a specific bank needs the operands, True only needs a constant operand pattern
+        self._bank = None if cbank is None or cbank is True else cbank
+        self.offsets = None if offsets is None else list(offsets)
+
+        # Indexed like _decoders.
+        self._keys = None
+        if self.opcodes is not None or cbank is not None:
+            self._keys = bytearray(_KEYS)
+            for (key, decoder) in enumerate(_decoders):
+                if decoder is None:
+                    continue
+                (name, fields, _) = decoder
+                if cbank is not None and not any(f in (_constant, _constant_register) for f in fields):
+                    continue
+                self._keys[key] = self._match_opcode(name)
+        self._check_operands = self.registers is not None or self._bank is not None
+
+    def _match_opcode(self, name):
+        if self.opcodes is None:
+            return True
+        return any(name == opcode or name.startswith(opcode + '.') for opcode in self.opcodes)
+
+    def _uses_register(self, op):
+        if isinstance(op, (Memory, ConstantMemory)):
+            op = op.address
+        return op in self.registers
+
+    def _uses_bank(self, op):
+        return isinstance(op, ConstantMemory) and op.bank.value == self._bank
+
+    def spans(self, size):
+        if self.offsets is None:
+            return [(0, size)]
+        spans = []
+        for (start, end) in sorted((start or 0, size if end is None else end)
+                                   for (start, end) in self.offsets):
+            if start < 0 or end < 0:
+                raise Exception('Negative offset range: {:#x}:{:#x}'.format(start, end))
+            start = start & ~0xf
+            end = min(size, (end + 0xf) & ~0xf)
+            if start >= end:
+                continue
+            if spans and start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(end, spans[-1][1]))
+            else:
+                spans.append((start, end))
+        return spans
+
+    def match(self, lo, hi):
+        if self._keys is not None and not self._keys[(lo & 0xfff) | (hi & _WIDE) << 3]:
+            return False
+        if self._check_operands:
+            (_, _, name, operands, _) = _decode_word(lo, hi)
+            if name is None:
+                return False
+            if self.registers is not None and not any(self._uses_register(op) for op in operands):
+                return False
+            if self._bank is not None and not any(self._uses_bank(op) for op in operands):
+                return False
+        return True
+
+
+def _iter_filtered(data, where):
+    assert len(data) % 16 == 0
+
+    view = memoryview(data)
+    match = where.match
+    for (start, end) in where.spans(len(data)):
+        offset = start
+        for (lo, hi) in struct.iter_unpack('<QQ', view[start:end]):
+            if match(lo, hi):
+                yield _parse_instruction(offset, lo, hi)
+            offset += 16
 
+
+def _iter_disasm_stats(instructions, collector, stage):
+    perf_counter = time.perf_counter
+    seconds = 0.0
+    count = 0
+    try:
+        while True:
+            start = perf_counter()
+            inst = next(instructions, None)
+            seconds += perf_counter() - start
+            if inst is None:
+                break
+            count += 1
+            collector.count(inst)
+            yield inst
+    finally:
+        collector.record(stage, seconds, count * 16, count)
+
+
+def _select(data, where):
+    if where is None:
+        return 'decode', _iter_disasm(data)
+    return 'filter', _iter_filtered(data, where)
+
+
+def iter_disasm(data, where=None):
+    (stage, instructions) = _select(data, where)
+    collector = stats.current()
+    if collector is None:
+        return instructions
+    return _iter_disasm_stats(instructions, collector, stage)
+
+
+def _disasm_stats(data, where, collector):
+    (stage, instructions) = _select(data, where)
+    start = time.perf_counter()
+    instructions = list(instructions)
+    collector.record(stage, time.perf_counter() - start, len(data), len(instructions))
+    collector.count_all(instructions)
     return instructions
+
+
+def disasm(data, where=None):
+    collector = stats.current()
+    if collector is None:
+        return list(_select(data, where)[1])
+    return _disasm_stats(data, where, collector)
+
+
+def disasm_table(data, where=None):
+    collector = stats.current()
+    if collector is None:
+        return _build_table(data, where)
+    instructions = _disasm_stats(data, where, collector)
+    with collector.timed('table', len(data), len(instructions)):
+        return InstructionTable.from_instructions(instructions)
+
+
+def _encode_predicate(pred):
+    if pred is None:
+        return 0x7
+    return pred.index | (0x8 if pred.negated else 0)
+
+
+def encode(inst, offset=None, template=None):
+    if offset is None:
+        offset = inst.offset
+    ctrl = inst.control.encode()
+    if isinstance(inst, UnknownInstruction):
+        if template is None:
+            raise Exception('Cannot encode unknown instruction at {:#x}'.format(offset))
+        return template[0], (template[1] & ~(0x1fffff << 41)) | ctrl
+
+    rows = _encoders.get(inst.opcode)
+    if rows is None:
+        raise Exception('Unknown opcode: {}'.format(inst.opcode))
+    for ((key, key_mask, fields, lo, hi, lo_mask, hi_mask), wide) in rows:
+        if len(fields) != len(inst.operands):
+            continue
+        bits = [field.encode(offset, op) for (field, op) in zip(fields, inst.operands)]
+        if None in bits:
+            continue
+        if template is not None and template[0] & key_mask == key & key_mask:
+            # Keep whatever the decoder does not understand from the original word.
+            lo = (template[0] & ~lo_mask) | (key & key_mask)
+            hi = template[1] & ~hi_mask
+            predicate = (template[0] >> 12) & 0xf
+            if _PREDICATES[predicate] != inst.predicate:
+                predicate = _encode_predicate(inst.predicate)
+        else:
+            lo |= key
+            predicate = _encode_predicate(inst.predicate)
+        lo |= predicate << 12
+        hi |= ctrl | (_WIDE if wide else 0)
+        for (field_lo, field_hi) in bits:
+            lo |= field_lo
+            hi |= field_hi
+        return lo, hi
+    raise Exception('Unsupported operands for {}: {}'.format(
+        inst.opcode, ', '.join(repr(op) for op in inst.operands)))
+
+
+# templates are the (lo, hi) words previously at the same positions, e.g. Function.words(), and may
+# be shorter than instructions.
+def assemble(instructions, templates=None):
+    words = []
+    for (index, inst) in enumerate(instructions):
+        template = templates[index] if templates is not None and index < len(templates) else None
+        words.extend(encode(inst, index * 16, template))
+    return struct.pack('<{}Q'.format(len(words)), *words)
+
+
+class InstructionBatch:
+    def __init__(self, data):
+        import numpy as np
+
+        assert len(data) % 16 == 0
+        words = np.frombuffer(data, dtype='<u8').reshape(-1, 2)
+        self.lo = words[:, 0]
+        self.hi = words[:, 1]
+        lo = self.lo
+        hi = self.hi
+
+        self.offset = np.arange(len(words), dtype=np.uint64) * np.uint64(16)
+
+        ctrl = hi >> np.uint64(41)
+        self.stall = (ctrl & np.uint64(0xf)).astype(np.uint8)
+        self.yield_hint = (ctrl & np.uint64(0x10)) != 0
+        self.wr_barrier = ((ctrl >> np.uint64(5)) & np.uint64(0x7)).astype(np.uint8)
+        self.rd_barrier = ((ctrl >> np.uint64(8)) & np.uint64(0x7)).astype(np.uint8)
+        self.wait_mask = ((ctrl >> np.uint64(11)) & np.uint64(0x3f)).astype(np.uint8)
+        self.reuse_flags = ((ctrl >> np.uint64(17)) & np.uint64(0xf)).astype(np.uint8)
+
+        self.opcode = (lo & np.uint64(0xff)).astype(np.uint8)
+        self.operand_pattern = (lo & np.uint64(0xf00)).astype(np.uint16)
+
+        self.dst = ((lo >> np.uint64(16)) & np.uint64(0xff)).astype(np.uint8)
+        self.src0 = ((lo >> np.uint64(24)) & np.uint64(0xff)).astype(np.uint8)
+        self.src1 = ((lo >> np.uint64(32)) & np.uint64(0xff)).astype(np.uint8)
+        self.src2 = (hi & np.uint64(0xff)).astype(np.uint8)
+        self.immediate = (lo >> np.uint64(32)).astype(np.uint32)
+        self.special_register = (hi & np.uint64(0xffff)).astype(np.uint16)
+
+        (names, ids) = _opcode_name_ids()
+        self.opcode_names = names
+        key = (lo & np.uint64(0xfff)) | (hi & np.uint64(_WIDE)) << np.uint64(3)
+        self.opcode_id = ids[key.astype(np.intp)]
+        self.known = self.opcode_id >= 0
+
+        # As in InstructionTable, -1 stands for no predicate (PT) and for unknown instructions.
+        predicate = ((lo >> np.uint64(12)) & np.uint64(0x7)).astype(np.int8)
+        has_predicate = self.known & (predicate != 7)
+        self.predicate = np.where(has_predicate, predicate, np.int8(-1))
+        self.predicate_negated = has_predicate & ((lo & np.uint64(0x8000)) != 0)
+
+    def __len__(self):
+        return len(self.lo)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[index] for index in range(*idx.indices(len(self)))]
+        return _parse_instruction(int(self.offset[idx]), int(self.lo[idx]), int(self.hi[idx]))
+
+    def __iter__(self):
+        for (offset, lo, hi) in zip(self.offset.tolist(), self.lo.tolist(), self.hi.tolist()):
+            yield _parse_instruction(offset, lo, hi)
+
+    def instructions(self):
+        return list(self)
+
+
+@functools.lru_cache(maxsize=None)
+def _opcode_name_ids():
+    import numpy as np
+
+    ids = {}
+    for decoder in _decoders:
+        if decoder is not None:
+            ids.setdefault(decoder[0], len(ids))
+    column = [-1 if decoder is None else ids[decoder[0]] for decoder in _decoders]
+    return list(ids), np.array(column, dtype=np.int16)
+
+
+def disasm_batch(data):
+    return InstructionBatch(data)
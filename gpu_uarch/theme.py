@@ -19,9 +19,6 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from sty import fg, ef, rs
-
-
 class NoTheme:
     def __init__(self):
         self.control_active = ''
@@ -41,6 +38,8 @@ class NoTheme:
 
 class SolarizedTheme:
     def __init__(self):
+        from sty import fg, ef, rs
+
         self.control_active = fg(0xb5, 0x89, 0x00)
         self.control_inactive = fg(0x58, 0x6e, 0x75)
         self.constant = fg(0xb5, 0x89, 0x00)
@@ -27,13 +27,18 @@ setuptools.setup(
     version='0.0',
     author='Paweł Dziepak',
     author_email='pdziepak@gmail.com',
-    packages=setuptools.find_packages(exclude=['tests']),
-    scripts=['bin/gpu_disasm.py'],
+    packages=setuptools.find_packages(exclude=['tests', 'benchmarks']),
+    scripts=['bin/gpu_asm.py', 'bin/gpu_disasm.py', 'bin/gpu_index.py',
+             'bin/gpu_similar.py', 'bin/gpu_diff.py'],
     package_data={'gpu_uarch.nv': ['asm.lark']},
     install_requires=[
         'pyelftools',
         'cxxfilt',
         'sty',
         'lark-parser',
-    ]
+    ],
+    extras_require={
+        'numpy': ['numpy'],
+        'lz4': ['lz4'],
+    }
 )
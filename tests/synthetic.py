@@ -0,0 +1,77 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import random
+import struct
+
+import gpu_uarch.nv.turing as turing
+
+# Only the keys taken from lo: the wide bit comes with the random hi bits.
+_KEYS = [key for (key, wide) in turing.decoder_keys() if not wide]
+
+# barrier fields that the assembler can express: 0-5 or none
+_BARRIERS = [0, 1, 2, 3, 4, 5, 7, 7, 7, 7]
+
+EM_CUDA = 190
+
+
+def random_words(count, seed=0):
+    rng = random.Random(seed)
+    for index in range(count):
+        key = rng.choice(_KEYS)
+        lo = (rng.getrandbits(64) & ~0xffff) | (rng.randrange(16) << 12) | key
+        if key & 0xff == 0x47:
+            # keep branches inside the stream
+            target = rng.randrange(count) * 16
+            lo = (lo & 0xffffffff) | ((target - index * 16 - 16) & 0xffffffff) << 32
+        # control bits, then the bits the decoder reads from hi
+        ctrl = (rng.randrange(16) | rng.choice([0, 0x10]) | rng.choice(_BARRIERS) << 5
+                | rng.choice(_BARRIERS) << 8 | rng.getrandbits(6) << 11)
+        hi = ctrl << 41 | rng.getrandbits(16)
+        yield lo, hi
+
+
+def instruction_stream(count, seed=0):
+    words = []
+    for (lo, hi) in random_words(count, seed):
+        words += [lo, hi]
+    return struct.pack('<{}Q'.format(len(words)), *words)
+
+
+# Minimal little-endian ELF64 image with one PROGBITS section per (name, data) pair and a
+# section name table. Also used to build host objects around fatbins and the benchmark cubins.
+def make_elf(sections, machine=EM_CUDA):
+    names = b'\0' + b''.join(name + b'\0' for (name, _) in sections) + b'.shstrtab\0'
+    body = bytearray(64)
+    headers = [bytes(64)]
+    name_offset = 1
+    for (name, data) in sections + [(b'.shstrtab', names)]:
+        sh_type = 3 if name == b'.shstrtab' else 1
+        headers.append(struct.pack('<IIQQQQIIQQ', name_offset, sh_type, 0, 0, len(body),
+                                   len(data), 0, 0, 128, 0))
+        name_offset += len(name) + 1
+        body += data + b'\0' * (-len(data) % 128)
+    shoff = len(body)
+    (osabi, abi_version) = (0x33, 7) if machine == EM_CUDA else (0, 0)
+    body[:64] = struct.pack('<4sBBBBB7sHHIQQQIHHHHHH', b'\x7fELF', 2, 1, 1, osabi, abi_version,
+                            bytes(7), 2, machine, 1, 0, 0, shoff, 0, 64, 0, 0, 64, len(headers),
+                            len(headers) - 1)
+    return bytes(body) + b''.join(headers)
@@ -20,13 +20,35 @@
 # SOFTWARE.
 
 import gpu_uarch.nv.source as source
-from gpu_uarch.nv import (Instruction, Register, Control, ConstantMemory,
+from gpu_uarch.nv import (Instruction, Register, SpecialRegister, Control, ConstantMemory,
                           Immediate, Predicate, Memory)
+import lark
+import os
+import tempfile
 import unittest
+from unittest import mock
 
 
 class TestNvTuringAssembly(unittest.TestCase):
-    pass
+    def test_iter_parse(self):
+        src = source.SourceFile(iter(['# comment', '--:-:-:-:4 MOV R0, RZ', '', '01:-:-:Y:5 EXIT']))
+        it = src.iter_parse()
+        self.assertEqual(next(it).opcode, 'MOV')
+        self.assertEqual([(inst.offset, inst.opcode) for inst in it], [(16, 'EXIT')])
+
+    def test_grammar_cache(self):
+        with tempfile.TemporaryDirectory() as cache, mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache}):
+            first = source._build_parser()
+            self.assertEqual(len(os.listdir(os.path.join(cache, 'gpu_uarch'))), 1)
+            with mock.patch('lark.Lark', wraps=lark.Lark) as lark_class:
+                second = source._build_parser()
+                lark_class.assert_not_called()
+            line = '--:-:-:-:4 MOV R0, RZ'
+            self.assertEqual(first.parse(line), second.parse(line))
+
+    def test_unknown_special_register(self):
+        with self.assertRaisesRegex(Exception, 'Unknown special register: SR_FOO'):
+            source.SourceFile('--:-:-:-:4 S2R R0, SR_FOO').parse()
 
 
 test_cases = [
@@ -43,7 +65,17 @@ test_cases = [
     ('exit', '01:-:-:Y:5 EXIT',
      [Instruction(0, Control.parse(['01', '-', '-', 'Y', '5']), None, 'EXIT', [])]),
     ('mov_r_i', '03:-:-:-:f MOV R2, 0x160', [Instruction(0, Control.parse(
-        ['03', '-', '-', '-', 'f']), None, 'MOV', [Register(2), Immediate(0x160)])])
+        ['03', '-', '-', '-', 'f']), None, 'MOV', [Register(2), Immediate(0x160)])]),
+    ('wait_mask_hex', '3f:2:1:-:0 NOP', [Instruction(0, Control.from_fields(
+        0, False, 1, 2, 0x3f), None, 'NOP', [])]),
+    ('pt_ldc_r_cr', '--:-:-:-:2 PT LDC.64 UR4, c[0x3][R2]', [Instruction(0, Control.parse(
+        ['--', '-', '-', '-', '2']), Predicate(7), 'LDC.64', [Register(4, uniform=True), ConstantMemory(Immediate(3), Register(2))])]),
+    ('prmt_r_m', '--:-:-:-:2 PRMT R0, [0x10], [UR4]', [Instruction(0, Control.parse(
+        ['--', '-', '-', '-', '2']), None, 'PRMT', [Register(0), Memory(Immediate(0x10), Immediate(0)), Memory(Register(4, uniform=True), Immediate(0))])]),
+    ('s2r_sr', '--:-:-:-:4 S2R R0, SR_TID.X', [Instruction(0, Control.parse(
+        ['--', '-', '-', '-', '4']), None, 'S2R', [Register(0), SpecialRegister(0x2100)])]),
+    ('s2ur_unknown_sr', '--:-:-:-:4 S2UR UR4, <unknown special register 0x1234>', [Instruction(0, Control.parse(
+        ['--', '-', '-', '-', '4']), None, 'S2UR', [Register(4, uniform=True), SpecialRegister(0x1234)])]),
 ]
 
 
@@ -0,0 +1,64 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import argparse
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.source
+import gpu_uarch.nv.turing as turing
+from benchmarks import run, synthetic
+from gpu_uarch.nv import UnknownInstruction
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_instruction_stream(self):
+        data = synthetic.instruction_stream(1000, seed=1)
+        self.assertEqual(data, synthetic.instruction_stream(1000, seed=1))
+        instructions = turing.disasm(data)
+        self.assertFalse(any(isinstance(inst, UnknownInstruction) for inst in instructions))
+        self.assertEqual(gpu_uarch.nv.source.SourceFile(synthetic.source_lines(data)).parse(),
+                         instructions)
+
+    def test_cubin(self):
+        cubin = gpu_uarch.nv.cubin.CuBin(synthetic.make_cubin(3, 100))
+        self.assertEqual([func.name for func in cubin.functions],
+                         ['kernel0(int*)', 'kernel1(int*)', 'kernel2(int*)'])
+        self.assertEqual(len(cubin.functions[2].disasm()), 100)
+
+
+class TestRun(unittest.TestCase):
+    def test_run_and_compare(self):
+        args = argparse.Namespace(instructions=100, lines=10, functions=2,
+                                  function_instructions=10, seed=0, repeat=1)
+        results = run.run(args, list(run.BENCHMARKS))
+        self.assertEqual(set(results['results']), set(run.BENCHMARKS))
+
+        slower = {'results': {name: dict(result, rate=result['rate'] / 2)
+                              for (name, result) in results['results'].items()}}
+        rows = run.compare(results, slower, threshold=0.1)
+        self.assertTrue(all(regressed for (_, _, _, _, regressed) in rows))
+        rows = run.compare(results, results, threshold=0.1)
+        self.assertFalse(any(regressed for (_, _, _, _, regressed) in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import importlib.resources as pkg_resources
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.export as export
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv.cache import DisasmCache
+
+
+def load(name, cache=None):
+    pkg = __package__ + '.nv_turing'
+    with pkg_resources.path(pkg, '{}.cubin'.format(name)) as bin:
+        return gpu_uarch.nv.cubin.CuBin(bin, cache=cache)
+
+
+class TestDisasmCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def test_disasm_table(self):
+        cache = DisasmCache(self.directory)
+        func = load('simple_o3', cache).functions[0]
+        expected = turing.disasm(func.data)
+        self.assertEqual(func.disasm_table().instructions(), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        with mock.patch.object(turing, 'disasm_table') as disasm_table:
+            self.assertEqual(func.disasm_table().instructions(), expected)
+            disasm_table.assert_not_called()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with mock.patch.object(turing, 'disasm_table') as disasm_table:
+            self.assertEqual(func.disasm(), expected)
+            self.assertEqual(list(func.iter_disasm()), expected)
+            disasm_table.assert_not_called()
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_key(self):
+        cache = DisasmCache(self.directory)
+        key = cache.key(b'\0' * 16)
+        self.assertNotEqual(key, cache.key(b'\1' + b'\0' * 15))
+        self.assertNotEqual(key, cache.key(b'\0' * 16, 'text'))
+        with mock.patch.object(turing, 'DECODER_VERSION', turing.DECODER_VERSION + 1):
+            self.assertNotEqual(key, cache.key(b'\0' * 16))
+
+    def test_corrupted_entry(self):
+        cache = DisasmCache(self.directory)
+        data = load('simple_o0').functions[0].data
+        cache.disasm_table(data)
+        (path, _, _), = cache._entries()
+        with open(path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertEqual(cache.disasm_table(data).instructions(), turing.disasm(data))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_version(self):
+        cache = DisasmCache(self.directory)
+        data = load('simple_o0').functions[0].data
+        cache.disasm_table(data)
+        with mock.patch.object(export, 'COLUMNAR_VERSION', export.COLUMNAR_VERSION + 1):
+            cache.disasm_table(data)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_eviction(self):
+        cache = DisasmCache(self.directory, max_size=350)
+        keys = [cache.key(bytes([i])) for i in range(3)]
+        for (i, key) in enumerate(keys):
+            cache.put(key, b'x' * 100)
+            os.utime(cache._path(key), (i, i))
+        self.assertEqual(cache.get(keys[0]), b'x' * 100)
+        cache.put(cache.key(b'\3'), b'x' * 100)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+    def test_size_file(self):
+        cache = DisasmCache(self.directory)
+        cache.put(cache.key(b'\0'), b'x' * 100)
+        with mock.patch.object(DisasmCache, '_entries') as entries:
+            cache.put(cache.key(b'\1'), b'x' * 50)
+            entries.assert_not_called()
+        self.assertEqual(DisasmCache(self.directory)._read_size(), 150)
+        cache.clear()
+        self.assertEqual(cache._read_size(), 0)
+
+    def test_clear(self):
+        cache = DisasmCache(self.directory)
+        cache.put(cache.key(b''), b'x')
+        cache.clear()
+        self.assertIsNone(cache.get(cache.key(b'')))
+
+
+if __name__ == '__main__':
+    unittest.main()
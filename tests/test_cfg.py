@@ -0,0 +1,122 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import importlib.resources as pkg_resources
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.source
+from gpu_uarch.nv.cfg import ControlFlowGraph, EDGE_BRANCH, EDGE_FALLTHROUGH
+
+
+def build(lines):
+    return ControlFlowGraph(gpu_uarch.nv.source.SourceFile('\n'.join(lines)).parse())
+
+
+def successors(block):
+    return [(succ.index, kind) for (succ, kind) in block.successors]
+
+
+class TestControlFlowGraph(unittest.TestCase):
+    def test_straight_line(self):
+        cfg = build(['--:-:-:-:1 NOP', '--:-:-:-:1 EXIT'])
+        self.assertEqual(len(cfg.blocks), 1)
+        self.assertEqual(cfg.loops, [])
+
+    def test_conditional_branch(self):
+        cfg = build([
+            '--:-:-:-:1 P0 BRA 0x30',   # 0x00
+            '--:-:-:-:1 NOP',           # 0x10
+            '--:-:-:-:1 NOP',           # 0x20
+            '--:-:-:-:1 EXIT',          # 0x30
+        ])
+        self.assertEqual([block.offset for block in cfg.blocks], [0x0, 0x10, 0x30])
+        self.assertEqual(successors(cfg.blocks[0]), [(2, EDGE_BRANCH), (1, EDGE_FALLTHROUGH)])
+        self.assertEqual(successors(cfg.blocks[1]), [(2, EDGE_FALLTHROUGH)])
+        self.assertEqual(successors(cfg.blocks[2]), [])
+        self.assertIs(cfg.blocks[2].idom, cfg.blocks[0])
+        self.assertTrue(cfg.dominates(cfg.blocks[0], cfg.blocks[1]))
+        self.assertFalse(cfg.dominates(cfg.blocks[1], cfg.blocks[2]))
+        self.assertIs(cfg.block_at(0x20), cfg.blocks[1])
+
+    def test_unconditional_branch_and_exit(self):
+        cfg = build([
+            '--:-:-:-:1 BRA 0x20',      # 0x00
+            '--:-:-:-:1 NOP',           # 0x10
+            '--:-:-:-:1 P0 EXIT',       # 0x20
+            '--:-:-:-:1 EXIT',          # 0x30
+        ])
+        self.assertEqual(successors(cfg.blocks[0]), [(2, EDGE_BRANCH)])
+        self.assertEqual(successors(cfg.blocks[2]), [(3, EDGE_FALLTHROUGH)])
+        self.assertEqual(cfg.reachable(), [cfg.blocks[0], cfg.blocks[2], cfg.blocks[3]])
+        self.assertIsNone(cfg.blocks[1].idom)
+
+    def test_nested_loops(self):
+        cfg = build([
+            '--:-:-:-:1 NOP',           # 0x00  b0
+            '--:-:-:-:1 NOP',           # 0x10  b1 outer header
+            '--:-:-:-:1 NOP',           # 0x20  b2 inner header
+            '--:-:-:-:1 P0 BRA 0x20',   # 0x30
+            '--:-:-:-:1 P1 BRA 0x10',   # 0x40  b3
+            '--:-:-:-:1 EXIT',          # 0x50  b4
+        ])
+        self.assertEqual(len(cfg.loops), 2)
+        (outer, inner) = cfg.loops
+        self.assertEqual(outer.header, 1)
+        self.assertEqual(outer.blocks, {1, 2, 3})
+        self.assertEqual(inner.header, 2)
+        self.assertEqual(inner.blocks, {2})
+        self.assertIs(inner.parent, outer)
+        self.assertEqual(inner.depth, 2)
+        self.assertIs(cfg.loop_of(cfg.blocks[2]), inner)
+        self.assertIs(cfg.loop_of(cfg.blocks[3]), outer)
+        self.assertIsNone(cfg.loop_of(cfg.blocks[4]))
+        self.assertEqual(outer.instruction_count(cfg), 4)
+
+    def test_external_branch(self):
+        cfg = build(['--:-:-:-:1 P0 BRA 0x100', '--:-:-:-:1 EXIT'])
+        self.assertEqual(cfg.external_branches, [0])
+        self.assertEqual(successors(cfg.blocks[0]), [(1, EDGE_FALLTHROUGH)])
+
+    def test_dot(self):
+        cfg = build(['--:-:-:-:1 P0 BRA 0x0', '--:-:-:-:1 EXIT'])
+        dot = cfg.to_dot('kernel(int*)')
+        self.assertTrue(dot.startswith('digraph "kernel(int*)" {'))
+        self.assertIn('b0 -> b0;', dot)
+        self.assertIn('b0 -> b1 [style=dashed];', dot)
+        self.assertIn('P0 BRA 0x0\\l', dot)
+
+    def test_empty(self):
+        cfg = ControlFlowGraph([])
+        self.assertEqual(cfg.blocks, [])
+        self.assertIsNone(cfg.entry)
+
+    def test_cubin(self):
+        pkg = __package__ + '.nv_turing'
+        with pkg_resources.path(pkg, 'simple_o3.cubin') as bin:
+            func = gpu_uarch.nv.cubin.CuBin(bin).functions[0]
+        cfg = ControlFlowGraph.from_function(func)
+        self.assertEqual(sum(len(block) for block in cfg.blocks), len(func.disasm()))
+        self.assertEqual(cfg.loops, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
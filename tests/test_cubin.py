@@ -0,0 +1,66 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import importlib.resources as pkg_resources
+import os
+import tempfile
+import unittest
+
+import gpu_uarch.nv.cubin
+
+
+class TestCuBin(unittest.TestCase):
+    def test_find_cubins(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ['b/z.cubin', 'b/a.cubin', 'a.cubin', 'a.txt']:
+                os.makedirs(os.path.dirname(os.path.join(tmp, name)), exist_ok=True)
+                open(os.path.join(tmp, name), 'wb').close()
+            found = list(gpu_uarch.nv.cubin.find_cubins([tmp, os.path.join(tmp, '*.txt')]))
+            self.assertEqual([os.path.relpath(path, tmp) for path in found],
+                             ['a.cubin', 'b/a.cubin', 'b/z.cubin', 'a.txt'])
+
+
+def make_test(name):
+    def test(self):
+        pkg = __package__ + '.nv_turing'
+        with pkg_resources.path(pkg, '{}.cubin'.format(name)) as bin:
+            eager = gpu_uarch.nv.cubin.CuBin(bin)
+            with gpu_uarch.nv.cubin.CuBin(bin, lazy=True) as lazy:
+                self.assertEqual([f.symbol for f in lazy.functions],
+                                 [f.symbol for f in eager.functions])
+                func = lazy.functions[0]
+                self.assertIsInstance(func.data, memoryview)
+                self.assertIsNone(func._name)
+                self.assertEqual(func.name, 'kernel(int*, int, int)')
+                self.assertEqual(bytes(func.data), eager.functions[0].data)
+                self.assertEqual(func.disasm(), eager.functions[0].disasm())
+            with self.assertRaises(ValueError):
+                bytes(func.data)
+    return test
+
+
+for name in ['simple_o0', 'simple_o3']:
+    setattr(TestCuBin, 'test_lazy_{}'.format(name), make_test(name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+import gpu_uarch.nv.source
+from gpu_uarch.nv.dataflow import defs, uses, slot_name, UNIFORM_BASE
+
+
+def parse(line):
+    return gpu_uarch.nv.source.SourceFile(line).parse()[0]
+
+
+class TestDefsUses(unittest.TestCase):
+    def check(self, line, expected_defs, expected_uses):
+        inst = parse(line)
+        self.assertEqual([slot_name(slot) for slot in defs(inst)], expected_defs)
+        self.assertEqual([slot_name(slot) for slot in uses(inst)], expected_uses)
+
+    def test_alu(self):
+        self.check('--:-:-:-:1 IADD3 R0, R2, c[0x0][0x168], RZ', ['R0'], ['R2'])
+
+    def test_wide_load(self):
+        self.check('--:-:-:-:1 LDC.64 R2, c[0x0][R4]', ['R2', 'R3'], ['R4'])
+        self.check('--:-:-:-:1 ULDC.64 UR4, c[0x0][0x160]', ['UR4', 'UR5'], [])
+
+    def test_store(self):
+        self.check('--:-:-:-:1 STG.E.SYS [R2], R0', [], ['R2', 'R3', 'R0'])
+        self.check('--:-:-:-:1 STG.E.SYS [UR4+0x10], R0', [], ['UR4', 'UR5', 'R0'])
+
+    def test_no_operands(self):
+        self.check('--:-:-:-:1 EXIT', [], [])
+
+    def test_slot_name(self):
+        self.assertEqual(slot_name(5), 'R5')
+        self.assertEqual(slot_name(UNIFORM_BASE + 5), 'UR5')
+
+
+if __name__ == '__main__':
+    unittest.main()
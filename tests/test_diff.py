@@ -0,0 +1,123 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import random
+import struct
+import unittest
+
+import gpu_uarch.nv.diff as diff
+from gpu_uarch.nv import Control, Instruction, Register
+from gpu_uarch.nv.cubin import Function
+from tests import synthetic
+
+
+def _lcs(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for (j, y) in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+class TestMyers(unittest.TestCase):
+    def test_random(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            size = rng.choice([16, 64])
+            a = [rng.randrange(4) for _ in range(rng.randrange(size))]
+            b = [rng.randrange(4) for _ in range(rng.randrange(size))]
+            hunks = diff.myers(a, b)
+            (i, j) = (0, 0)
+            result = []
+            for (tag, i1, i2, j1, j2) in hunks:
+                self.assertEqual((i1, j1), (i, j))
+                if tag == 'equal':
+                    self.assertEqual(a[i1:i2], b[j1:j2])
+                result += b[j1:j2]
+                (i, j) = (i2, j2)
+            self.assertEqual((i, j, result), (len(a), len(b), b))
+            edits = sum(i2 - i1 + j2 - j1 for (tag, i1, i2, j1, j2) in hunks if tag != 'equal')
+            self.assertEqual(edits, len(a) + len(b) - 2 * _lcs(a, b))
+
+    def test_hunks(self):
+        self.assertEqual(diff.myers('abcdef', 'abXdeYf'), [
+            ('equal', 0, 2, 0, 2), ('replace', 2, 3, 2, 3), ('equal', 3, 5, 3, 5),
+            ('insert', 5, 5, 5, 6), ('equal', 5, 6, 6, 7)])
+        self.assertEqual(diff.myers('', 'ab'), [('insert', 0, 0, 0, 2)])
+        self.assertEqual(diff.myers('ab', 'ab'), [('equal', 0, 2, 0, 2)])
+
+    def test_max_edits(self):
+        self.assertEqual(diff.myers('xabcdy', 'xdcbay', max_edits=2), [
+            ('equal', 0, 1, 0, 1), ('replace', 1, 5, 1, 5), ('equal', 5, 6, 5, 6)])
+
+
+class TestDiff(unittest.TestCase):
+    def setUp(self):
+        self.data = synthetic.instruction_stream(200, seed=1)
+
+    def test_identical(self):
+        result = diff.diff_functions(Function('_Z1fv', self.data), Function('_Z1fv', self.data))
+        self.assertEqual((result.name, result.status, result.hunks), ('f()', 'identical', []))
+
+    def test_changed(self):
+        changed = self.data[:320] + synthetic.instruction_stream(2, seed=2) + self.data[352:]
+        result = diff.diff_functions(Function('_Z1fv', self.data), Function('_Z1fv', changed))
+        self.assertEqual(result.status, diff.FUNCTION_CHANGED)
+        self.assertEqual((result.inserted, result.deleted), (2, 2))
+        self.assertEqual(result.old.instructions, 200)
+        old = diff.Summary(Function('_Z1fv', self.data).disasm())
+        self.assertEqual(result.old.as_dict(), old.as_dict())
+
+    def test_control_only(self):
+        words = list(struct.iter_unpack('<QQ', self.data))
+        (lo, hi) = words[10]
+        # stall count, then the wait mask
+        words[10] = (lo, hi ^ 1 << 41)
+        (lo, hi) = words[20]
+        words[20] = (lo, hi ^ 1 << 52)
+        changed = struct.pack('<{}Q'.format(len(words) * 2), *(w for word in words for w in word))
+        result = diff.diff_functions(Function('_Z1fv', self.data), Function('_Z1fv', changed))
+        self.assertEqual(result.status, diff.FUNCTION_CHANGED)
+        self.assertEqual(result.hunks, [('equal', 0, 200, 0, 200)])
+        self.assertEqual((result.stalls_changed, result.barriers_changed), (1, 1))
+
+    def test_pair(self):
+        old = [Function('_Z1fv', self.data), Function('_Z1gv', self.data)]
+        new = [Function('_Z1hv', self.data), Function('_Z1fv', self.data)]
+        results = [diff.diff_functions(a, b) for (a, b) in diff.pair_functions(old, new)]
+        self.assertEqual([(r.name, r.status) for r in results], [
+            ('h()', 'added'), ('f()', 'identical'), ('g()', 'removed')])
+        self.assertEqual(results[0].new.instructions, 200)
+
+
+class TestSummary(unittest.TestCase):
+    def test_summary(self):
+        insts = [
+            Instruction(0, Control.from_fields(4, True, 0, 7, 0), None, 'LDC.64',
+                        [Register(6), Register(2)]),
+            Instruction(16, Control.from_fields(2, False, 7, 1, 1), None, 'MOV',
+                        [Register(4, uniform=True), Register(255)]),
+        ]
+        summary = diff.Summary(insts)
+        self.assertEqual(summary.as_dict(), {
+            'instructions': 2, 'stalls': 6, 'yields': 1, 'waits': 1, 'barriers': [0, 1],
+            'registers': 8, 'uniform_registers': 5})
@@ -0,0 +1,112 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import importlib.resources as pkg_resources
+import random
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.source
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import Control, Immediate, Instruction, Register, UnknownInstruction
+
+
+class TestEncode(unittest.TestCase):
+    pass
+
+
+def make_test(name):
+    def test(self):
+        pkg = __package__ + '.nv_turing'
+        with pkg_resources.path(pkg, '{}.cubin'.format(name)) as bin, \
+                pkg_resources.path(pkg, '{}.txt'.format(name)) as src:
+            data = bytes(gpu_uarch.nv.cubin.CuBin(bin).functions[0].data)
+            source = gpu_uarch.nv.source.SourceFile.load(src).parse()
+        self.assertEqual(turing.assemble(turing.disasm(data)), data)
+        self.assertEqual(turing.assemble(source), data)
+    return test
+
+
+for name in ['simple_o0', 'simple_o3']:
+    setattr(TestEncode, 'test_{}'.format(name), make_test(name))
+
+
+class TestEncodeWords(unittest.TestCase):
+    def test_random_words(self):
+        rng = random.Random(0)
+        opcodes = sorted({key & 0xff for key in range(0x1000) if turing._decoders[key]})
+        for _ in range(20000):
+            lo = (rng.getrandbits(64) & ~0xff) | rng.choice(opcodes)
+            hi = rng.getrandbits(64)
+            if lo & 0xff == 0x47:
+                # the branch offset is sign extended into hi
+                hi = (hi & ~0x3ffff) | (0x3ffff if lo >> 63 else 0)
+            inst = turing._parse_instruction(0x100, lo, hi)
+            if isinstance(inst, UnknownInstruction):
+                continue
+            self.assertEqual(turing.encode(inst, template=(lo, hi)), (lo, hi), inst)
+            self.assertEqual(turing._parse_instruction(0x100, *turing.encode(inst)), inst)
+
+    def test_branch_target(self):
+        ctrl = Control.from_fields(0, False, 7, 7, 0)
+        for target in [0x0, 0x100, 0x1000]:
+            inst = Instruction(0x100, ctrl, None, 'BRA', [Immediate(target)])
+            (lo, hi) = turing.encode(inst)
+            self.assertEqual(turing._parse_instruction(0x100, lo, hi).operands, [Immediate(target)])
+            self.assertEqual(hi & 0x3ffff, 0x3ffff if target <= 0x100 else 0)
+
+    def test_unknown_opcode(self):
+        ctrl = Control.from_fields(0, False, 7, 7, 0)
+        with self.assertRaisesRegex(Exception, 'Unknown opcode: FOO'):
+            turing.encode(Instruction(0, ctrl, None, 'FOO', []))
+        with self.assertRaisesRegex(Exception, 'Unsupported operands for MOV'):
+            turing.encode(Instruction(0, ctrl, None, 'MOV', [Immediate(1), Register(0)]))
+
+    def test_unknown_instruction(self):
+        (lo, hi) = (0x7933, 0x000fc00000000000)
+        inst = turing._parse_instruction(0, lo, hi)
+        with self.assertRaises(Exception):
+            turing.encode(inst)
+        self.assertEqual(turing.encode(inst, template=(lo, hi)), (lo, hi))
+
+
+class TestSplice(unittest.TestCase):
+    def test_splice(self):
+        pkg = __package__ + '.nv_turing'
+        with pkg_resources.path(pkg, 'simple_o3.cubin') as bin:
+            cubin = gpu_uarch.nv.cubin.CuBin(bin)
+        func = cubin.functions[0]
+        instructions = func.disasm()
+        self.assertEqual(cubin.splice({func.symbol: turing.assemble(instructions)}), cubin.image())
+
+        patched = gpu_uarch.nv.cubin.CuBin(cubin.splice({func.symbol: turing.assemble(instructions[:2])}))
+        result = patched.functions[0].disasm()
+        self.assertEqual(result[:2], instructions[:2])
+        self.assertEqual([inst.opcode for inst in result[2:]], ['NOP'] * (len(instructions) - 2))
+
+        with self.assertRaisesRegex(Exception, 'does not fit'):
+            cubin.splice({func.symbol: turing.assemble(instructions * 2)})
+        with self.assertRaisesRegex(Exception, 'Unknown function: foo'):
+            cubin.splice({'foo': b''})
+
+
+if __name__ == '__main__':
+    unittest.main()
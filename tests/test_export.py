@@ -0,0 +1,127 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import csv
+import importlib.resources as pkg_resources
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.export as export
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import InstructionTable
+
+
+def load(name):
+    pkg = __package__ + '.nv_turing'
+    with pkg_resources.path(pkg, '{}.cubin'.format(name)) as bin:
+        return gpu_uarch.nv.cubin.CuBin(bin).functions[0].data
+
+
+class TestExport(unittest.TestCase):
+    def test_jsonl(self):
+        data = struct.pack('<QQQQ', 0x0000000000007918, 0x000fc00000000000, 0x7933, 0)
+        records = [json.loads(line) for line in export.iter_jsonl(turing.disasm(data), 'f')]
+        self.assertEqual(records[0]['function'], 'f')
+        self.assertEqual(records[0]['opcode'], 'NOP')
+        self.assertEqual(records[0]['operands'], [])
+        self.assertIsNone(records[0]['error'])
+        self.assertIsNone(records[1]['opcode'])
+        self.assertEqual(records[1]['error'], 'Unknown opcode: 0x33')
+
+    def test_jsonl_operands(self):
+        for inst in turing.disasm(load('simple_o0')):
+            record = export.instruction_record(inst)
+            self.assertEqual(record['offset'], inst.offset)
+            self.assertEqual(record['opcode'], inst.opcode)
+            self.assertEqual(len(record['operands']), len(inst.operands))
+
+    def test_csv(self):
+        instructions = turing.disasm(load('simple_o3'))
+        text = export.csv_header() + ''.join(export.iter_csv(instructions, 'f'))
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(len(rows), len(instructions))
+        for (row, inst) in zip(rows, instructions):
+            self.assertEqual(int(row['offset']), inst.offset)
+            self.assertEqual(row['opcode'], inst.opcode)
+            self.assertEqual(int(row['stall']), inst.control.stall)
+
+    def test_columnar(self):
+        writer = export.ColumnarWriter()
+        expected = []
+        for name in ['simple_o0', 'simple_o3']:
+            instructions = turing.disasm(load(name))
+            writer.add(name, '_' + name, turing.disasm_table(load(name)))
+            expected.append(instructions)
+        writer.add('unknown', '_unknown', turing.disasm(struct.pack('<QQ', 0x7933, 0)))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'out.col')
+            with open(filename, 'wb') as f:
+                writer.save(f)
+            with export.load_columnar(filename) as col:
+                self.assertEqual([func[:2] for func in col.functions],
+                                 [('simple_o0', '_simple_o0'), ('simple_o3', '_simple_o3'),
+                                  ('unknown', '_unknown')])
+                self.assertEqual(col.function(0).instructions(), expected[0])
+                self.assertEqual(col.function(1).instructions(), expected[1])
+                self.assertEqual(str(col.function(2).instructions()[0].error),
+                                 'Unknown opcode: 0x33')
+
+    def test_columnar_close_with_live_functions(self):
+        writer = export.ColumnarWriter()
+        writer.add('simple_o3', '_simple_o3', turing.disasm_table(load('simple_o3')))
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'out.col')
+            with open(filename, 'wb') as f:
+                writer.save(f)
+            col = export.load_columnar(filename)
+            func = col.function(0)
+            col.close()
+            self.assertEqual(func.instructions(), turing.disasm(load('simple_o3')))
+            with self.assertRaises(ValueError):
+                col.table.columns['offset'][0]
+
+    def test_columnar_unknown_rows(self):
+        table = turing.disasm_table(struct.pack('<QQ', 0x7933, 0) * 1000)
+        data = export.dumps_columnar(table)
+        header = json.loads(data[16:16 + struct.unpack_from('<I', data, 12)[0]])
+        self.assertEqual(header['error_messages'], ['Unknown opcode: 0x33'])
+        self.assertIn('error_id', [column[0] for column in header['columns']])
+        (loaded, _) = export.loads_columnar(data)
+        self.assertEqual(str(loaded[999].instruction().error), 'Unknown opcode: 0x33')
+
+    def test_table_extend(self):
+        a = turing.disasm_table(load('simple_o0'))
+        b = turing.disasm_table(load('simple_o3'))
+        table = InstructionTable()
+        table.extend(b)
+        table.extend(a)
+        self.assertEqual(table[len(b):].instructions(), a.instructions())
+        self.assertEqual(table[:len(b)].instructions(), b.instructions())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import importlib.resources as pkg_resources
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.fatbin as fatbin
+from tests import synthetic
+
+EM_X86_64 = 62
+
+# Compressed with the lz4 reference library (lz4.block.compress(..., store_size=False)): overlapping
+# matches with distances 1, 3 and 10, and an extended match length.
+_LZ4_DATA = b'gpu_uarch ' * 3 + bytes(300) + b'abcabcabcabcabcab' + bytes(range(40))
+_LZ4_COMPRESSED = (b'\xafgpu_uarch \n\x00\x01\x1f\x00\x01\x00\xff\x19:abc\x03\x00\xf0\x19'
+                   + bytes(range(40)))
+
+
+def _lz4_length(n):
+    out = bytearray()
+    while n >= 0xff:
+        out.append(0xff)
+        n -= 0xff
+    out.append(n)
+    return out
+
+
+def _lz4_compress(data):
+    out = bytearray()
+    positions = {}
+    literal_start = pos = 0
+    while pos + 12 <= len(data):
+        key = data[pos:pos + 4]
+        match = positions.get(key)
+        positions[key] = pos
+        if match is None or pos - match > 0xffff:
+            pos += 1
+            continue
+        length = 4
+        while pos + length + 5 < len(data) and data[match + length] == data[pos + length]:
+            length += 1
+        literals = pos - literal_start
+        out.append(min(literals, 0xf) << 4 | min(length - 4, 0xf))
+        if literals >= 0xf:
+            out += _lz4_length(literals - 0xf)
+        out += data[literal_start:pos]
+        out += struct.pack('<H', pos - match)
+        if length - 4 >= 0xf:
+            out += _lz4_length(length - 4 - 0xf)
+        pos += length
+        literal_start = pos
+    literals = len(data) - literal_start
+    out.append(min(literals, 0xf) << 4)
+    if literals >= 0xf:
+        out += _lz4_length(literals - 0xf)
+    out += data[literal_start:]
+    return bytes(out)
+
+
+def _entry(kind, arch, payload, compress=False):
+    flags = fatbin.FLAG_64BIT
+    uncompressed = 0
+    if compress:
+        uncompressed = len(payload)
+        payload = _lz4_compress(payload)
+        flags |= fatbin.FLAG_COMPRESSED
+    padded = payload + b'\0' * (-len(payload) % 8)
+    header = struct.pack('<HHIQIIHHIIIQQQ', kind, 0x101, 64, len(padded), len(payload), 0, 3, 7,
+                         arch, 0, 0, flags, 0, uncompressed)
+    return header + padded
+
+
+def _fatbin(entries):
+    body = b''.join(entries)
+    return struct.pack('<IHHQ', fatbin.FATBIN_MAGIC, 1, 16, len(body)) + body
+
+
+class TestFatBin(unittest.TestCase):
+    def setUp(self):
+        with pkg_resources.path(__package__ + '.nv_turing', 'simple_o3.cubin') as bin:
+            with open(bin, 'rb') as f:
+                self.cubin = f.read()
+        self.fatbin = _fatbin([
+            _entry(fatbin.KIND_PTX, 75, b'.version 6.4\n.target sm_75\n'),
+            _entry(fatbin.KIND_ELF, 70, b'not a cubin'),
+            _entry(fatbin.KIND_ELF, 75, self.cubin, compress=True),
+            _entry(fatbin.KIND_ELF, 75, self.cubin),
+        ])
+        self.expected = gpu_uarch.nv.cubin.CuBin(self.cubin).functions[0].disasm()
+
+    def _write(self, data):
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(data)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def _check(self, cubins):
+        self.assertEqual(len(cubins), 2)
+        for cubin in cubins:
+            self.assertEqual([func.name for func in cubin.functions], ['kernel(int*, int, int)'])
+            self.assertEqual(cubin.functions[0].disasm(), self.expected)
+
+    def test_entries(self):
+        fb = fatbin.FatBin(self.fatbin)
+        self.assertEqual([(e.kind, e.arch, e.compressed) for e in fb.entries], [
+            (fatbin.KIND_PTX, 75, False), (fatbin.KIND_ELF, 70, False),
+            (fatbin.KIND_ELF, 75, True), (fatbin.KIND_ELF, 75, False)])
+        self.assertEqual(fb.entries[2].data(), self.cubin)
+        self._check(list(fb.cubins(arch=75)))
+
+    def test_raw_fatbin_file(self):
+        self._check(list(fatbin.iter_cubins(self._write(self.fatbin))))
+
+    def test_host_elf(self):
+        host = synthetic.make_elf([(b'.text', b'\xc3' * 16),
+                                   (b'.nv_fatbin', self.fatbin + bytes(8)),
+                                   (b'__nv_relfatbin', self.fatbin)], machine=EM_X86_64)
+        cubins = list(fatbin.iter_cubins(self._write(host)))
+        self.assertEqual(len(cubins), 4)
+        self._check(cubins[:2])
+
+    def test_lz4_reference(self):
+        # Force the fallback decoder even where the lz4 package is installed.
+        with mock.patch.dict(sys.modules, {'lz4': None, 'lz4.block': None}):
+            self.assertEqual(fatbin._lz4_decompress(_LZ4_COMPRESSED, len(_LZ4_DATA)), _LZ4_DATA)
+            self.assertEqual(fatbin._lz4_decompress(_lz4_compress(self.cubin), len(self.cubin)),
+                             self.cubin)
+            with self.assertRaises(Exception):
+                fatbin._lz4_decompress(_LZ4_COMPRESSED, len(_LZ4_DATA) + 1)
+
+    def test_no_matching_arch(self):
+        self.assertEqual(list(fatbin.FatBin(self.fatbin).cubins(arch=80)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
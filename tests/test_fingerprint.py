@@ -0,0 +1,77 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import importlib.util
+import struct
+import sys
+import unittest
+from unittest import mock
+
+import gpu_uarch.nv.fingerprint as fingerprint
+from tests import synthetic
+
+_NOP = struct.pack('<QQ', 0x7918, 0x3800000)
+
+
+def _mutate(data, rows, seed):
+    words = bytearray(data)
+    other = synthetic.instruction_stream(len(rows), seed)
+    for (index, row) in enumerate(rows):
+        words[row * 16:(row + 1) * 16] = other[index * 16:(index + 1) * 16]
+    return bytes(words)
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.a = synthetic.instruction_stream(400, seed=1)
+        self.b = synthetic.instruction_stream(400, seed=2)
+
+    def test_exact(self):
+        fp = fingerprint.fingerprint(self.a)
+        self.assertEqual(fp.instructions, 400)
+        padded = fingerprint.fingerprint(self.a + _NOP * 4)
+        self.assertEqual((padded.exact, padded.instructions), (fp.exact, 400))
+        self.assertNotEqual(fingerprint.fingerprint(self.b).exact, fp.exact)
+        self.assertNotEqual(fingerprint.fingerprint(_mutate(self.a, [7], 9)).exact, fp.exact)
+
+    def test_similarity(self):
+        fp = fingerprint.fingerprint(self.a)
+        self.assertEqual(fp.similarity(fp), 1.0)
+        self.assertGreater(fp.similarity(fingerprint.fingerprint(_mutate(self.a, [5, 200], 9))), 0.8)
+        self.assertLess(fp.similarity(fingerprint.fingerprint(self.b)), 0.2)
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy not available')
+    def test_signature_without_numpy(self):
+        expected = fingerprint.fingerprint(self.a).signature
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            self.assertEqual(fingerprint.fingerprint(self.a).signature, expected)
+
+    def test_cluster(self):
+        streams = [
+            self.a,
+            self.b,
+            _mutate(self.a, [10], 3),
+            self.a + _NOP,
+            _mutate(self.b, [100, 300], 4),
+            synthetic.instruction_stream(400, seed=5),
+        ]
+        fps = [fingerprint.fingerprint(data) for data in streams]
+        self.assertEqual(fingerprint.duplicates(fps), [[0, 3]])
+        self.assertEqual(sorted(fingerprint.cluster(fps)), [[0, 2, 3], [1, 4]])
@@ -0,0 +1,68 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.render
+import gpu_uarch.nv.turing as turing
+import gpu_uarch.theme
+import tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(tests.__file__)))
+CUBIN = os.path.join(ROOT, 'tests', 'nv_turing', 'simple_o3.cubin')
+GPU_ASM = os.path.join(ROOT, 'bin', 'gpu_asm.py')
+
+
+class TestGpuAsm(unittest.TestCase):
+    def test_cubin_templates(self):
+        cubin = gpu_uarch.nv.cubin.CuBin(CUBIN)
+        func = cubin.functions[0]
+        # A bit the decoder ignores: only the original words can bring it back.
+        words = [(lo, hi ^ 1 << 30) for (lo, hi) in func.words()]
+        image = cubin.splice({func.symbol: struct.pack('<{}Q'.format(len(words) * 2),
+                                                       *(w for word in words for w in word))})
+        instructions = gpu_uarch.nv.cubin.CuBin(image).functions[0].disasm()
+        self.assertNotEqual(cubin.splice({func.symbol: turing.assemble(instructions)}), image)
+
+        renderer = gpu_uarch.nv.render.Renderer(gpu_uarch.theme.NoTheme())
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ['patched.cubin', 'source.sass', 'out']]
+            with open(paths[0], 'wb') as f:
+                f.write(image)
+            with open(paths[1], 'w') as f:
+                f.writelines(line.split(None, 1)[1] + '\n' for line in renderer.lines(instructions))
+            env = dict(os.environ, PYTHONPATH=ROOT)
+            result = subprocess.run([sys.executable, GPU_ASM, paths[1], '-o', paths[2], '--cubin',
+                                     paths[0]], env=env, capture_output=True)
+            self.assertEqual(result.returncode, 0, result.stderr.decode())
+            with open(paths[2], 'rb') as f:
+                self.assertEqual(f.read(), image)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(tests.__file__)))
+CUBIN = os.path.join(ROOT, 'tests', 'nv_turing', 'simple_o3.cubin')
+GPU_DISASM = os.path.join(ROOT, 'bin', 'gpu_disasm.py')
+
+
+def _env(env=None):
+    env = dict(os.environ if env is None else env)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    return env
+
+
+def gpu_disasm(*args, env=None):
+    return subprocess.run([sys.executable, GPU_DISASM, '--no-colors'] + list(args),
+                          env=_env(env), capture_output=True)
+
+
+def progress_counts(stderr):
+    return [re.match(r'(.*): (\d+) functions, (\d+) instructions, (\d+) bytes in ', line).groups()
+            for line in stderr.decode().splitlines()]
+
+
+class TestGpuDisasm(unittest.TestCase):
+    def setUp(self):
+        self.expected = gpu_disasm('--jobs', '1', CUBIN).stdout
+
+    def test_cache_flag(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, XDG_CACHE_HOME=tmp)
+            # --cache takes no value, so the cubin that follows it is still an input.
+            result = gpu_disasm('--cache', CUBIN, env=env)
+            self.assertEqual(result.returncode, 0, result.stderr.decode())
+            self.assertEqual(result.stdout, self.expected)
+            self.assertNotEqual(os.listdir(tmp), [])
+
+    def test_cache_dir(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for _ in range(2):
+                result = gpu_disasm('--cache-dir', tmp, CUBIN)
+                self.assertEqual(result.stdout, self.expected)
+            self.assertNotEqual(os.listdir(tmp), [])
+            result = gpu_disasm('--cache-dir', tmp, '--stream', CUBIN)
+            self.assertNotEqual(result.returncode, 0)
+            self.assertIn(b'--cache cannot be combined with --stream', result.stderr)
+
+    def test_stats(self):
+        result = gpu_disasm('--stats', CUBIN)
+        self.assertEqual(result.stdout, self.expected)
+        self.assertIn(b'decode', result.stderr)
+        result = gpu_disasm('--stats', '--stats-format', 'json', CUBIN)
+        self.assertEqual(result.stdout, self.expected)
+        self.assertIn('stages', json.loads(result.stderr))
+
+    def test_negative_offset(self):
+        result = gpu_disasm('--offset=-0x20:', CUBIN)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn(b'negative offset', result.stderr)
+
+    def test_cbank(self):
+        result = gpu_disasm('--uses-cbank', CUBIN)
+        self.assertIn(b'c[0x0]', result.stdout)
+        self.assertEqual(gpu_disasm('--cbank', '0', CUBIN).stdout, result.stdout)
+        self.assertEqual(gpu_disasm('--cbank', '1', CUBIN).stdout, b'')
+
+    def test_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ['simple_o0.cubin', 'simple_o3.cubin']:
+                with open(os.path.join(ROOT, 'tests', 'nv_turing', name), 'rb') as src:
+                    with open(os.path.join(tmp, name), 'wb') as dst:
+                        dst.write(src.read())
+            files = [os.path.join(tmp, 'simple_o0.cubin'), os.path.join(tmp, 'simple_o3.cubin'),
+                     CUBIN, CUBIN]
+            for args in [[], ['--format', 'jsonl'], ['--format', 'csv']]:
+                serial = gpu_disasm('--jobs', '1', '--progress', *args, tmp, CUBIN, CUBIN)
+                pool = gpu_disasm('--jobs', '4', '--progress', *args, tmp, CUBIN, CUBIN)
+                self.assertEqual(pool.returncode, 0, pool.stderr.decode())
+                self.assertNotEqual(serial.stdout, b'')
+                self.assertEqual(pool.stdout, serial.stdout)
+                # Timings differ between runs, everything else must match.
+                counts = progress_counts(pool.stderr)
+                self.assertEqual([count[0] for count in counts], files)
+                self.assertEqual(counts, progress_counts(serial.stderr))
+
+    def test_cubin_opened_once(self):
+        for args in [[], ['--stream'], ['--format', 'jsonl', '--cache-dir', None]]:
+            with tempfile.TemporaryDirectory() as tmp:
+                args = [tmp if arg is None else arg for arg in args]
+                result = gpu_disasm('--stats', '--stats-format', 'json', *args, CUBIN)
+                self.assertEqual(json.loads(result.stderr)['stages']['elf']['calls'], 1)
+
+    def test_broken_pipe(self):
+        for args in [['--format', 'jsonl'], []]:
+            with subprocess.Popen([sys.executable, GPU_DISASM, '--no-colors', '--jobs', '1']
+                                  + args + [CUBIN] * 2000, env=_env(), stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE) as proc:
+                proc.stdout.readline()
+                proc.stdout.close()
+                self.assertEqual(proc.stderr.read(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import importlib.resources as pkg_resources
+import os
+import shutil
+import tempfile
+import unittest
+
+import gpu_uarch.nv.index as index
+from gpu_uarch.nv import Register, SpecialRegister
+from gpu_uarch.nv.index import Index, Match
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.files = {}
+        for name in ('simple_o0', 'simple_o3'):
+            with pkg_resources.path(__package__ + '.nv_turing', '{}.cubin'.format(name)) as bin:
+                self.files[name] = os.path.join(self.directory, name + '.cubin')
+                shutil.copy(bin, self.files[name])
+        self.index = Index(os.path.join(self.directory, 'index.sqlite'))
+        self.addCleanup(self.index.close)
+        self.assertEqual(self.index.update(self.files.values()), 2)
+
+    def _match(self, name, offset):
+        return Match(self.files[name], 'kernel(int*, int, int)', offset)
+
+    def test_incremental(self):
+        self.assertEqual(self.index.update(self.files.values()), 0)
+        copy = os.path.join(self.directory, 'copy.cubin')
+        shutil.copy(self.files['simple_o3'], copy)
+        self.assertEqual(self.index.update([copy]), 1)
+        counts = self.index.counts()
+        self.assertEqual((counts['files'], counts['functions'], counts['sections']), (3, 3, 2))
+
+        st = os.stat(self.files['simple_o0'])
+        os.utime(self.files['simple_o0'], ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertEqual(self.index.update(self.files.values()), 1)
+
+        os.remove(copy)
+        os.remove(self.files['simple_o3'])
+        self.index.prune()
+        counts = self.index.counts()
+        self.assertEqual((counts['files'], counts['functions'], counts['sections']), (1, 1, 1))
+        self.assertEqual(self.index.find(opcode='ULDC.64'), [])
+
+    def test_decoder_version(self):
+        self.index.close()
+        version = index.turing.DECODER_VERSION
+        index.turing.DECODER_VERSION = version + 1
+        self.addCleanup(setattr, index.turing, 'DECODER_VERSION', version)
+        self.index = Index(self.index.filename)
+        self.assertEqual(self.index.counts()['files'], 0)
+        self.assertEqual(self.index.update(self.files.values()), 2)
+
+    def test_find(self):
+        self.assertEqual(self.index.find(opcode='STG.E.SYS'),
+                         [self._match('simple_o0', 0x140), self._match('simple_o3', 0x40)])
+        self.assertEqual(self.index.find(opcode='ULDC.64', bank=0, min_address=0x160),
+                         [self._match('simple_o3', 0x20)])
+        self.assertEqual(self.index.find(opcode='ULDC.64', bank=0, min_address=0x161), [])
+        self.assertEqual(self.index.find(bank=0, min_address=0x168, max_address=0x16c),
+                         [self._match('simple_o3', 0x30)])
+        self.assertEqual(self.index.find(opcode='STG.E.SYS', register=Register(2)),
+                         [self._match('simple_o0', 0x140)])
+        self.assertEqual(self.index.find(register=SpecialRegister(0x2100)), [])
+        self.assertEqual(self.index.find(opcode='FOO'), [])
+
+    def test_find_sequence(self):
+        self.assertEqual(self.index.find_sequence(['LDC.64', 'MOV']),
+                         [self._match('simple_o0', 0x20)])
+        self.assertEqual(self.index.find_sequence(
+            ['IMAD', 'MOV', 'ULDC.64', 'IADD3', 'STG.E.SYS', 'EXIT']),
+            [self._match('simple_o3', 0)])
+        self.assertEqual(self.index.find_sequence(['IMAD', 'MOV', 'ULDC.64', 'IADD3', 'EXIT']), [])
+        self.assertEqual(self.index.find_sequence(['FOO']), [])
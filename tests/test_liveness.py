@@ -0,0 +1,106 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+import gpu_uarch.nv.source
+from gpu_uarch.nv import Control, Instruction, InstructionTable
+from gpu_uarch.nv.dataflow import UNIFORM_BASE
+from gpu_uarch.nv.liveness import Liveness, LiveRange, ReuseAnalysis
+
+
+def parse(lines):
+    return gpu_uarch.nv.source.SourceFile('\n'.join(lines)).parse()
+
+
+class TestLiveness(unittest.TestCase):
+    def test_straight_line(self):
+        liveness = Liveness(parse([
+            '--:-:-:-:1 MOV R0, 0x1',                   # 0
+            '--:-:-:-:1 MOV R1, 0x2',                   # 1
+            '--:-:-:-:1 IADD3 R2, R0, R1, RZ',          # 2
+            '--:-:-:-:1 ULDC.64 UR4, c[0x0][0x160]',    # 3
+            '--:-:-:-:1 STG.E.SYS [UR4], R2',           # 4
+            '--:-:-:-:1 EXIT',                          # 5
+        ]))
+        self.assertEqual(liveness.peak, (3, 2))
+        self.assertEqual(liveness.pressure_at(2), (3, 0))
+        self.assertEqual(liveness.pressure_at(5), (0, 0))
+        self.assertEqual(liveness.live_ranges(), {
+            0: [LiveRange(0, 0, 2)],
+            1: [LiveRange(1, 1, 2)],
+            2: [LiveRange(2, 2, 4)],
+            UNIFORM_BASE + 4: [LiveRange(UNIFORM_BASE + 4, 3, 4)],
+            UNIFORM_BASE + 5: [LiveRange(UNIFORM_BASE + 5, 3, 4)],
+        })
+
+    def test_loop(self):
+        liveness = Liveness(parse([
+            '--:-:-:-:1 MOV R0, 0x0',                   # 0  b0
+            '--:-:-:-:1 MOV R5, 0x0',                   # 1
+            '--:-:-:-:1 IADD3 R1, R0, R0, RZ',          # 2  b1 loop
+            '--:-:-:-:1 IADD3 R0, R1, R1, R5',          # 3
+            '--:-:-:-:1 P0 BRA 0x20',                   # 4
+            '--:-:-:-:1 STG.E.SYS [R2], R0',            # 5  b2
+            '--:-:-:-:1 EXIT',                          # 6
+        ]))
+        # R2 and R3 are live from the entry, R0 and R5 around the back edge.
+        self.assertEqual(liveness.live_in[1], (1 << 0) | (1 << 2) | (1 << 3) | (1 << 5))
+        ((loop, peak),) = liveness.loop_peaks()
+        self.assertEqual(loop.header, 1)
+        self.assertEqual(peak, (5, 0))
+
+    def test_predicated_def(self):
+        liveness = Liveness(parse([
+            '--:-:-:-:1 MOV R0, 0x1',
+            '--:-:-:-:1 P0 MOV R0, 0x2',
+            '--:-:-:-:1 STG.E.SYS [R2], R0',
+        ]))
+        self.assertEqual(liveness.live_ranges()[0], [LiveRange(0, 0, 2)])
+
+
+class TestReuse(unittest.TestCase):
+    def test_reuse(self):
+        lines = parse([
+            '--:-:-:-:1 IADD3 R0, R2, R3, RZ',
+            '--:-:-:-:1 IADD3 R1, R2, R4, RZ',
+            '--:-:-:-:1 IADD3 R5, R2, R4, RZ',
+            '--:-:-:-:1 EXIT',
+        ])
+        ctrl = lines[1].control
+        ctrl = Control.from_fields(ctrl.stall, ctrl.yield_hint, ctrl.wr_barrier, ctrl.rd_barrier,
+                                   ctrl.wait_mask, reuse_flags=0x1 | 0x4)
+        lines[1] = Instruction(lines[1].offset, ctrl, lines[1].predicate, lines[1].opcode,
+                               lines[1].operands)
+        reuse = ReuseAnalysis(lines)
+        self.assertEqual([(event.row, event.slot) for event in reuse.hits], [(1, 0)])
+        self.assertEqual([(event.row, event.slot) for event in reuse.wasted], [])
+        self.assertEqual([(event.row, event.slot) for event in reuse.opportunities],
+                         [(0, 0), (1, 1)])
+
+    def test_reuse_instruction_table(self):
+        lines = parse(['--:-:-:-:1 IADD3 R0, R2, R3, RZ', '--:-:-:-:1 IADD3 R1, R2, R4, RZ'])
+        reuse = ReuseAnalysis(InstructionTable.from_instructions(lines))
+        self.assertEqual([(event.row, event.slot) for event in reuse.opportunities], [(0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import pickle
+import unittest
+
+from gpu_uarch.nv import (Register, Immediate, Predicate, SpecialRegister, ConstantMemory,
+                          Memory, Control, parse_register)
+
+
+class TestOperands(unittest.TestCase):
+    def test_interned(self):
+        self.assertIs(Register(5), Register(5))
+        self.assertIs(Register(63, uniform=True), Register(63, uniform=True))
+        self.assertIs(Predicate(3, negated=True), Predicate(3, negated=True))
+        self.assertIs(Immediate(0x160), Immediate(0x160))
+        self.assertIs(SpecialRegister(0x2100), SpecialRegister(0x2100))
+        self.assertIs(Control(0x3fde0000000f00), Control(0x3fde0000000f00))
+
+    def test_immutable(self):
+        reg = Register(1)
+        with self.assertRaises(AttributeError):
+            reg.reuse = True
+        with self.assertRaises(AttributeError):
+            Control(0).stall = 1
+        self.assertEqual(reg.with_reuse(), Register(1, reuse=True))
+        self.assertFalse(reg.reuse)
+
+    def test_hashable(self):
+        ops = [Register(1), Register(1, uniform=True), Immediate(4), Predicate(0),
+               SpecialRegister(0x5000), ConstantMemory(Immediate(0), Immediate(0x160)),
+               Memory(Register(2), Immediate(4)), Control.parse(['01', '-', '0', 'Y', '5'])]
+        self.assertEqual(len(set(ops + ops)), len(ops))
+        self.assertEqual(hash(Memory(Register(2), Immediate(4))),
+                         hash(Memory(Register(2), Immediate(4))))
+
+    def test_pickle(self):
+        ops = [Register(7, reuse=True), Immediate(-0x12345678), Predicate(7, True),
+               ConstantMemory(Immediate(0), Register(3)), Memory(Register(4, True), Immediate(8)),
+               Control.parse(['05', '2', '1', '-', 'f'])]
+        for op in ops:
+            self.assertEqual(pickle.loads(pickle.dumps(op)), op)
+
+    def test_control_parse(self):
+        ctrl = Control.parse(['03', '1', '0', 'Y', 'f'])
+        self.assertEqual((ctrl.wait_mask, ctrl.rd_barrier, ctrl.wr_barrier, ctrl.yield_hint,
+                          ctrl.stall, ctrl.reuse_flags), (3, 1, 0, True, 0xf, 0))
+
+    def test_parse_register(self):
+        self.assertEqual(parse_register('R2'), Register(2))
+        self.assertEqual(parse_register('URZ'), Register(63, uniform=True))
+        self.assertEqual(parse_register('SR_CLOCKLO'), SpecialRegister(0x5000))
+        with self.assertRaises(ValueError):
+            parse_register('P0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import importlib.resources as pkg_resources
+import io
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.render as render
+import gpu_uarch.nv.source as source
+import gpu_uarch.nv.turing as turing
+import gpu_uarch.theme
+
+
+class TestRenderer(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(gpu_uarch.theme.set_theme, gpu_uarch.theme.get_theme())
+        with pkg_resources.path(__package__ + '.nv_turing', 'simple_o0.cubin') as bin:
+            self.data = gpu_uarch.nv.cubin.CuBin(bin).functions[0].data
+        self.instructions = turing.disasm(self.data + b'\x33' * 16)
+
+    def test_no_theme(self):
+        inst = source.SourceFile('03:1:0:Y:f !P0 STG.E.SYS [R1+4], c[0x0][0x160]').parse()[0]
+        self.assertEqual(render.Renderer(gpu_uarch.theme.NoTheme()).instruction(inst),
+                         '0x00000000  03:1:0:Y:f  !P0 STG.E.SYS [R1+0x4], c[0x0][0x160]')
+
+    def test_solarized_theme(self):
+        inst = source.SourceFile('--:-:0:-:8 P1 MOV UR4, RZ').parse()[0]
+        self.assertEqual(
+            render.Renderer(gpu_uarch.theme.SolarizedTheme()).instruction(inst),
+            '\x1b[38;2;88;110;117m0x00000000\x1b[0m  \x1b[38;2;88;110;117m--\x1b[38;2;38;139;210m:'
+            '\x1b[38;2;88;110;117m-\x1b[38;2;38;139;210m:\x1b[38;2;181;137;0m0'
+            '\x1b[38;2;38;139;210m:\x1b[38;2;88;110;117m-\x1b[38;2;38;139;210m:'
+            '\x1b[38;2;181;137;0m8\x1b[0m   \x1b[38;2;42;161;152mP1\x1b[0m '
+            '\x1b[38;2;211;54;130mMOV\x1b[0m \x1b[38;2;108;113;196mUR4\x1b[0m'
+            '\x1b[38;2;38;139;210m,\x1b[0m \x1b[38;2;108;113;196mRZ\x1b[0m')
+
+    def test_matches_repr(self):
+        for theme in [gpu_uarch.theme.NoTheme(), gpu_uarch.theme.SolarizedTheme()]:
+            gpu_uarch.theme.set_theme(theme)
+            renderer = render.get_renderer()
+            self.assertIs(renderer.theme, theme)
+            self.assertEqual(renderer.render(self.instructions),
+                             ''.join(repr(inst) + '\n' for inst in self.instructions))
+            self.assertEqual(renderer.render(turing.disasm_table(self.data)),
+                             renderer.render(self.instructions[:-1]))
+
+    def test_write_chunks(self):
+        renderer = render.Renderer(gpu_uarch.theme.NoTheme())
+        out = io.StringIO()
+        self.assertEqual(renderer.write(out, self.instructions, chunk_size=7),
+                         len(self.instructions))
+        self.assertEqual(out.getvalue(), renderer.render(self.instructions))
+
+
+if __name__ == '__main__':
+    unittest.main()
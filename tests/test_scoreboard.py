@@ -0,0 +1,110 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+import gpu_uarch.nv.source
+from gpu_uarch.nv import InstructionTable
+from gpu_uarch.nv.scoreboard import (analyze, Dependency, DEP_BARRIER, DEP_RAW, DEP_WAR,
+                                     ISSUE_UNWAITED_BARRIER, ISSUE_UNNEEDED_WAIT, ISSUE_EARLY_WAIT,
+                                     ISSUE_MISSING_WAIT)
+
+
+def build(lines):
+    return analyze(gpu_uarch.nv.source.SourceFile('\n'.join(lines)).parse())
+
+
+def issues(analysis):
+    return [(issue.kind, issue.row, issue.barrier, issue.related) for issue in analysis.issues]
+
+
+class TestScoreboard(unittest.TestCase):
+    def test_matched_wait(self):
+        analysis = build([
+            '--:-:0:-:1 LDC R2, c[0x0][0x10]',
+            '01:-:-:-:1 IADD3 R0, R2, R2, RZ',
+        ])
+        self.assertEqual(analysis.issues, [])
+        self.assertEqual(analysis.waiters, {0: [1]})
+        self.assertIn(Dependency(0, 1, DEP_BARRIER, 0), analysis.dependencies)
+        self.assertIn(Dependency(0, 1, DEP_RAW, 2), analysis.dependencies)
+
+    def test_unwaited_barrier(self):
+        analysis = build(['--:-:2:-:1 LDC R2, c[0x0][0x10]', '--:-:-:-:1 EXIT'])
+        self.assertEqual(issues(analysis), [(ISSUE_UNWAITED_BARRIER, 0, 2, None)])
+
+    def test_unneeded_wait(self):
+        analysis = build(['02:-:-:-:1 NOP'])
+        self.assertEqual(issues(analysis), [(ISSUE_UNNEEDED_WAIT, 0, 1, None)])
+
+    def test_early_wait(self):
+        analysis = build([
+            '--:-:0:-:1 LDC R2, c[0x0][0x10]',
+            '01:-:-:-:1 MOV R5, R6',
+            '--:-:-:-:1 NOP',
+            '--:-:-:-:1 MOV R7, R2',
+        ])
+        self.assertEqual(issues(analysis), [(ISSUE_EARLY_WAIT, 1, 0, 3)])
+
+    def test_early_wait_never_needed(self):
+        analysis = build(['--:-:0:-:1 LDC R2, c[0x0][0x10]', '01:-:-:-:1 EXIT'])
+        self.assertEqual(issues(analysis), [(ISSUE_EARLY_WAIT, 1, 0, None)])
+
+    def test_missing_wait(self):
+        analysis = build([
+            '--:-:0:-:1 LDC.64 R2, c[0x0][0x10]',
+            '--:-:-:-:1 MOV R0, R3',
+            '01:-:-:-:1 EXIT',
+        ])
+        self.assertEqual(issues(analysis), [(ISSUE_MISSING_WAIT, 1, 0, 0),
+                                            (ISSUE_EARLY_WAIT, 2, 0, None)])
+
+    def test_read_barrier(self):
+        analysis = build([
+            '--:1:-:-:1 STG.E.SYS [R2], R0',
+            '--:-:-:-:1 MOV R4, R0',
+            '02:-:-:-:1 MOV R0, 0x1',
+        ])
+        self.assertEqual(analysis.issues, [])
+        self.assertIn(Dependency(0, 2, DEP_WAR, 0), analysis.dependencies)
+        self.assertEqual(analysis.waiters, {0: [2]})
+
+    def test_multiple_producers(self):
+        analysis = build([
+            '--:-:0:-:1 LDC R2, c[0x0][0x10]',
+            '--:-:0:-:1 LDC R3, c[0x0][0x14]',
+            '01:-:-:-:1 IADD3 R0, R2, R3, RZ',
+        ])
+        self.assertEqual(analysis.issues, [])
+        self.assertEqual(analysis.waiters, {0: [2], 1: [2]})
+
+    def test_instruction_table(self):
+        lines = gpu_uarch.nv.source.SourceFile('\n'.join([
+            '--:-:0:-:1 LDC R2, c[0x0][0x10]',
+            '01:-:-:-:1 IADD3 R0, R2, R2, RZ',
+        ])).parse()
+        analysis = analyze(InstructionTable.from_instructions(lines))
+        self.assertEqual(analysis.instructions, lines)
+        self.assertEqual(analysis.waiters, {0: [1]})
+
+
+if __name__ == '__main__':
+    unittest.main()
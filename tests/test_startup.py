@@ -0,0 +1,79 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import subprocess
+import sys
+import unittest
+
+import tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(tests.__file__)))
+CUBIN = os.path.join(ROOT, 'tests', 'nv_turing', 'simple_o3.cubin')
+GPU_DISASM = os.path.join(ROOT, 'bin', 'gpu_disasm.py')
+
+# Cumulative import time of the gpu_uarch package, with bytecode already compiled. The budget is
+# generous on purpose: it is meant to catch a heavy dependency sneaking back into the import path,
+# not to benchmark the machine.
+IMPORT_BUDGET_US = 100000
+
+
+def _importtime(args):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    cmd = [sys.executable, '-X', 'importtime'] + args
+    # The first run compiles bytecode, the second one is measured.
+    subprocess.run(cmd, env=env, capture_output=True)
+    result = subprocess.run(cmd, env=env, capture_output=True)
+    assert result.returncode == 0, result.stderr.decode()
+
+    modules = {}
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        (_, cumulative, name) = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+class TestStartup(unittest.TestCase):
+    def test_binary_disassembly_imports(self):
+        modules = _importtime(['-c', 'import gpu_uarch.nv.cubin, gpu_uarch.nv.turing'])
+        for name in ['lark', 'sty', 'cxxfilt', 'elftools.elf.elffile', 'numpy']:
+            self.assertNotIn(name, modules)
+        self.assertLess(modules['gpu_uarch.nv.cubin'], IMPORT_BUDGET_US)
+
+    def test_gpu_disasm_no_colors_imports(self):
+        # A single function is disassembled in-process whatever --jobs is.
+        modules = _importtime([GPU_DISASM, '--no-colors', '--jobs', '8', CUBIN])
+        for name in ['lark', 'sty', 'numpy', 'concurrent.futures']:
+            self.assertNotIn(name, modules)
+
+    def test_gpu_disasm_colors_imports(self):
+        modules = _importtime([GPU_DISASM, CUBIN])
+        self.assertIn('sty', modules)
+        self.assertNotIn('lark', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
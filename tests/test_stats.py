@@ -0,0 +1,83 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import unittest
+
+import gpu_uarch.nv.stats as stats
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv.stats import Stats
+
+# MOV R1, c[0x0][0x28] followed by a word with an unknown opcode.
+_MOV = bytes.fromhex('027a0100000a0000000f000000de3f00')
+_UNKNOWN = bytes.fromhex('ff000000000000000000000000de3f00')
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        stats.disable()
+        self.addCleanup(stats.disable)
+
+    def test_disabled(self):
+        self.assertIsNone(stats.current())
+        turing.disasm(_MOV)
+        self.assertIsNone(stats.current())
+
+    def test_disasm(self):
+        collector = stats.enable()
+        self.assertIs(stats.enable(), collector)
+        turing.disasm(_MOV * 3)
+        decode = collector.stages['decode']
+        self.assertEqual((decode.calls, decode.bytes, decode.instructions), (1, 48, 3))
+        self.assertEqual(collector.opcodes, {'MOV': 3})
+
+    def test_iter_disasm(self):
+        collector = stats.enable()
+        it = turing.iter_disasm(_MOV * 2)
+        next(it)
+        self.assertNotIn('decode', collector.stages)
+        list(it)
+        self.assertEqual(collector.stages['decode'].instructions, 2)
+        self.assertEqual(collector.opcodes, {'MOV': 2})
+
+    def test_disasm_table(self):
+        collector = stats.enable()
+        turing.disasm_table(_MOV + _UNKNOWN)
+        self.assertEqual(collector.stages['decode'].instructions, 2)
+        self.assertEqual(collector.stages['table'].instructions, 2)
+        self.assertEqual(collector.opcodes, {'MOV': 1})
+        self.assertEqual(sum(collector.unknown.values()), 1)
+
+    def test_merge_take(self):
+        a = Stats()
+        a.record('decode', 1.0, 16, 1)
+        a.opcodes['MOV'] += 1
+        b = Stats()
+        b.record('decode', 0.5, 32, 2)
+        b.record('render', 0.25)
+        b.opcodes['MOV'] += 2
+        b.unknown['Unknown opcode: 0xff'] += 1
+        a.merge(b.take())
+        self.assertEqual(b.as_dict(), {'stages': {}, 'opcodes': {}, 'unknown': {}})
+        self.assertEqual(a.stages['decode'].as_dict(),
+                         {'calls': 2, 'seconds': 1.5, 'bytes': 48, 'instructions': 3})
+        self.assertEqual(a.stages['render'].calls, 1)
+        self.assertEqual(a.opcodes, {'MOV': 3})
+        self.assertEqual(Stats.from_dict(a.as_dict()).as_dict(), a.as_dict())
+        self.assertIn('decode', a.format_table())
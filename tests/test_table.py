@@ -0,0 +1,98 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import importlib.resources as pkg_resources
+import struct
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.source
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import InstructionTable, UnknownInstruction
+
+
+class TestInstructionTable(unittest.TestCase):
+    pass
+
+
+def make_test(name):
+    def test(self):
+        pkg = __package__ + '.nv_turing'
+        with pkg_resources.path(pkg, '{}.cubin'.format(name)) as bin:
+            data = gpu_uarch.nv.cubin.CuBin(bin).functions[0].data
+        expected = turing.disasm(data)
+        table = turing.disasm_table(data)
+        self.assertEqual(len(table), len(expected))
+        self.assertEqual(table.instructions(), expected)
+        self.assertEqual([view.opcode for view in table], [inst.opcode for inst in expected])
+        self.assertEqual(table[-1].instruction(), expected[-1])
+        self.assertEqual(table[1:-1:2].instructions(), expected[1:-1:2])
+    return test
+
+
+for name in ['simple_o0', 'simple_o3']:
+    setattr(TestInstructionTable, 'test_{}'.format(name), make_test(name))
+
+
+class TestInstructionTableRows(unittest.TestCase):
+    def test_unknown_instruction(self):
+        table = turing.disasm_table(struct.pack('<QQQQ', 0x7918, 0, 0x7933, 0))
+        self.assertFalse(table[1].known)
+        self.assertIsNone(table[1].opcode)
+        inst = table[1:][0].instruction()
+        self.assertIsInstance(inst, UnknownInstruction)
+        self.assertEqual(str(inst.error), 'Unknown opcode: 0x33')
+
+    def test_unknown_errors_interned(self):
+        words = [0x7933, 0, 0x7918, 0, 0x7933, 0, 0x7934, 0]
+        table = turing.disasm_table(struct.pack('<8Q', *words))
+        table.extend(turing.disasm_table(struct.pack('<4Q', 0x7934, 0, 0x7933, 0)))
+        self.assertEqual(table.error_messages, ['Unknown opcode: 0x33', 'Unknown opcode: 0x34'])
+        self.assertEqual(list(table.columns['error_id']), [0, 0, 0, 1, 1, 0])
+        self.assertIs(table[0].instruction().error, table[2].instruction().error)
+        self.assertEqual(str(table[4].instruction().error), 'Unknown opcode: 0x34')
+
+    def test_source_operands(self):
+        src = '\n'.join([
+            '--:-:0:Y:1 !P0 STG.E.SYS [R1+4], R0',
+            '--:-:-:-:4 MOV R0, c[0x0][R2]',
+            '--:-:-:-:4 MOV R0, [0x10]',
+        ])
+        expected = gpu_uarch.nv.source.SourceFile(src).parse()
+        table = InstructionTable.from_instructions(expected)
+        self.assertEqual(table.instructions(), expected)
+
+    def test_append_after_slice(self):
+        table = turing.disasm_table(struct.pack('<QQQQ', 0x7918, 0, 0x7933, 0))
+        head = table[:1]
+        table.append(head[0].instruction())
+        table.extend(head)
+        self.assertEqual([view.opcode for view in table], ['NOP', None, 'NOP', 'NOP'])
+        self.assertEqual(len(head), 1)
+
+    def test_index_out_of_range(self):
+        with self.assertRaises(IndexError):
+            InstructionTable()[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+import gpu_uarch.nv.source
+from gpu_uarch.nv import InstructionTable
+from gpu_uarch.nv.cfg import ControlFlowGraph
+from gpu_uarch.nv.timing import Latencies, Latency, simulate
+
+
+def parse(lines):
+    return gpu_uarch.nv.source.SourceFile('\n'.join(lines)).parse()
+
+
+class TestTiming(unittest.TestCase):
+    def test_stall_only(self):
+        timeline = simulate(parse(['--:-:-:-:4 NOP', '--:-:-:-:2 NOP', '--:-:-:-:0 EXIT']))
+        self.assertEqual([event.cycle for event in timeline.events], [0, 4, 6])
+        self.assertEqual(timeline.cycles, 7)
+        self.assertEqual(timeline.stalls, {'stall': 7})
+        self.assertEqual(timeline.critical_path, [0, 1, 2])
+
+    def test_barrier_wait(self):
+        latencies = Latencies({'LDC': Latency(30, 2)})
+        timeline = simulate(parse([
+            '--:-:-:-:1 MOV R0, 0x1',
+            '--:-:0:-:1 LDC R2, c[0x0][0x10]',
+            '--:-:-:-:1 NOP',
+            '01:-:-:-:1 MOV R3, R2',
+        ]), latencies)
+        self.assertEqual([event.cycle for event in timeline.events], [0, 1, 2, 31])
+        self.assertEqual(timeline.events[3].cause, 'barrier0')
+        self.assertEqual(timeline.stalls, {'stall': 4, 'barrier0': 28})
+        self.assertEqual(timeline.cycles, 32)
+        self.assertEqual(timeline.critical_path, [0, 1, 3])
+
+    def test_unwaited_barrier_drains(self):
+        timeline = simulate(parse(['--:-:1:-:1 LDC.64 R2, c[0x0][0x10]', '--:-:-:-:1 EXIT']),
+                            Latencies({'LDC': Latency(10, 2)}))
+        self.assertEqual(timeline.cycles, 10)
+        self.assertEqual(timeline.stalls, {'stall': 2, 'barrier1': 8})
+        self.assertEqual(timeline.critical_path, [0])
+
+    def test_read_barrier(self):
+        timeline = simulate(parse([
+            '--:0:-:-:1 STG.E.SYS [R2], R0',
+            '01:-:-:-:1 MOV R0, 0x0',
+        ]), Latencies({'STG': Latency(4, 6)}))
+        self.assertEqual(timeline.events[1].cycle, 6)
+
+    def test_yield_penalty(self):
+        timeline = simulate(parse(['--:-:-:Y:1 NOP', '--:-:-:-:1 NOP']), yield_penalty=3)
+        self.assertEqual(timeline.events[1].cycle, 4)
+        self.assertEqual(timeline.stalls['yield'], 3)
+
+    def test_basic_block(self):
+        cfg = ControlFlowGraph(parse(['--:-:-:-:2 NOP', '--:-:-:-:3 P0 BRA 0x0', '--:-:-:-:1 EXIT']))
+        timeline = simulate(cfg.blocks[0])
+        self.assertEqual(timeline.cycles, 5)
+        self.assertEqual(timeline.as_dict()['critical_path'], [0x0, 0x10])
+
+    def test_instruction_table(self):
+        lines = parse(['--:-:-:-:4 NOP', '--:-:-:-:2 NOP', '--:-:-:-:0 EXIT'])
+        timeline = simulate(InstructionTable.from_instructions(lines))
+        self.assertEqual(timeline.as_dict(), simulate(lines).as_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#
+# Copyright © 2019 Paweł Dziepak
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import importlib.resources as pkg_resources
+import importlib.util
+import struct
+import unittest
+
+import gpu_uarch.nv.cubin
+import gpu_uarch.nv.turing as turing
+from gpu_uarch.nv import (Instruction, UnknownInstruction, Register, Control,
+                          ConstantMemory, Immediate)
+
+
+def _words(*words):
+    return b''.join(struct.pack('<QQ', lo, hi) for (lo, hi) in words)
+
+
+class TestNvTuringDecoder(unittest.TestCase):
+    def test_unknown_opcode(self):
+        [inst] = turing.disasm(_words((0x7933, 0x3fde0000000f00)))
+        self.assertIsInstance(inst, UnknownInstruction)
+        self.assertEqual(str(inst.error), 'Unknown opcode: 0x33')
+
+    def test_unknown_operand_pattern(self):
+        [inst] = turing.disasm(_words((0x7c02, 0x3fde0000000f00)))
+        self.assertIsInstance(inst, UnknownInstruction)
+        self.assertEqual(str(inst.error), 'Unknown operand pattern: 0xc00')
+
+    def test_ldc_64(self):
+        [inst] = turing.disasm(_words((0x27a82, 0x321e0000000a00)))
+        self.assertEqual(inst, Instruction(0, Control(0x321e0000000a00), None, 'LDC.64', [
+            Register(2), ConstantMemory(Immediate(0), Immediate(0))]))
+
+    def test_wide_bit(self):
+        # Only LDC and ULDC have a wide form, other opcodes ignore the bit.
+        data = _words((0x27a82, 0x321e0000000800), (0x27a82, 0x321e0000000a00),
+                      (0x7802, 0x200), (0x7802, 0))
+        self.assertEqual([inst.opcode for inst in turing.disasm(data)],
+                         ['LDC', 'LDC.64', 'MOV', 'MOV'])
+        self.assertEqual([view.opcode for view in turing.disasm_table(data)],
+                         ['LDC', 'LDC.64', 'MOV', 'MOV'])
+
+    def test_umov(self):
+        [inst] = turing.disasm(_words((0x16000047882, 0x321e0000000a00)))
+        self.assertEqual(inst, Instruction(0, Control(0x321e0000000a00), None, 'UMOV', [
+            Register(4, uniform=True), Immediate(0x160)]))
+
+    def test_iter_disasm(self):
+        data = _words((0x794d, 0), (0x7918, 0), (0x7933, 0))
+        it = turing.iter_disasm(data)
+        self.assertEqual(next(it).opcode, 'EXIT')
+        self.assertEqual([inst.offset for inst in it], [0x10, 0x20])
+        self.assertEqual(list(turing.iter_disasm(data[:32])), turing.disasm(data[:32]))
+
+    def test_bra_target(self):
+        insts = turing.disasm(_words((0x7918, 0), (0xfffffff000007947, 0)))
+        self.assertEqual(insts[1].operands, [Immediate(0x10)])
+
+    def test_decode_cache(self):
+        turing.clear_decode_cache()
+        bra = (0xfffffff000007947, 0)
+        insts = turing.disasm(_words(bra, (0x7918, 0), bra, bra))
+        self.assertEqual([inst.operands for inst in insts if inst.opcode == 'BRA'],
+                         [[Immediate(0)], [Immediate(0x20)], [Immediate(0x30)]])
+        info = turing.decode_cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 2))
+        insts[0].operands.append(Immediate(1))
+        self.assertEqual(turing.disasm(_words(bra))[0].operands, [Immediate(0)])
+
+    def test_decode_word(self):
+        self.assertEqual(turing.decode_word(0xfffffff000007947, 0),
+                         (Control(0), None, 'BRA', (Immediate(0),)))
+        self.assertEqual(turing.decode_word(0x27a82, 0x321e0000000a00)[2:],
+                         ('LDC.64', (Register(2), ConstantMemory(Immediate(0), Immediate(0)))))
+        self.assertEqual(turing.decode_word(0x7933, 0)[2:], (None, ()))
+
+    def test_decoder_keys(self):
+        keys = set(turing.decoder_keys())
+        self.assertIn((0xa82, True), keys)
+        self.assertIn((0xa82, False), keys)
+        self.assertNotIn((0xc02, False), keys)
+        self.assertNotIn((0x33, False), keys)
+        for (key, wide) in keys:
+            self.assertIsNotNone(turing.decode_word(key, 0x200 if wide else 0)[2])
+
+    def test_decode_cache_bypass(self):
+        turing.clear_decode_cache()
+        data = _words(*((0x7802 | i << 32, 0) for i in range(turing._DECODE_PROBE * 2)))
+        insts = turing.disasm(data)
+        self.assertEqual(insts[-1].operands, [Register(0), Immediate(turing._DECODE_PROBE * 2 - 1)])
+        self.assertEqual(turing.decode_cache_info().misses, turing._DECODE_PROBE)
+
+
+class TestWordFilter(unittest.TestCase):
+    def setUp(self):
+        with pkg_resources.path(__package__ + '.nv_turing', 'simple_o0.cubin') as bin:
+            self.data = gpu_uarch.nv.cubin.CuBin(bin).functions[0].data
+        self.expected = turing.disasm(self.data)
+
+    def _check(self, where, predicate):
+        expected = [inst for inst in self.expected if predicate(inst)]
+        self.assertTrue(expected)
+        self.assertEqual(turing.disasm(self.data, where), expected)
+        self.assertEqual(list(turing.iter_disasm(self.data, where)), expected)
+        self.assertEqual(turing.disasm_table(self.data, where).instructions(), expected)
+
+    def test_opcode(self):
+        self._check(turing.WordFilter(opcodes=['LDC', 'BRA']),
+                    lambda inst: inst.opcode in ('LDC', 'LDC.64', 'BRA'))
+        self._check(turing.WordFilter(opcodes=['LDC.64']), lambda inst: inst.opcode == 'LDC.64')
+        self.assertEqual(turing.disasm(self.data, turing.WordFilter(opcodes=['LD'])), [])
+
+    def test_register(self):
+        def uses(inst, reg):
+            return any(op == reg or getattr(op, 'address', None) == reg for op in inst.operands)
+
+        self._check(turing.WordFilter(registers=[Register(2)]), lambda inst: uses(inst, Register(2)))
+        self._check(turing.WordFilter(opcodes=['MOV'], registers=[Register(2), Register(4)]),
+                    lambda inst: inst.opcode == 'MOV' and (uses(inst, Register(2))
+                                                           or uses(inst, Register(4))))
+
+    def test_cbank(self):
+        def constant(inst, bank=0):
+            return any(isinstance(op, ConstantMemory) and op.bank.value == bank for op in inst.operands)
+
+        self._check(turing.WordFilter(cbank=True), constant)
+        self._check(turing.WordFilter(cbank=0), constant)
+        self.assertEqual(turing.disasm(self.data, turing.WordFilter(cbank=1)), [])
+
+    def test_offsets(self):
+        where = turing.WordFilter(offsets=[(0x40, 0x58), (None, 0x10), (0x50, 0x60), (0x170, None)])
+        self.assertEqual(where.spans(len(self.data)), [(0, 0x10), (0x40, 0x60), (0x170, 0x180)])
+        self._check(where, lambda inst: inst.offset in (0, 0x40, 0x50, 0x170))
+        self._check(turing.WordFilter(opcodes=['MOV'], offsets=[(0x40, None)]),
+                    lambda inst: inst.opcode == 'MOV' and inst.offset >= 0x40)
+        self._check(turing.WordFilter(offsets=[(0x18, 0x21)]),
+                    lambda inst: inst.offset in (0x10, 0x20))
+        with self.assertRaises(Exception):
+            turing.disasm(self.data, turing.WordFilter(offsets=[(-0x20, None)]))
+
+
+@unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy not available')
+class TestNvTuringBatchDecoder(unittest.TestCase):
+    def _check(self, name):
+        with pkg_resources.path(__package__ + '.nv_turing', '{}.cubin'.format(name)) as bin:
+            data = gpu_uarch.nv.cubin.CuBin(bin).functions[0].data
+        expected = turing.disasm(data)
+        batch = turing.disasm_batch(data)
+        self.assertEqual(len(batch), len(expected))
+        self.assertEqual(batch.instructions(), expected)
+        for (i, inst) in enumerate(expected):
+            self.assertEqual(batch.opcode_names[batch.opcode_id[i]], inst.opcode)
+            self.assertEqual(batch.stall[i], inst.control.stall)
+            self.assertEqual(batch.yield_hint[i], inst.control.yield_hint)
+            self.assertEqual(batch.wr_barrier[i], inst.control.wr_barrier)
+            self.assertEqual(batch.rd_barrier[i], inst.control.rd_barrier)
+            self.assertEqual(batch.wait_mask[i], inst.control.wait_mask)
+        table = turing.disasm_table(data)
+        self.assertEqual(batch.predicate.tolist(), list(table.columns['predicate']))
+        self.assertEqual(batch.predicate_negated.tolist(),
+                         [bool(v) for v in table.columns['predicate_negated']])
+        self.assertEqual(batch[1:-1:2], expected[1:-1:2])
+        self.assertEqual(batch[-1], expected[-1])
+
+    def test_simple_o0(self):
+        self._check('simple_o0')
+
+    def test_simple_o3(self):
+        self._check('simple_o3')
+
+    def test_wide_bit(self):
+        batch = turing.disasm_batch(_words((0x27a82, 0x800), (0x27a82, 0xa00), (0x7802, 0x200)))
+        self.assertEqual([batch.opcode_names[i] for i in batch.opcode_id], ['LDC', 'LDC.64', 'MOV'])
+
+    def test_predicate(self):
+        batch = turing.disasm_batch(_words((0x7918, 0), (0xb918, 0), (0x7933, 0)))
+        self.assertEqual(batch.predicate.tolist(), [-1, 3, -1])
+        self.assertEqual(batch.predicate_negated.tolist(), [False, True, False])
+
+    def test_unknown(self):
+        batch = turing.disasm_batch(_words((0x7933, 0)))
+        self.assertFalse(batch.known[0])
+        self.assertIsInstance(batch[0], UnknownInstruction)
+
+
+if __name__ == '__main__':
+    unittest.main()